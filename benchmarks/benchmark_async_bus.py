@@ -0,0 +1,104 @@
+"""
+asyncio bus benchmark
+
+This script compares two ways an asyncio service can share the servo bus on
+the virtual XL320 bus: the threaded approach, pushing every blocking Servo
+call into the default executor behind a threading.Lock, and AsyncBus with
+AsyncServo. CONCURRENCY coroutines each read positions in a loop while a
+ticker coroutine measures how late the event loop wakes it up. The report
+shows transactions per second, p50/p99 call latency as seen by a coroutine
+(including queueing), event loop lag and CPU time.
+
+Use: python3 benchmark_async_bus.py
+"""
+
+import asyncio
+import threading
+import time
+
+from mbot_xl320_library import *
+from mbot_xl320_library import AsyncBus, AsyncServo, VirtualBus
+
+SERVO_COUNT = 4
+CONCURRENCY = 8             # coroutines issuing reads at the same time
+BENCHMARK_SECONDS = 2.0
+TICK_SECONDS = 0.001        # period of the loop lag probe
+
+
+def percentile(sorted_samples, fraction):
+    return sorted_samples[min(int(len(sorted_samples) * fraction), len(sorted_samples) - 1)]
+
+
+async def run(read_position, servo_ids):
+    latencies = []
+    lags = []
+    stop_at = time.perf_counter() + BENCHMARK_SECONDS
+
+    async def client(index):
+        count = index
+        while time.perf_counter() < stop_at:
+            began = time.perf_counter()
+            await read_position(servo_ids[count % len(servo_ids)])
+            latencies.append(time.perf_counter() - began)
+            count += 1
+
+    async def ticker():
+        while time.perf_counter() < stop_at:
+            expected = time.perf_counter() + TICK_SECONDS
+            await asyncio.sleep(TICK_SECONDS)
+            lags.append(time.perf_counter() - expected)
+
+    cpu = time.process_time()
+    start = time.perf_counter()
+    await asyncio.gather(ticker(), *(client(index) for index in range(CONCURRENCY)))
+    elapsed = time.perf_counter() - start
+    cpu = time.process_time() - cpu
+
+    latencies.sort()
+    lags.sort()
+    return (len(latencies) / elapsed, percentile(latencies, 0.5) * 1e3, percentile(latencies, 0.99) * 1e3,
+            percentile(lags, 0.99) * 1e3, cpu / elapsed * 100.0)
+
+
+async def threaded(portHandler, packetHandler, servo_ids):
+    servos = {servo_id: Servo(servo_id, portHandler, packetHandler, quiet=True) for servo_id in servo_ids}
+    lock = threading.Lock()
+    loop = asyncio.get_running_loop()
+
+    def blocking_read(servo_id):
+        with lock:
+            return servos[servo_id].get_position()
+
+    return await run(lambda servo_id: loop.run_in_executor(None, blocking_read, servo_id), servo_ids)
+
+
+async def asynchronous(portHandler, packetHandler, servo_ids):
+    bus = AsyncBus(portHandler, packetHandler)
+    servos = {servo_id: AsyncServo(servo_id, bus) for servo_id in servo_ids}
+    try:
+        return await run(lambda servo_id: servos[servo_id].get_position(), servo_ids)
+    finally:
+        bus.close()
+
+
+def main():
+    servo_ids = list(range(1, SERVO_COUNT + 1))
+    virtual_bus = VirtualBus(servo_ids).start(process=True)
+
+    print("handler    | approach        |  tx/s | p50 ms | p99 ms | loop lag p99 ms | cpu %")
+    try:
+        for handler_name, (portHandler, packetHandler) in (
+                ("stock", initialize_handlers(virtual_bus.port_name)),
+                ("gpio drain", initialize_gpio_handlers(virtual_bus.port_name, TURNAROUND_DRAIN, "none"))):
+            open_port(portHandler, quiet=True)
+            for name, approach in (("executor + lock", threaded), ("AsyncBus", asynchronous)):
+                rate, p50, p99, lag, cpu = asyncio.run(approach(portHandler, packetHandler, servo_ids))
+                print("%-10s | %-15s | %5.0f | %6.2f | %6.2f | %15.2f | %5.0f"
+                      % (handler_name, name, rate, p50, p99, lag, cpu))
+            close_port(portHandler)
+    finally:
+        virtual_bus.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""
+Multi-bus benchmark
+
+This script spreads servos over one, two and three virtual XL320 buses
+(SERVOS_PER_BUS each, every bus in its own process) and reads the feedback
+of all servos in a loop through a BusManager, which runs one group read per
+bus in parallel on the buses' worker threads. For comparison, the same reads
+are made one bus after the other from a single thread. It reports the
+servos read per second; with parallel buses it grows with the number of buses.
+
+Use: python3 benchmark_bus_manager.py
+"""
+
+import time
+
+from dynamixel_sdk import *
+from mbot_xl320_library import *
+from mbot_xl320_library import BusManager, VirtualBus
+
+SERVOS_PER_BUS = 4
+MAX_BUSES = 3
+BENCHMARK_SECONDS = 2.0
+
+
+def rate(read, servo_count):
+    """@return The servos read per second by calling read() for BENCHMARK_SECONDS."""
+    rounds = 0
+    began = time.monotonic()
+    while time.monotonic() - began < BENCHMARK_SECONDS:
+        read()
+        rounds += 1
+    return rounds * servo_count / (time.monotonic() - began)
+
+
+def main():
+    virtual_buses = []
+    handlers = {}
+    servo_map = {}
+    for index in range(MAX_BUSES):
+        servo_ids = list(range(index * SERVOS_PER_BUS + 1, (index + 1) * SERVOS_PER_BUS + 1))
+        bus = VirtualBus(servo_ids).start(process=True)
+        virtual_buses.append(bus)
+        portHandler, packetHandler = initialize_handlers(bus.port_name)
+        open_port(portHandler, quiet=True)
+        name = "bus%d" % index
+        handlers[name] = (portHandler, packetHandler)
+        servo_map.update({servo_id: name for servo_id in servo_ids})
+
+    print("buses | servos | sequential servos/s | BusManager servos/s | speedup")
+    try:
+        baseline = None
+        for count in range(1, MAX_BUSES + 1):
+            names = ["bus%d" % index for index in range(count)]
+            buses = {name: handlers[name] for name in names}
+            subset = {servo_id: name for servo_id, name in servo_map.items() if name in buses}
+            servo_count = len(subset)
+
+            groups = [ServoGroup(sorted(servo_id for servo_id, bus in subset.items() if bus == name),
+                                 *buses[name], quiet=True) for name in names]
+
+            def sequential():
+                for group in groups:
+                    group.read_feedback()
+
+            sequential_rate = rate(sequential, servo_count)
+            with BusManager(buses, subset, quiet=True) as manager:
+                manager_rate = rate(manager.read_feedback, servo_count)
+            if baseline is None:
+                baseline = manager_rate
+            print("%5d | %6d | %19.0f | %19.0f | %6.2fx" % (
+                count, servo_count, sequential_rate, manager_rate, manager_rate / baseline))
+    finally:
+        for portHandler, _ in handlers.values():
+            close_port(portHandler)
+        for bus in virtual_buses:
+            bus.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+"""
+Call overhead benchmark
+
+This script measures the Python cost of one Servo call in the default
+printing mode and in quiet mode. The port answers instantly, so the numbers
+are the library and SDK overhead per call, not bus time. Printing goes to a
+line-buffered os.devnull, which issues one write per line like a terminal
+does but without the terminal's rendering cost, so a real console is slower
+still. Each figure is the best of REPEATS runs.
+
+Use: python3 benchmark_call_overhead.py
+"""
+
+import contextlib
+import os
+import sys
+import time
+
+from dynamixel_sdk import *
+from mbot_xl320_library import *
+
+CALLS = 10000
+REPEATS = 5
+SERVO_ID = 1
+
+
+class InstantPort(PortHandler):
+    """@brief A PortHandler whose single servo answers every read and write immediately."""
+
+    def __init__(self):
+        super(InstantPort, self).__init__("instant")
+        self.packetHandler = PacketHandler(PROTOCOL_VERSION)
+        self.rx_buffer = bytearray()
+
+    def setupPort(self, cflag_baud):
+        self.is_open = True
+        return True
+
+    def closePort(self):
+        self.is_open = False
+
+    def clearPort(self):
+        self.rx_buffer.clear()
+
+    def getBytesAvailable(self):
+        return len(self.rx_buffer)
+
+    def readPort(self, length):
+        data = bytes(self.rx_buffer[:length])
+        del self.rx_buffer[:length]
+        return data
+
+    def writePort(self, packet):
+        instruction = packet[7]
+        params = [0] * DXL_MAKEWORD(packet[10], packet[11]) if instruction == INST_READ else []
+        length = len(params) + 4
+        status = [0xFF, 0xFF, 0xFD, 0x00, packet[4], DXL_LOBYTE(length), DXL_HIBYTE(length), 0x55, 0]
+        status.extend(params)
+        crc = self.packetHandler.updateCRC(0, status, len(status))
+        status.extend([DXL_LOBYTE(crc), DXL_HIBYTE(crc)])
+        self.rx_buffer.extend(status)
+        return len(packet)
+
+
+def per_call_us(command, stdout=None):
+    best = None
+    for _ in range(REPEATS):
+        with contextlib.redirect_stdout(stdout or sys.stdout):
+            start = time.perf_counter()
+            for count in range(CALLS):
+                command(count)
+            elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best / CALLS * 1e6
+
+
+def main():
+    portHandler = InstantPort()
+    packetHandler = PacketHandler(PROTOCOL_VERSION)
+    portHandler.openPort()
+
+    printing = Servo(SERVO_ID, portHandler, packetHandler)
+    quiet = Servo(SERVO_ID, portHandler, packetHandler, quiet=True)
+
+    print("call            | printing us | quiet us | saved")
+    for name in ("set_position", "set_joint_speed", "get_position"):
+        if name == "get_position":
+            calls = [lambda count, servo=servo: servo.get_position() for servo in (printing, quiet)]
+        else:
+            calls = [lambda count, method=getattr(servo, name): method(count % 1024)
+                     for servo in (printing, quiet)]
+
+        with open(os.devnull, "w", buffering=1) as devnull:
+            printing_us = per_call_us(calls[0], devnull)
+        quiet_us = per_call_us(calls[1])
+        print("%-15s | %11.1f | %8.1f | %4.0f%%"
+              % (name, printing_us, quiet_us, (1.0 - quiet_us / printing_us) * 100.0))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""
+Dead servo benchmark
+
+This script reads the position of servos 1 to 4 one after the other in a
+control cycle while servo 4 is missing from the virtual bus, and reports the
+cycle time with the SDK's fixed packet timeout, with adaptive timeouts and
+with adaptive timeouts and the circuit breaker of GPIOPacketHandler. It then
+plugs servo 4 in and reports how long the breaker takes to notice. The bus
+runs in this process so a servo can be added while it runs.
+
+Use: python3 benchmark_dead_servo.py
+"""
+
+import time
+from dynamixel_sdk import *
+from mbot_xl320_library import *
+from mbot_xl320_library import VirtualBus, VirtualXL320
+
+CYCLES = 100
+MODES = (
+    ("fixed timeout", False, None),
+    ("adaptive timeout", True, None),
+    ("adaptive + breaker", True, 3),
+)
+
+
+def cycle_time(servos):
+    """@return The mean seconds per cycle and the number of failed reads."""
+    failed = 0
+    start = time.perf_counter()
+    for _ in range(CYCLES):
+        for servo in servos:
+            try:
+                servo.get_position()
+            except CommError:
+                failed += 1
+    return (time.perf_counter() - start) / CYCLES, failed
+
+
+def main():
+    bus = VirtualBus([1, 2, 3]).start()
+    try:
+        print("mode               | cycle (ms) | failed reads")
+        for name, adaptive, breaker_threshold in MODES:
+            portHandler = PortHandler(bus.port_name)
+            packetHandler = GPIOPacketHandler(TURNAROUND_DRAIN, "none", adaptive=adaptive,
+                                              breaker_threshold=breaker_threshold)
+            open_port(portHandler, quiet=True)
+            servos = [Servo(servo_id, portHandler, packetHandler, quiet=True) for servo_id in (1, 2, 3, 4)]
+            elapsed, failed = cycle_time(servos)
+            print("%-18s | %10.2f | %12d" % (name, elapsed * 1e3, failed))
+
+        for servo_id, stats in sorted(packetHandler.get_link_stats(portHandler).items()):
+            timeout = "%.2f ms" % stats["timeout_ms"] if stats["timeout_ms"] is not None else "learning"
+            print("  ID %d: latency %.2f +- %.2f ms, timeout %s, %d timeouts, breaker %s, %d rejected" % (
+                servo_id, stats["latency_mean_ms"], stats["latency_dev_ms"], timeout, stats["timeouts"],
+                stats["state"], stats["rejected"]))
+
+        with bus.lock:
+            bus.servos[4] = VirtualXL320(4)
+        plugged_in = time.monotonic()
+        while True:
+            try:
+                servos[3].get_position()
+                break
+            except CommError:
+                time.sleep(0.01)
+        print("servo 4 answered %.0f ms after it was plugged in" % ((time.monotonic() - plugged_in) * 1e3))
+        close_port(portHandler)
+    finally:
+        bus.stop()
+
+
+if __name__ == "__main__":
+    main()
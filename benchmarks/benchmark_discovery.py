@@ -0,0 +1,61 @@
+"""
+Bus discovery benchmark
+
+This script hides servos at different baudrates on two virtual XL320 buses
+and compares a sequential ping sweep (packetHandler.ping on every ID at
+every baudrate, each missing ID waiting for its timeout) with scan_ports,
+which sends one broadcast Ping per baudrate and scans both ports at once.
+The sweep is measured on SWEEP_IDS IDs at 1 Mbps and extrapolated to all
+IDs, baudrates and ports, since running it in full takes over a minute.
+
+Use: python3 benchmark_discovery.py
+"""
+
+import time
+
+from dynamixel_sdk import *
+from mbot_xl320_library import *
+from mbot_xl320_library import SCAN_BAUDRATES, VirtualBus, scan_ports
+
+SWEEP_IDS = 32
+
+
+def main():
+    buses = [
+        VirtualBus([1, 2, 3, 4], baudrate={1: 1000000, 2: 1000000, 3: 57600, 4: 9600}),
+        VirtualBus([10, 11, 12], baudrate=115200),
+    ]
+    for bus in buses:
+        bus.start(process=True)
+    handlers = [initialize_handlers(bus.port_name) for bus in buses]
+
+    try:
+        portHandler, packetHandler = handlers[0]
+        open_port(portHandler, quiet=True)
+        start = time.perf_counter()
+        for servo_id in range(SWEEP_IDS):
+            packetHandler.ping(portHandler, servo_id)
+        per_id = (time.perf_counter() - start) / SWEEP_IDS
+        sweep = per_id * (MAX_ID + 1) * len(SCAN_BAUDRATES) * len(handlers)
+        print("sequential ping sweep: %.1f ms per ID, about %.0f s for IDs 0-%d at %d baudrates on %d ports"
+              % (per_id * 1000.0, sweep, MAX_ID, len(SCAN_BAUDRATES), len(handlers)))
+
+        for max_id in (MAX_ID, 20):
+            start = time.perf_counter()
+            found = scan_ports(handlers, max_id=max_id)
+            elapsed = time.perf_counter() - start
+            print("scan_ports max_id=%d: %.2f s (%.0fx faster)" % (max_id, elapsed, sweep / elapsed))
+
+        for port_name, servos in found.items():
+            for servo in servos:
+                print("  %s ID:%d model %d firmware %d at %d baud"
+                      % (port_name, servo.servo_id, servo.model_number, servo.firmware_version, servo.baudrate))
+    finally:
+        for portHandler, _ in handlers:
+            close_port(portHandler)
+        for bus in buses:
+            bus.stop()
+
+
+if __name__ == "__main__":
+    main()
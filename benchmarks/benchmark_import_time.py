@@ -0,0 +1,76 @@
+"""
+Import time benchmark
+
+This script measures the cold-start time of the library in fresh interpreters:
+the bare package import, the USB2AX path (package import plus
+initialize_handlers and Servo) and the star import. It fails if the USB path
+exceeds its budget or pulls in Jetson.GPIO, or if the star import loads
+asyncio, shared memory or NumPy, so it can guard against eager imports
+creeping back.
+
+Use: python3 benchmark_import_time.py
+"""
+
+import statistics
+import subprocess
+import sys
+
+RUNS = 20
+USB_PATH_BUDGET_MS = 250.0   # cold start budget for the USB2AX path
+
+BARE_IMPORT = """
+import time
+start = time.perf_counter()
+import mbot_xl320_library
+print((time.perf_counter() - start) * 1000.0)
+"""
+
+USB_PATH = """
+import sys
+import time
+start = time.perf_counter()
+import mbot_xl320_library
+mbot_xl320_library.initialize_handlers
+mbot_xl320_library.Servo
+elapsed = (time.perf_counter() - start) * 1000.0
+assert "Jetson" not in sys.modules, "the USB path imported Jetson.GPIO"
+print(elapsed)
+"""
+
+STAR_IMPORT = """
+import sys
+import time
+start = time.perf_counter()
+from mbot_xl320_library import *
+elapsed = (time.perf_counter() - start) * 1000.0
+for module in ("Jetson", "asyncio", "multiprocessing.shared_memory", "numpy"):
+    assert module not in sys.modules, "the star import imported " + module
+print(elapsed)
+"""
+
+
+def measure(code):
+    samples = []
+    for _ in range(RUNS):
+        output = subprocess.run([sys.executable, "-c", code], check=True, capture_output=True, text=True)
+        samples.append(float(output.stdout))
+    return samples
+
+
+def main():
+    bare = measure(BARE_IMPORT)
+    usb = measure(USB_PATH)
+    star = measure(STAR_IMPORT)
+
+    print("path       | median ms | max ms")
+    print("bare       | %9.2f | %6.2f" % (statistics.median(bare), max(bare)))
+    print("USB2AX     | %9.2f | %6.2f" % (statistics.median(usb), max(usb)))
+    print("import *   | %9.2f | %6.2f" % (statistics.median(star), max(star)))
+
+    if statistics.median(usb) > USB_PATH_BUDGET_MS:
+        print("USB path cold start is over the %.0f ms budget!" % USB_PATH_BUDGET_MS)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
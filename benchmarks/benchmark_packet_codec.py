@@ -0,0 +1,150 @@
+"""
+Packet codec benchmark
+
+This script compares the Dynamixel SDK's Protocol 2.0 packet handler with
+FastPacketHandler on ports that cost nothing, so the numbers are the Python
+work per packet: building and framing instruction packets (encode), parsing
+status packets (decode), and whole read and write transactions against a
+servo that answers instantly. It first checks that both handlers put the
+same bytes on the wire. Each figure is the best of REPEATS runs.
+
+Use: python3 benchmark_packet_codec.py
+"""
+
+import time
+
+from dynamixel_sdk import *
+from mbot_xl320_library import *
+from mbot_xl320_library import FastPacketHandler
+from mbot_xl320_library.packet_codec import crc16
+
+PACKETS = 20000
+REPEATS = 5
+SERVO_ID = 1
+SYNC_IDS = list(range(1, 9))
+
+
+class NullPort(PortHandler):
+    """@brief A PortHandler that keeps the last packet written and serves queued status bytes."""
+
+    def __init__(self):
+        super(NullPort, self).__init__("null")
+        self.written = b""
+        self.rx_buffer = bytearray()
+        self.status = b""
+
+    def setupPort(self, cflag_baud):
+        self.is_open = True
+        return True
+
+    def clearPort(self):
+        self.rx_buffer.clear()
+
+    def getBytesAvailable(self):
+        return len(self.rx_buffer)
+
+    def readPort(self, length):
+        data = bytes(self.rx_buffer[:length])
+        del self.rx_buffer[:length]
+        return data
+
+    def writePort(self, packet):
+        self.written = bytes(packet)
+        self.rx_buffer += self.status
+        return len(packet)
+
+    def isPacketTimeout(self):
+        return not self.rx_buffer
+
+
+def status_packet(servo_id, params):
+    """@return A status packet with error 0 carrying params."""
+    length = len(params) + 4
+    packet = bytes([0xFF, 0xFF, 0xFD, 0x00, servo_id, DXL_LOBYTE(length), DXL_HIBYTE(length), 0x55, 0]) + params
+    crc = crc16(packet)
+    return packet + bytes([DXL_LOBYTE(crc), DXL_HIBYTE(crc)])
+
+
+def packets_per_second(operation):
+    best = None
+    for _ in range(REPEATS):
+        start = time.perf_counter()
+        for count in range(PACKETS):
+            operation(count)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return PACKETS / best
+
+
+def main():
+    sdk, fast = PacketHandler(PROTOCOL_VERSION), FastPacketHandler()
+    port = NullPort()
+    port.openPort()
+    sync_param = []
+    for servo_id in SYNC_IDS:
+        sync_param.extend([servo_id, 0x00, 0x02])
+    read_status = status_packet(SERVO_ID, bytes([0x00, 0x02]))
+    write_status = status_packet(SERVO_ID, b"")
+
+    def encode_write(handler):
+        return lambda count: handler.write2ByteTxOnly(port, SERVO_ID, ADDR_GOAL_POSITION, count & 0x3FF)
+
+    def encode_read(handler):
+        def operation(count):
+            handler.readTx(port, SERVO_ID, ADDR_PRESENT_POSITION, 2)
+            port.is_using = False
+        return operation
+
+    def encode_sync_write(handler):
+        return lambda count: handler.syncWriteTxOnly(port, ADDR_GOAL_POSITION, 2, sync_param, len(sync_param))
+
+    def decode_status(handler):
+        def operation(count):
+            port.rx_buffer += read_status
+            handler.rxPacket(port)
+        return operation
+
+    def read_transaction(handler):
+        def operation(count):
+            port.status = read_status
+            handler.read2ByteTxRx(port, SERVO_ID, ADDR_PRESENT_POSITION)
+        return operation
+
+    def write_transaction(handler):
+        def operation(count):
+            port.status = write_status
+            handler.write2ByteTxRx(port, SERVO_ID, ADDR_GOAL_POSITION, count & 0x3FF)
+        return operation
+
+    cases = [
+        ("encode Write (2 bytes)", encode_write),
+        ("encode Read", encode_read),
+        ("encode Sync Write (8 IDs)", encode_sync_write),
+        ("decode status packet", decode_status),
+        ("read2ByteTxRx", read_transaction),
+        ("write2ByteTxRx", write_transaction),
+    ]
+
+    identical = True
+    for name, case in cases[:3]:
+        written = []
+        for handler in (sdk, fast):
+            port.status = b""
+            case(handler)(512)
+            port.is_using = False
+            written.append(port.written)
+        identical = identical and written[0] == written[1]
+    print("same bytes on the wire: %s\n" % ("yes" if identical else "NO"))
+
+    print("%-26s | SDK packets/s | fast packets/s | speedup" % "operation")
+    for name, case in cases:
+        rates = []
+        for handler in (sdk, fast):
+            port.status = b""
+            rates.append(packets_per_second(case(handler)))
+            port.is_using = False
+        print("%-26s | %13.0f | %14.0f | %6.2fx" % (name, rates[0], rates[1], rates[1] / rates[0]))
+
+
+if __name__ == "__main__":
+    main()
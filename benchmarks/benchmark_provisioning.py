@@ -0,0 +1,71 @@
+"""
+Provisioning benchmark
+
+This script brings up 2, 4 and 8 virtual servos in wheel mode with an LED
+color and torque enabled, once with the sequence of rotate_in_circle.py,
+one call per setting and servo with torque toggled around the control mode,
+and once with provision(). Each is timed on factory-new servos and on
+servos that are already set up, as on every boot after the first. It
+reports the elapsed time, and for provision() the transactions, EEPROM
+writes and modelled bus time next to those of the naive sequence. The bus
+runs in this process and the servos are driven through GPIOPacketHandler,
+which blocks on the port instead of polling.
+
+Use: python3 benchmark_provisioning.py
+"""
+
+import time
+from dynamixel_sdk import *
+from mbot_xl320_library import *
+from mbot_xl320_library import ServoProfile, VirtualBus, provision
+
+SERVO_COUNTS = (2, 4, 8)
+
+
+def naive(servos):
+    for servo in servos:
+        servo.change_led_color(LED_GREEN)
+        servo.disable_torque()
+        servo.set_control_mode("wheel")
+        servo.enable_torque()
+
+
+def timed(function):
+    start = time.perf_counter()
+    result = function()
+    return (time.perf_counter() - start) * 1e3, result
+
+
+def main():
+    print("servos | boot  | naive (ms) | provision (ms) | transactions | EEPROM writes | bus time (ms)")
+    for count in SERVO_COUNTS:
+        servo_ids = list(range(1, count + 1))
+        profiles = {servo_id: ServoProfile(mode="wheel", led=LED_GREEN, torque=True)
+                    for servo_id in servo_ids}
+        elapsed = {}
+        for method in ("naive", "provision"):
+            bus = VirtualBus(servo_ids).start()
+            portHandler, packetHandler = initialize_gpio_handlers(bus.port_name, TURNAROUND_DRAIN, "none")
+            open_port(portHandler, quiet=True)
+            servos = [Servo(servo_id, portHandler, packetHandler, quiet=True) for servo_id in servo_ids]
+            try:
+                for boot in ("first", "next"):
+                    if method == "naive":
+                        elapsed[method, boot] = timed(lambda: naive(servos))[0]
+                    else:
+                        elapsed[method, boot] = timed(
+                            lambda: provision(profiles, portHandler, packetHandler, quiet=True))
+            finally:
+                close_port(portHandler)
+                bus.stop()
+
+        for boot in ("first", "next"):
+            provisioned, report = elapsed["provision", boot]
+            print("%6d | %-5s | %10.2f | %14.2f | %5d vs %3d | %6d vs %3d | %5.2f vs %5.2f" % (
+                count, boot, elapsed["naive", boot], provisioned, report["transactions"],
+                report["naive_transactions"], report["eeprom_writes"], report["naive_eeprom_writes"],
+                report["bus_time_ms"], report["naive_bus_time_ms"]))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""
+Status read benchmark
+
+This script runs a health check of SERVO_COUNT servos on the virtual XL320
+bus (position, speed, load, voltage, temperature and hardware error status
+of every servo) three ways: one read per register, one read_status() per
+servo, and one ServoGroup.read_status() for the whole group. It reports the
+instruction packets, the bytes on the wire in both directions and the time
+per health check.
+
+Use: python3 benchmark_read_status.py
+"""
+
+import time
+
+from dynamixel_sdk import *
+from mbot_xl320_library import *
+from mbot_xl320_library import VirtualBus
+
+SERVO_COUNT = 8
+CHECKS = 50
+HEALTH_REGISTERS = (ADDR_PRESENT_POSITION, ADDR_PRESENT_SPEED, ADDR_PRESENT_LOAD, 45, ADDR_PRESENT_TEMPERATURE,
+                    ADDR_HARDWARE_ERROR_STATUS)
+
+
+class CountingPort(PortHandler):
+    """@brief A PortHandler that counts the instruction packets it sends and the bytes both ways."""
+
+    def __init__(self, port_name):
+        super(CountingPort, self).__init__(port_name)
+        self.reset()
+
+    def reset(self):
+        self.packets = 0
+        self.bytes = 0
+
+    def writePort(self, packet):
+        self.packets += 1
+        self.bytes += len(packet)
+        return super(CountingPort, self).writePort(packet)
+
+    def readPort(self, length):
+        data = super(CountingPort, self).readPort(length)
+        self.bytes += len(data)
+        return data
+
+
+def main():
+    servo_ids = list(range(1, SERVO_COUNT + 1))
+    bus = VirtualBus(servo_ids).start(process=True)
+    portHandler = CountingPort(bus.port_name)
+    packetHandler = PacketHandler(PROTOCOL_VERSION)
+    open_port(portHandler, quiet=True)
+
+    servos = [Servo(servo_id, portHandler, packetHandler, quiet=True) for servo_id in servo_ids]
+    group = ServoGroup(servo_ids, portHandler, packetHandler, quiet=True)
+
+    def per_register():
+        return [[servo.read_register(address) for address in HEALTH_REGISTERS] for servo in servos]
+
+    def per_servo():
+        return [servo.read_status() for servo in servos]
+
+    def per_group():
+        return group.read_status()
+
+    print("%d servos, %d health checks\n" % (SERVO_COUNT, CHECKS))
+    print("method                    | packets/check | bytes/check | ms/check")
+    try:
+        for name, check in (("read per register", per_register), ("Servo.read_status", per_servo),
+                            ("ServoGroup.read_status", per_group)):
+            portHandler.reset()
+            start = time.perf_counter()
+            for _ in range(CHECKS):
+                check()
+            elapsed = time.perf_counter() - start
+            print("%-25s | %13.0f | %11.0f | %8.2f" % (
+                name, portHandler.packets / CHECKS, portHandler.bytes / CHECKS, elapsed / CHECKS * 1e3))
+
+        print("\n%r" % group.read_status()[1])
+    finally:
+        close_port(portHandler)
+        bus.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+"""
+Bus scheduler benchmark
+
+This script runs a command thread (goal positions at COMMAND_RATE) next to
+a telemetry thread (group feedback reads as fast as possible) on the
+virtual XL320 bus, first sharing the port directly through the SDK's
+is_using flag and then through a BusScheduler. It reports the command
+latency, the commands lost to COMM_PORT_BUSY and the telemetry rate, and
+the scheduler's wait-time histograms.
+
+Use: python3 benchmark_scheduler.py
+"""
+
+import threading
+import time
+
+from dynamixel_sdk import *
+from mbot_xl320_library import *
+from mbot_xl320_library import BusScheduler, VirtualBus
+
+SERVO_COUNT = 6
+COMMAND_RATE = 100.0
+BENCHMARK_SECONDS = 2.0
+
+
+def percentile(sorted_samples, fraction):
+    return sorted_samples[min(int(len(sorted_samples) * fraction), len(sorted_samples) - 1)]
+
+
+def run(command, telemetry):
+    latencies = []
+    failures = [0]
+    reads = [0]
+    stop_at = time.monotonic() + BENCHMARK_SECONDS
+
+    def telemetry_loop():
+        while time.monotonic() < stop_at:
+            telemetry()
+            reads[0] += 1
+
+    thread = threading.Thread(target=telemetry_loop)
+    thread.start()
+    count = 0
+    next_command = time.monotonic()
+    while next_command < stop_at:
+        time.sleep(max(next_command - time.monotonic(), 0.0))
+        began = time.monotonic()
+        if command(count % 1024) != COMM_SUCCESS:
+            failures[0] += 1
+        latencies.append(time.monotonic() - began)
+        count += 1
+        next_command += 1.0 / COMMAND_RATE
+    thread.join()
+
+    latencies.sort()
+    return (percentile(latencies, 0.5) * 1e3, percentile(latencies, 0.99) * 1e3, failures[0], len(latencies),
+            reads[0] / BENCHMARK_SECONDS)
+
+
+def main():
+    servo_ids = list(range(1, SERVO_COUNT + 1))
+    bus = VirtualBus(servo_ids).start(process=True)
+    portHandler, packetHandler = initialize_handlers(bus.port_name)
+    open_port(portHandler, quiet=True)
+    group = ServoGroup(servo_ids, portHandler, packetHandler, quiet=True)
+
+    print("sharing        | cmd p50 ms | cmd p99 ms | cmd failed | telemetry reads/s")
+    try:
+        def direct_command(position):
+            return packetHandler.write2ByteTxRx(portHandler, 1, ADDR_GOAL_POSITION, position)[0]
+
+        def direct_telemetry():
+            # Without a scheduler the port is only guarded by is_using; a read that finds
+            # it busy fails with COMM_PORT_BUSY like the command does
+            group.read_block(ADDR_PRESENT_POSITION, 14)
+
+        p50, p99, failed, sent, rate = run(direct_command, direct_telemetry)
+        print("is_using flag  | %10.2f | %10.2f | %4d / %3d | %17.0f" % (p50, p99, failed, sent, rate))
+
+        with BusScheduler(portHandler, packetHandler, cycle_time=0.01, budget=0.008) as scheduler:
+            def scheduled_command(position):
+                return scheduler.write(1, ADDR_GOAL_POSITION, 2, position).result()[0]
+
+            def scheduled_telemetry():
+                scheduler.group_call(group, "read_block", ADDR_PRESENT_POSITION, 14).result()
+
+            p50, p99, failed, sent, rate = run(scheduled_command, scheduled_telemetry)
+            print("BusScheduler   | %10.2f | %10.2f | %4d / %3d | %17.0f" % (p50, p99, failed, sent, rate))
+
+            stats = scheduler.get_stats()
+            for name in ("command", "telemetry"):
+                histogram = ", ".join("<=%s: %d" % (bound, count)
+                                      for bound, count in stats[name]["wait_ms_histogram"].items() if count)
+                print("%s wait ms: %s" % (name, histogram))
+            print("deferred by the budget: %d" % stats["deferred"])
+    finally:
+        close_port(portHandler)
+        bus.stop()
+
+
+if __name__ == "__main__":
+    main()
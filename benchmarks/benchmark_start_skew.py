@@ -0,0 +1,69 @@
+"""
+Motion start skew benchmark
+
+This script measures how far apart in time servos start moving when they
+are commanded one after the other with set_position(), staged with Reg Write
+and released with one broadcast Action, or sent a single Sync Write. The
+start of each servo is the moment its new Goal Position takes effect in the
+virtual bus timing model: the end of the instruction packet on the wire,
+after the status packets of the earlier instructions. The skew is the time
+between the first and the last servo to start. The bus runs in this process
+so its timeline can be read back, and the servos are driven through
+GPIOPacketHandler, which blocks on the port instead of polling.
+
+Use: python3 benchmark_start_skew.py
+"""
+
+from dynamixel_sdk import *
+from mbot_xl320_library import *
+from mbot_xl320_library import VirtualBus
+
+SERVO_COUNTS = (2, 4, 8)
+ROUNDS = 20
+
+
+def skew_ms(bus, servo_ids):
+    starts = [bus.goal_changed_at[servo_id] for servo_id in servo_ids]
+    return (max(starts) - min(starts)) * 1e3
+
+
+def main():
+    bus = VirtualBus(range(1, max(SERVO_COUNTS) + 1)).start()
+    portHandler, packetHandler = initialize_gpio_handlers(bus.port_name, TURNAROUND_DRAIN, "none")
+    open_port(portHandler, quiet=True)
+
+    print("servos | set_position one by one | Reg Write + Action | Sync Write   (mean skew in ms)")
+    try:
+        for count in SERVO_COUNTS:
+            servo_ids = list(range(1, count + 1))
+            servos = [Servo(servo_id, portHandler, packetHandler, quiet=True) for servo_id in servo_ids]
+            group = ServoGroup(servo_ids, portHandler, packetHandler, quiet=True)
+
+            def sequential(goal):
+                for servo in servos:
+                    servo.set_position(goal)
+
+            def staged(goal):
+                group.stage_positions({servo_id: goal for servo_id in servo_ids})
+                group.action()
+
+            def sync_write(goal):
+                group.set_positions({servo_id: goal for servo_id in servo_ids})
+
+            means = []
+            for command in (sequential, staged, sync_write):
+                total = 0.0
+                for index in range(ROUNDS):
+                    command(300 + 400 * (index % 2))
+                    # the ping returns once the bus is idle, so the timeline is complete
+                    packetHandler.ping(portHandler, servo_ids[0])
+                    total += skew_ms(bus, servo_ids)
+                means.append(total / ROUNDS)
+            print("%6d | %23.3f | %18.3f | %10.3f" % (count, means[0], means[1], means[2]))
+    finally:
+        close_port(portHandler)
+        bus.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""
+Shared memory state server benchmark
+
+This script serves the state of four virtual servos through a StateServer
+at 100 Hz and starts 1, 2, 4 and 8 reader processes at once. Every reader
+reads the full status of a servo and its position alone once per
+millisecond for a second, and reports the time a read takes, how old the
+state it got was, and how often a read had to retry because the server was
+writing the same slot. The virtual bus runs in its own process.
+
+Use: python3 benchmark_state_server.py
+"""
+
+import multiprocessing
+import time
+from dynamixel_sdk import *
+from mbot_xl320_library import *
+from mbot_xl320_library import StateClient, StateServer, VirtualBus
+
+SERVO_IDS = [1, 2, 3, 4]
+READER_COUNTS = (1, 2, 4, 8)
+READ_TIME = 1.0
+READ_INTERVAL = 0.001
+
+
+def percentile(samples, fraction):
+    samples = sorted(samples)
+    return samples[int(fraction * (len(samples) - 1))]
+
+
+def reader(index, results):
+    client = StateClient()
+    status_times = []
+    position_times = []
+    ages = []
+    end = time.monotonic() + READ_TIME
+    while time.monotonic() < end:
+        servo_id = SERVO_IDS[len(status_times) % len(SERVO_IDS)]
+        start = time.perf_counter()
+        status = client.read(servo_id)
+        status_times.append(time.perf_counter() - start)
+        start = time.perf_counter()
+        client.read_position(servo_id)
+        position_times.append(time.perf_counter() - start)
+        ages.append(time.monotonic() - status.timestamp)
+        time.sleep(READ_INTERVAL)
+    results.put((status_times, position_times, ages, client.retries))
+    client.close()
+
+
+def main():
+    bus = VirtualBus(SERVO_IDS)
+    bus.start(process=True)
+    portHandler, packetHandler = initialize_handlers(bus.port_name, fast=True)
+    open_port(portHandler, quiet=True)
+    context = multiprocessing.get_context("spawn")
+
+    print("readers | read() p50/p99 (us) | read_position() p50/p99 (us) | age p50/max (ms) | retries")
+    try:
+        with StateServer(SERVO_IDS, portHandler, packetHandler, rate=100.0) as server:
+            with StateClient() as client:
+                while client.cycles == 0:
+                    time.sleep(0.01)
+            for count in READER_COUNTS:
+                results = context.Queue()
+                readers = [context.Process(target=reader, args=(index, results)) for index in range(count)]
+                for process in readers:
+                    process.start()
+                status_times, position_times, ages, retries = [], [], [], 0
+                for _ in readers:
+                    status, position, age, reader_retries = results.get()
+                    status_times += status
+                    position_times += position
+                    ages += age
+                    retries += reader_retries
+                for process in readers:
+                    process.join()
+                print("%7d | %10.1f / %6.1f | %17.1f / %6.1f | %7.2f / %6.2f | %7d" % (
+                    count, percentile(status_times, 0.5) * 1e6, percentile(status_times, 0.99) * 1e6,
+                    percentile(position_times, 0.5) * 1e6, percentile(position_times, 0.99) * 1e6,
+                    percentile(ages, 0.5) * 1e3, max(ages) * 1e3, retries))
+            stats = server.get_stats()
+            print("server: %d cycles, %d dropped, %d failed reads, jitter mean %.3f ms, max %.3f ms" % (
+                stats["cycles"], stats["dropped_cycles"], stats["failed_reads"], stats["jitter_mean_ms"],
+                stats["jitter_max_ms"]))
+    finally:
+        close_port(portHandler)
+        bus.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+"""
+Sync Write benchmark
+
+This script compares commanding servos one at a time with Servo.set_position
+against commanding the whole bus at once with ServoGroup.set_positions.
+It runs against a simulated bus that models the wire time at the configured
+baudrate and the servo's return delay, so no hardware is needed.
+
+Use: python3 benchmark_sync_write.py
+"""
+
+import contextlib
+import os
+import time
+
+from dynamixel_sdk import *
+from mbot_xl320_library import *
+
+BENCHMARK_SECONDS = 0.5     # time spent measuring each configuration
+RETURN_DELAY = 0.0005       # XL320 default Return Delay Time is 250 * 2us
+
+
+class SimulatedPort(PortHandler):
+    """@brief A PortHandler that answers like a chain of XL320s without any hardware."""
+
+    def __init__(self, servo_ids, baudrate=BAUDRATE):
+        super(SimulatedPort, self).__init__("simulated")
+        self.servo_ids = set(servo_ids)
+        self.packetHandler = PacketHandler(PROTOCOL_VERSION)
+        self.rx_buffer = bytearray()
+        self.rx_ready_time = 0.0
+        self.bus_free_time = 0.0
+        self.baudrate = baudrate
+        self.tx_time_per_byte = (1000.0 / baudrate) * 10.0
+
+    def setupPort(self, cflag_baud):
+        self.is_open = True
+        self.tx_time_per_byte = (1000.0 / self.baudrate) * 10.0
+        return True
+
+    def closePort(self):
+        self.is_open = False
+
+    def clearPort(self):
+        self.rx_buffer.clear()
+
+    def getBytesAvailable(self):
+        return len(self.rx_buffer) if time.perf_counter() >= self.rx_ready_time else 0
+
+    def readPort(self, length):
+        if time.perf_counter() < self.rx_ready_time:
+            return b""
+        data = bytes(self.rx_buffer[:length])
+        del self.rx_buffer[:length]
+        return data
+
+    def writePort(self, packet):
+        byte_time = self.tx_time_per_byte / 1000.0
+        # The UART cannot start shifting out until the previous frame left the wire
+        while time.perf_counter() < self.bus_free_time:
+            pass
+        self.bus_free_time = time.perf_counter() + len(packet) * byte_time
+
+        status = self.make_status(packet)
+        if status:
+            self.rx_buffer.extend(status)
+            self.rx_ready_time = self.bus_free_time + RETURN_DELAY + len(status) * byte_time
+            self.bus_free_time = self.rx_ready_time
+        return len(packet)
+
+    def make_status(self, packet):
+        servo_id = packet[4]
+        instruction = packet[7]
+        if servo_id not in self.servo_ids:
+            return None
+
+        params = []
+        if instruction == INST_READ:
+            params = [0] * DXL_MAKEWORD(packet[10], packet[11])
+        elif instruction != INST_WRITE:
+            return None
+
+        length = len(params) + 4
+        status = [0xFF, 0xFF, 0xFD, 0x00, servo_id, DXL_LOBYTE(length), DXL_HIBYTE(length), 0x55, 0]
+        status.extend(params)
+        crc = self.packetHandler.updateCRC(0, status, len(status))
+        status.extend([DXL_LOBYTE(crc), DXL_HIBYTE(crc)])
+        return bytes(status)
+
+
+def run_for(seconds, command):
+    count = 0
+    start = time.perf_counter()
+    while time.perf_counter() - start < seconds:
+        command(count)
+        count += 1
+    return count / (time.perf_counter() - start)
+
+
+def main():
+    print("servos | per-servo cmd/s | sync write cmd/s | speedup")
+    for servo_count in range(1, 17):
+        servo_ids = list(range(1, servo_count + 1))
+        portHandler = SimulatedPort(servo_ids)
+        packetHandler = PacketHandler(PROTOCOL_VERSION)
+        portHandler.openPort()
+
+        servos = [Servo(servo_id, portHandler, packetHandler) for servo_id in servo_ids]
+        group = ServoGroup(servo_ids, portHandler, packetHandler)
+
+        def individual(count):
+            for servo in servos:
+                servo.set_position(count % 1024)
+
+        def synchronized(count):
+            group.set_positions({servo_id: count % 1024 for servo_id in servo_ids})
+
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+            individual_rate = run_for(BENCHMARK_SECONDS, individual) * servo_count
+            group_rate = run_for(BENCHMARK_SECONDS, synchronized) * servo_count
+
+        print("%6d | %15.0f | %16.0f | %6.1fx"
+              % (servo_count, individual_rate, group_rate, group_rate / individual_rate))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""
+Traffic recorder benchmark
+
+This script reads the positions of three virtual servos with and without a
+TrafficRecorder attached and reports what recording adds to a transaction.
+It then filters the log by servo ID and instruction through the memory-mapped
+reader, and replays the session through a ReplayPort to compare the round
+trips of the replay with the recorded ones. The bus runs in this process and
+the servos are driven through GPIOPacketHandler, which blocks on the port
+instead of polling.
+
+Use: python3 benchmark_traffic_recorder.py
+"""
+
+import os
+import tempfile
+import time
+from dynamixel_sdk import *
+from mbot_xl320_library import *
+from mbot_xl320_library import ReplayPort, TrafficLog, TrafficRecorder, VirtualBus
+
+SERVO_IDS = [1, 2, 3]
+ROUNDS = 300
+
+
+def session(portHandler, packetHandler):
+    """@return The mean seconds per round of a Sync Write, a Sync Read and a single read."""
+    group = ServoGroup(SERVO_IDS, portHandler, packetHandler, quiet=True)
+    servo = Servo(SERVO_IDS[0], portHandler, packetHandler, quiet=True)
+    start = time.perf_counter()
+    for index in range(ROUNDS):
+        group.set_positions({servo_id: 300 + index for servo_id in SERVO_IDS})
+        group.get_positions()
+        servo.get_position()
+    return (time.perf_counter() - start) / ROUNDS
+
+
+def main():
+    path = os.path.join(tempfile.mkdtemp(), "session.log")
+    bus = VirtualBus(SERVO_IDS).start()
+    portHandler, packetHandler = initialize_gpio_handlers(bus.port_name, TURNAROUND_DRAIN, "none")
+    open_port(portHandler, quiet=True)
+    try:
+        plain = session(portHandler, packetHandler)
+        recorder = TrafficRecorder(path)
+        recorder.attach(packetHandler)
+        recorded = session(portHandler, packetHandler)
+        recorder.close()
+    finally:
+        close_port(portHandler)
+        bus.stop()
+
+    print("round without recorder: %.3f ms" % (plain * 1e3))
+    print("round with recorder:    %.3f ms (%d packets, %d bytes logged)" % (
+        recorded * 1e3, recorder.records, recorder.bytes_written))
+
+    # The cost of one record, without the bus
+    timestamp = time.monotonic()
+    packet = bytes(14)
+    scratch = TrafficRecorder(path + ".scratch")
+    start = time.perf_counter()
+    for _ in range(100000):
+        scratch._append(timestamp, COMM_SUCCESS, 0, 1, INST_READ, packet)
+    per_record = (time.perf_counter() - start) / 100000
+    scratch.close()
+    os.remove(path + ".scratch")
+    print("cost of one record:     %.2f us" % (per_record * 1e6))
+
+    with TrafficLog(path) as log:
+        start = time.perf_counter()
+        total = sum(1 for _ in log.records())
+        matches = sum(1 for _ in log.records(servo_id=1, instruction=INST_READ))
+        elapsed = time.perf_counter() - start
+        print("filtered %d of %d records twice in %.2f ms" % (matches, total, elapsed * 1e3))
+        recorded_latency = log.latencies(servo_id=1, instruction=INST_READ)
+
+        port = ReplayPort(log)
+        port.openPort()
+        replayed = session(port, GPIOPacketHandler(TURNAROUND_DRAIN, "none"))
+
+    print("replayed round:         %.3f ms, %d mismatched packets" % (replayed * 1e3, port.mismatches))
+    print("recorded read round trip of ID 1: mean %.3f ms, max %.3f ms" % (
+        sum(recorded_latency) / len(recorded_latency) * 1e3, max(recorded_latency) * 1e3))
+    os.remove(path)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+"""
+Trajectory streaming benchmark
+
+This script plans a minimum-jerk trajectory for a set of servos, streams it
+to the virtual XL320 bus with TrajectoryStreamer at increasing tick rates,
+and reports deadline misses, tick jitter and write time per tick, so the
+rate at which the bus saturates is visible. It also times the planning step.
+
+Use: python3 benchmark_trajectory.py
+"""
+
+import time
+
+from mbot_xl320_library import *
+from mbot_xl320_library import PROFILE_TRAPEZOIDAL, Trajectory, TrajectoryStreamer, VirtualBus
+
+SERVO_COUNT = 8
+SEGMENT_SECONDS = 0.5
+RATES = [50, 100, 200, 500, 1000, 2000]
+
+
+def main():
+    servo_ids = list(range(1, SERVO_COUNT + 1))
+    waypoints = [[200] * SERVO_COUNT, [800] * SERVO_COUNT, [512] * SERVO_COUNT]
+    durations = [SEGMENT_SECONDS, SEGMENT_SECONDS]
+
+    start = time.perf_counter()
+    long_waypoints = waypoints * 10                         # 29 segments, 14.5 s
+    planned = Trajectory.from_waypoints(servo_ids, long_waypoints, [SEGMENT_SECONDS] * 29, rate=1000.0,
+                                        profile=PROFILE_TRAPEZOIDAL)
+    print("planned %d ticks x %d servos in %.1f ms"
+          % (len(planned), SERVO_COUNT, (time.perf_counter() - start) * 1000.0))
+
+    bus = VirtualBus(servo_ids).start(process=True)
+    portHandler, packetHandler = initialize_handlers(bus.port_name)
+    open_port(portHandler, quiet=True)
+    streamer = TrajectoryStreamer(portHandler, packetHandler)
+
+    print(" rate Hz | ticks | misses | skipped | jitter p99 ms | write mean ms | period ms")
+    try:
+        for rate in RATES:
+            trajectory = Trajectory.from_waypoints(servo_ids, waypoints, durations, rate=rate)
+            stats = streamer.play(trajectory)
+            print("%8d | %5d | %6d | %7d | %13.3f | %13.3f | %9.3f"
+                  % (rate, stats["ticks"], stats["deadline_misses"], stats["skipped_ticks"],
+                     stats["jitter_p99_ms"], stats["write_time_mean_ms"], stats["period_ms"]))
+    finally:
+        close_port(portHandler)
+        bus.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""
+Virtual bus benchmark suite
+
+This script runs single reads and writes, Ping and group operations against
+the virtual XL320 bus (mbot_xl320_library.virtual_xl320), which models the
+wire time at 1 Mbps and the default 500 us Return Delay Time of every servo,
+and reports transactions per second and p50/p99 latency. The bus runs in its
+own process so its timing does not compete with the benchmark for the GIL.
+Every operation is measured with the stock PacketHandler and with
+GPIOPacketHandler in drain mode without a direction pin.
+
+Use: python3 benchmark_virtual_bus.py
+"""
+
+import time
+
+from dynamixel_sdk import *
+from mbot_xl320_library import *
+from mbot_xl320_library import VirtualBus
+
+BENCHMARK_SECONDS = 1.0     # time spent measuring each operation
+SERVO_COUNT = 8             # servos on the bus, all of them take part in the group operations
+
+
+def percentile(sorted_samples, fraction):
+    return sorted_samples[min(int(len(sorted_samples) * fraction), len(sorted_samples) - 1)]
+
+
+def measure(operation):
+    """@return A (transactions per second, p50 ms, p99 ms) tuple."""
+    latencies = []
+    start = time.perf_counter()
+    while time.perf_counter() - start < BENCHMARK_SECONDS:
+        began = time.perf_counter()
+        operation(len(latencies))
+        latencies.append(time.perf_counter() - began)
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+    return len(latencies) / elapsed, percentile(latencies, 0.5) * 1e3, percentile(latencies, 0.99) * 1e3
+
+
+def settle(portHandler, packetHandler, servo_id):
+    # Writes without a status packet may still be queued in the pty; once a Ping
+    # is answered, everything sent before it has left the bus.
+    for _ in range(100):
+        if packetHandler.ping(portHandler, servo_id)[1] == COMM_SUCCESS:
+            return
+    raise RuntimeError("the virtual bus does not answer")
+
+
+def operations(portHandler, packetHandler, servo_ids):
+    servo = Servo(servo_ids[0], portHandler, packetHandler, quiet=True)
+    group = ServoGroup(servo_ids, portHandler, packetHandler, quiet=True)
+    return [
+        ("ping", lambda count: packetHandler.ping(portHandler, servo_ids[0])),
+        ("read position", lambda count: servo.get_position()),
+        ("write position", lambda count: servo.set_position(count % 1024)),
+        ("sync write x%d" % len(servo_ids),
+         lambda count: group.set_positions({servo_id: count % 1024 for servo_id in servo_ids})),
+        ("sync read x%d" % len(servo_ids), lambda count: group.get_positions()),
+        ("feedback x%d" % len(servo_ids), lambda count: group.read_feedback()),
+    ]
+
+
+def main():
+    servo_ids = list(range(1, SERVO_COUNT + 1))
+    bus = VirtualBus(servo_ids).start(process=True)
+    handlers = [
+        ("stock", initialize_handlers(bus.port_name)),
+        ("gpio drain", initialize_gpio_handlers(bus.port_name, TURNAROUND_DRAIN, direction="none")),
+    ]
+
+    print("handler    | operation      |    tx/s | p50 ms | p99 ms")
+    try:
+        for handler_name, (portHandler, packetHandler) in handlers:
+            open_port(portHandler, quiet=True)
+            set_baudrate(portHandler, BAUDRATE, quiet=True)
+            for name, operation in operations(portHandler, packetHandler, servo_ids):
+                settle(portHandler, packetHandler, servo_ids[0])
+                rate, p50, p99 = measure(operation)
+                print("%-10s | %-14s | %7.0f | %6.3f | %6.3f" % (handler_name, name, rate, p50, p99))
+            close_port(portHandler)
+    finally:
+        bus.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""
+wait_until_reached benchmark
+
+This script moves servos on the virtual XL320 bus across most of their range
+and waits for them in two ways: busy-looping get_position on every servo
+until it is within DXL_MOVING_STATUS_THRESHOLD, as examples used to do, and
+wait_until_reached. It reports the wall time, the CPU time of this process
+and the number of instruction packets sent during the wait.
+
+Use: python3 benchmark_wait_until_reached.py
+"""
+
+import time
+
+from dynamixel_sdk import *
+from mbot_xl320_library import *
+from mbot_xl320_library import VirtualBus, wait_until_reached
+
+SERVO_COUNT = 4
+JOINT_SPEED = 300           # about 200 degrees per second
+
+
+class CountingPort(PortHandler):
+    """@brief A PortHandler that counts the instruction packets it sends."""
+
+    def __init__(self, port_name):
+        super(CountingPort, self).__init__(port_name)
+        self.packets = 0
+
+    def writePort(self, packet):
+        self.packets += 1
+        return super(CountingPort, self).writePort(packet)
+
+
+def busy_wait(servos, goal):
+    while True:
+        positions = [servo.get_position() for servo in servos]
+        if all(abs(goal - position) <= DXL_MOVING_STATUS_THRESHOLD for position in positions):
+            return
+
+
+def main():
+    servo_ids = list(range(1, SERVO_COUNT + 1))
+    bus = VirtualBus(servo_ids).start(process=True)
+    portHandler = CountingPort(bus.port_name)
+    packetHandler = PacketHandler(PROTOCOL_VERSION)
+    open_port(portHandler, quiet=True)
+
+    servos = [Servo(servo_id, portHandler, packetHandler, quiet=True) for servo_id in servo_ids]
+    group = ServoGroup(servo_ids, portHandler, packetHandler, quiet=True)
+    group.set_joint_speeds({servo_id: JOINT_SPEED for servo_id in servo_ids})
+    group.enable_torque()
+
+    # Start from one end so that both methods wait for the same full-range move
+    goal = DXL_MINIMUM_POSITION_VALUE
+    group.set_positions({servo_id: goal for servo_id in servo_ids})
+    wait_until_reached(servos, [goal] * SERVO_COUNT)
+
+    print("method             | wall s | cpu s | packets")
+    try:
+        for name, wait in (("busy get_position", lambda goal: busy_wait(servos, goal)),
+                           ("wait_until_reached", lambda goal: wait_until_reached(servos, [goal] * SERVO_COUNT))):
+            goal = DXL_MINIMUM_POSITION_VALUE if goal == DXL_MAXIMUM_POSITION_VALUE else DXL_MAXIMUM_POSITION_VALUE
+            group.set_positions({servo_id: goal for servo_id in servo_ids})
+            packets = portHandler.packets
+            wall, cpu = time.perf_counter(), time.process_time()
+            wait(goal)
+            print("%-18s | %6.2f | %5.2f | %7d" % (name, time.perf_counter() - wall, time.process_time() - cpu,
+                                                 portHandler.packets - packets))
+    finally:
+        group.disable_torque()
+        close_port(portHandler)
+        bus.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""
+Wheel speed control benchmark
+
+This script sets two virtual servos in wheel mode to a target speed, first
+open loop with set_wheel_speeds() and then with a WheelSpeedController at
+200 Hz, on a nominal supply and again with a low supply voltage and an
+external load. It reports the mean speed error once the speed settled, and
+the period, jitter and overruns of the control loop. The motors of the
+virtual bus slow down with the voltage and under load like a DC motor. The
+bus runs in this process so its conditions can be changed, and the servos are
+driven through GPIOPacketHandler, which blocks on the port instead of polling.
+
+Use: python3 benchmark_wheel_control.py
+"""
+
+import time
+from dynamixel_sdk import *
+from mbot_xl320_library import *
+from mbot_xl320_library import VirtualBus, WheelSpeedController
+
+SERVO_IDS = [1, 2]
+TARGETS_RPM = {1: 40.0, 2: -60.0}
+CONDITIONS = (("7.4 V, no load", 7.4, 0.0), ("6.0 V, 30% load", 6.0, 0.3))
+RATE = 200.0
+SETTLE_TIME = 0.5
+MEASURE_TIME = 1.0
+MAX_RPM = 1023 * DXL_SPEED_UNIT_RPM
+
+
+def mean_error(group, duration):
+    """@return The mean absolute speed error in rpm over duration, read every 10 ms."""
+    total = 0.0
+    samples = 0
+    end = time.monotonic() + duration
+    while time.monotonic() < end:
+        for servo_id, status in group.read_status().items():
+            total += abs(status.speed_rpm - TARGETS_RPM[servo_id])
+            samples += 1
+        time.sleep(0.01)
+    return total / samples
+
+
+def main():
+    bus = VirtualBus(SERVO_IDS).start()
+    portHandler, packetHandler = initialize_gpio_handlers(bus.port_name, TURNAROUND_DRAIN, "none")
+    open_port(portHandler, quiet=True)
+
+    group = ServoGroup(SERVO_IDS, portHandler, packetHandler, quiet=True)
+    for servo_id in SERVO_IDS:
+        Servo(servo_id, portHandler, packetHandler, quiet=True).set_control_mode("wheel")
+    group.enable_torque()
+
+    print("conditions      | open loop error | closed loop error   (mean |rpm| once settled)")
+    try:
+        for name, voltage, load in CONDITIONS:
+            bus.set_conditions(voltage=voltage, load=load)
+
+            group.set_wheel_speeds({servo_id: rpm / MAX_RPM * 100 for servo_id, rpm in TARGETS_RPM.items()})
+            time.sleep(SETTLE_TIME)
+            open_loop = mean_error(group, MEASURE_TIME)
+            group.set_wheel_speeds({servo_id: 0 for servo_id in SERVO_IDS})
+            time.sleep(SETTLE_TIME)
+
+            controller = WheelSpeedController(SERVO_IDS, portHandler, packetHandler, rate=RATE)
+            controller.set_targets(TARGETS_RPM)
+            with controller:
+                time.sleep(SETTLE_TIME)
+                errors = []
+                end = time.monotonic() + MEASURE_TIME
+                while time.monotonic() < end:
+                    stats = controller.get_stats()
+                    errors.extend(abs(stats[servo_id]["measured_rpm"] - TARGETS_RPM[servo_id])
+                                  for servo_id in SERVO_IDS)
+                    time.sleep(0.01)
+            closed_loop = sum(errors) / len(errors)
+            stats = controller.get_stats()
+            print("%-15s | %15.2f | %17.2f" % (name, open_loop, closed_loop))
+            print("  loop: period %.1f ms, rate %.1f Hz, jitter mean/p99/max %.3f/%.3f/%.3f ms, "
+                  "loop time mean/max %.3f/%.3f ms, overruns %d, skipped %d, failed reads %d" % (
+                      stats["period_ms"], stats["rate"], stats["jitter_mean_ms"], stats["jitter_p99_ms"],
+                      stats["jitter_max_ms"], stats["loop_time_mean_ms"], stats["loop_time_max_ms"],
+                      stats["overruns"], stats["skipped_cycles"], stats["failed_reads"]))
+            time.sleep(SETTLE_TIME)
+    finally:
+        group.disable_torque()
+        close_port(portHandler)
+        bus.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -8,6 +8,7 @@ Use: sudo python3 rotate_full_range.py
 """
 
 from mbot_xl320_library import *
+from mbot_xl320_library import ServoProfile, provision, wait_until_reached
 
 # Define your settings here
 # CONNECTION_DEVICE = "UART"    # change to "UART" if you are using UART connection
@@ -34,19 +35,15 @@ def main():
     open_port(portHandler)
     set_baudrate(portHandler, 1000000)
 
-    # Initialize a Servo instance
+    # Initialize the Servo instances
     servo1 = Servo(servo1_ID, portHandler, packetHandler)
-    servo1.change_led_color(LED_PURPLE)
-    servo1.disable_torque()
-    servo1.set_control_mode("joint")  # torque must be off when you change mode
-    servo1.enable_torque()
-
-    # Initialize second Servo instance
     servo2 = Servo(servo2_ID, portHandler, packetHandler)
-    servo2.change_led_color(LED_YELLOW)
-    servo2.disable_torque()
-    servo2.set_control_mode("joint")  # torque must be off when you change mode
-    servo2.enable_torque()
+
+    # Only the settings that differ are written; torque is switched off only to change the mode
+    provision({
+        servo1_ID: ServoProfile(mode="joint", led=LED_PURPLE, speed=200, torque=True),  # speed range(0,1023)
+        servo2_ID: ServoProfile(mode="joint", led=LED_YELLOW, speed=200, torque=True),
+    }, portHandler, packetHandler)
 
     index = 0
     goal_positions = [
@@ -54,9 +51,6 @@ def main():
         DXL_MAXIMUM_POSITION_VALUE,
     ]  # these are the actual limits of the servo
 
-    servo1.set_joint_speed(200)  # range(0,1023)
-    servo2.set_joint_speed(200)  # range(0,1023)
-
     while True:
         print("Press any key to continue! (or press ESC to quit!)")
         if getch() == chr(0x1B):
@@ -64,20 +58,17 @@ def main():
         
         servo1.set_position(goal_positions[index])
         servo2.set_position(goal_positions[index])
-        while True:
-            servo1_current_position = servo1.get_position()
-            servo2_current_position = servo2.get_position()
-
-            if goal_positions[index] is None or servo1_current_position is None or servo2_current_position is None:
-                continue
-            
-            print("---")
-            print("[ID:%d] GoalPos:%d  PresPos:%d"  % (servo1_ID, goal_positions[index], servo1_current_position))
-            print("[ID:%d] GoalPos:%d  PresPos:%d"  % (servo2_ID, goal_positions[index], servo2_current_position))
-
-            if (not abs(goal_positions[index] - servo1_current_position)> DXL_MOVING_STATUS_THRESHOLD) \
-                and (not abs(goal_positions[index] - servo2_current_position)> DXL_MOVING_STATUS_THRESHOLD):
-                break
+
+        # one group read per poll instead of busy-looping get_position on every servo
+        arrival_times = wait_until_reached(
+            [servo1, servo2], [goal_positions[index]] * 2, DXL_MOVING_STATUS_THRESHOLD, timeout=10.0
+        )
+        print("---")
+        for servo_ID, seconds in arrival_times.items():
+            if seconds is None:
+                print("[ID:%d] GoalPos:%d  not reached!" % (servo_ID, goal_positions[index]))
+            else:
+                print("[ID:%d] GoalPos:%d  reached in %.2fs" % (servo_ID, goal_positions[index], seconds))
 
         # Change goal position
         if index == 0:
@@ -9,6 +9,7 @@ Use: sudo python3 rotate_in_circle.py
 """
 
 from mbot_xl320_library import *
+from mbot_xl320_library import ServoProfile, provision
 
 # Define your settings here
 # CONNECTION_DEVICE = "UART"    # change to "UART" if you are using UART connection
@@ -33,16 +34,13 @@ def main():
     set_baudrate(portHandler, 1000000)
 
     servo1 = Servo(servo1_ID, portHandler, packetHandler)
-    servo1.change_led_color(LED_CYAN)
-    servo1.disable_torque()
-    servo1.set_control_mode("wheel")  # torque must be off when you change mode
-    servo1.enable_torque()
-
     servo2 = Servo(servo2_ID, portHandler, packetHandler)
-    servo2.change_led_color(LED_PURPLE)
-    servo2.disable_torque()
-    servo2.set_control_mode("wheel")  # torque must be off when you change mode
-    servo2.enable_torque()
+
+    # Only the settings that differ are written; torque is switched off only to change the mode
+    provision({
+        servo1_ID: ServoProfile(mode="wheel", led=LED_CYAN, torque=True),
+        servo2_ID: ServoProfile(mode="wheel", led=LED_PURPLE, torque=True),
+    }, portHandler, packetHandler)
 
     print("Press any key to continue! (or press ESC to quit!)")
     if getch() == chr(0x1B):
@@ -8,5 +8,6 @@ setup(
     description='Python library to use XL320 Servo',
     author='Shaw Sun',
     author_email='xssun@umich.edu',
-    install_requires=['dynamixel_sdk']
+    install_requires=['dynamixel_sdk'],
+    extras_require={'trajectory': ['numpy']}
 )
@@ -1,4 +1,133 @@
-from .servo import *
+import importlib
+import types
+
+from . import config
 from .config import *
-from .utils import *
-from .gpio_protocol2_packet_handler import *
\ No newline at end of file
+
+# Public names of the submodules, imported on first access so that importing the
+# package does not load the Dynamixel SDK, pyserial or Jetson.GPIO until they are used.
+_LAZY_ATTRIBUTES = {
+    "Servo": "servo",
+    "ServoGroup": "servo_group",
+    "getch": "utils",
+    "initialize_handlers": "utils",
+    "initialize_gpio_handlers": "utils",
+    "initialize_GPIO": "utils",
+    "close_GPIO": "utils",
+    "open_port": "utils",
+    "close_port": "utils",
+    "set_baudrate": "utils",
+    "GPIOPacketHandler": "gpio_protocol2_packet_handler",
+    "TransactionTimer": "gpio_protocol2_packet_handler",
+    "ServoLink": "gpio_protocol2_packet_handler",
+    "COMM_BREAKER_OPEN": "gpio_protocol2_packet_handler",
+    "FastPacketHandler": "packet_codec",
+    "DirectionControl": "direction_control",
+    "JetsonGPIODirection": "direction_control",
+    "KernelRS485Direction": "direction_control",
+    "GpiodDirection": "direction_control",
+    "NoOpDirection": "direction_control",
+    "MockDirection": "direction_control",
+    "DIRECTION_BACKENDS": "direction_control",
+    "make_direction_control": "direction_control",
+    "TelemetrySample": "telemetry",
+    "TelemetryRing": "telemetry",
+    "TelemetryPoller": "telemetry",
+    "ServoProfile": "provisioning",
+    "Provisioner": "provisioning",
+    "provision": "provisioning",
+    "StateServer": "state_server",
+    "StateClient": "state_server",
+    "TrafficRecorder": "traffic_recorder",
+    "TrafficRecord": "traffic_recorder",
+    "TrafficLog": "traffic_recorder",
+    "ReplayPort": "traffic_recorder",
+    "WheelSpeedController": "wheel_control",
+    "WheelChannel": "wheel_control",
+    "Register": "control_table",
+    "XL320_CONTROL_TABLE": "control_table",
+    "ControlTableShadow": "control_table",
+    "ServoResult": "errors",
+    "ServoError": "errors",
+    "CommError": "errors",
+    "HardwareError": "errors",
+    "VirtualXL320": "virtual_xl320",
+    "VirtualBus": "virtual_xl320",
+    "Trajectory": "trajectory",
+    "TrajectoryStreamer": "trajectory",
+    "PROFILE_LINEAR": "trajectory",
+    "PROFILE_MIN_JERK": "trajectory",
+    "PROFILE_TRAPEZOIDAL": "trajectory",
+    "wait_until_reached": "motion",
+    "async_wait_until_reached": "motion",
+    "AsyncBus": "async_bus",
+    "AsyncServo": "async_bus",
+    "BusScheduler": "scheduler",
+    "Histogram": "scheduler",
+    "FixedRateLoop": "scheduler",
+    "PRIORITY_EMERGENCY": "scheduler",
+    "PRIORITY_COMMAND": "scheduler",
+    "PRIORITY_TELEMETRY": "scheduler",
+    "PRIORITY_DIAGNOSTIC": "scheduler",
+    "DiscoveredServo": "discovery",
+    "broadcast_ping": "discovery",
+    "scan_port": "discovery",
+    "scan_ports": "discovery",
+    "SCAN_BAUDRATES": "discovery",
+    "ServoStatus": "status",
+    "BusManager": "bus_manager",
+    "RoutedServo": "bus_manager",
+}
+
+# The core API a star import brings in, next to the constants of config.py and the names of the
+# Dynamixel SDK. Everything else above is reached by attribute access or an explicit import, so a
+# star import does not load asyncio, shared memory, NumPy (an optional dependency,
+# pip3 install .[trajectory]) or the other subsystems a script does not use.
+_CORE_ATTRIBUTES = (
+    "Servo",
+    "ServoGroup",
+    "ServoResult",
+    "ServoError",
+    "CommError",
+    "HardwareError",
+    "getch",
+    "initialize_handlers",
+    "initialize_gpio_handlers",
+    "initialize_GPIO",
+    "close_GPIO",
+    "open_port",
+    "close_port",
+    "set_baudrate",
+    "GPIOPacketHandler",
+)
+
+
+
+def _sdk_names():
+    """@return The public names of the Dynamixel SDK (PortHandler, COMM_SUCCESS, ...), without its submodules."""
+    sdk = importlib.import_module("dynamixel_sdk")
+    return [name for name, value in vars(sdk).items()
+            if not name.startswith("_") and not isinstance(value, types.ModuleType)]
+
+
+def __getattr__(name):
+    if name == "__all__":
+        # Built on the first star import, which loads the Dynamixel SDK through Servo anyway
+        value = [name for name in dir(config) if not name.startswith("_")] + list(_CORE_ATTRIBUTES)
+        value += [name for name in _sdk_names() if name not in value]
+        globals()["__all__"] = value
+        return value
+    if name in _LAZY_ATTRIBUTES:
+        module = importlib.import_module("." + _LAZY_ATTRIBUTES[name], __name__)
+    elif name in _sdk_names():
+        # The Dynamixel SDK names stay reachable through the package, as they always were
+        module = importlib.import_module("dynamixel_sdk")
+    else:
+        raise AttributeError("module %r has no attribute %r" % (__name__, name))
+    value = getattr(module, name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_LAZY_ATTRIBUTES))
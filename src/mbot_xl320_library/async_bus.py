@@ -0,0 +1,287 @@
+import asyncio
+from . import config
+from .errors import CommError, HardwareError, ServoResult
+from .packet_codec import parse_status, split_packets
+from dynamixel_sdk import (  # Uses Dynamixel SDK library
+    BROADCAST_ID,
+    COMM_RX_CORRUPT,
+    COMM_RX_TIMEOUT,
+    COMM_SUCCESS,
+    DXL_MAKEWORD,
+    INST_PING,
+    PKT_ID,
+    PKT_INSTRUCTION,
+    PKT_LENGTH_H,
+    PKT_LENGTH_L,
+)
+
+STATUS_OVERHEAD = 11  # header, reserved, ID, length, instruction, error and CRC of a status packet
+
+
+class AsyncBus:
+    """
+    @brief Shares one port between asyncio coroutines.
+
+    Instruction packets are built and sent by the packet handler, so
+    GPIOPacketHandler still flips the direction pin around them. Status
+    packets are not polled for: the serial fd is registered with the event
+    loop (loop.add_reader) and parsed as bytes arrive, so the loop runs other
+    tasks while a status packet is in flight. Transactions queue up on a lock
+    in the order they were awaited, one on the bus at a time.
+
+    A packet handler whose direction backend toggles the line from Python
+    blocks while the packet leaves the UART (tcdrain, and a busy-wait in drain
+    mode), so its sends run in the loop's default executor. Other packet
+    handlers send on the loop thread.
+    """
+
+    def __init__(self, portHandler, packetHandler):
+        self.portHandler = portHandler
+        self.packetHandler = packetHandler
+        self._lock = asyncio.Lock()
+        self._loop = None
+        self._fd = None
+        self._buffer = bytearray()
+        self._expected = None       # IDs the transaction in flight waits for
+        self._packets = {}
+        self._waiter = None
+        self._corrupt = False
+
+    def _attach(self):
+        loop = asyncio.get_running_loop()
+        fd = self.portHandler.ser.fileno()
+        if self._loop is loop and self._fd == fd:
+            return
+        self.close()
+        self._loop = loop
+        self._fd = fd
+        loop.add_reader(fd, self._on_readable)
+
+    def close(self):
+        """@brief Unregisters the port from the event loop. The port itself stays open."""
+        if self._loop is not None and self._fd is not None:
+            self._loop.remove_reader(self._fd)
+        self._loop = None
+        self._fd = None
+
+    def _on_readable(self):
+        data = self.portHandler.readPort(max(self.portHandler.getBytesAvailable(), 1))
+        if not data:
+            return
+        self._buffer += data
+        self._parse()
+
+    def _parse(self):
+        for packet in split_packets(self._buffer):
+            self._deliver(packet)
+
+    def _deliver(self, packet):
+        if self._expected is None or packet[PKT_ID] not in self._expected:
+            return  # late answer of a timed out transaction, or noise
+        status = parse_status(packet)
+        if status is None:
+            self._corrupt = True
+        else:
+            self._packets[packet[PKT_ID]] = (status[2], status[1])
+        self._expected.discard(packet[PKT_ID])
+        if not self._expected and self._waiter is not None and not self._waiter.done():
+            self._waiter.set_result(None)
+
+    async def _transaction(self, send, servo_ids, status_length):
+        """
+        @brief Sends an instruction and collects the status packets of servo_ids.
+
+        @param send Sends the instruction packet and returns its communication result.
+        @param servo_ids The IDs expected to answer, in any order.
+        @param status_length The parameter bytes in each status packet, for the timeout.
+
+        @return A (dxl_comm_result, results) tuple: the result of sending, and a dict
+                mapping each of servo_ids to a (params, dxl_comm_result, dxl_error) tuple.
+        """
+        async with self._lock:
+            self._attach()
+            port = self.portHandler
+            self._buffer.clear()
+            self._expected = set(servo_ids)
+            self._packets = {}
+            self._corrupt = False
+            self._waiter = self._loop.create_future()
+            try:
+                direction = getattr(self.packetHandler, "direction", None)
+                if direction is not None and direction.toggles:
+                    dxl_comm_result = await self._loop.run_in_executor(None, send)
+                else:
+                    dxl_comm_result = send()
+                port.is_using = False
+                if dxl_comm_result == COMM_SUCCESS and self._expected:
+                    port.setPacketTimeout((STATUS_OVERHEAD + status_length) * len(servo_ids))
+                    try:
+                        await asyncio.wait_for(self._waiter, port.packet_timeout / 1000.0)
+                    except asyncio.TimeoutError:
+                        pass
+                    missing = COMM_RX_CORRUPT if self._corrupt else COMM_RX_TIMEOUT
+                else:
+                    missing = dxl_comm_result
+            finally:
+                packets = self._packets
+                self._expected = None
+                self._waiter = None
+
+        results = {}
+        for servo_id in servo_ids:
+            if servo_id in packets:
+                params, dxl_error = packets[servo_id]
+                results[servo_id] = (params, COMM_SUCCESS, dxl_error)
+            else:
+                results[servo_id] = (b"", missing, 0)
+        return dxl_comm_result, results
+
+    async def ping(self, servo_id):
+        """@return A (model_number, dxl_comm_result, dxl_error) tuple."""
+        txpacket = [0] * 10
+        txpacket[PKT_ID] = servo_id
+        txpacket[PKT_LENGTH_L] = 3
+        txpacket[PKT_LENGTH_H] = 0
+        txpacket[PKT_INSTRUCTION] = INST_PING
+        _, results = await self._transaction(
+            lambda: self.packetHandler.txPacket(self.portHandler, txpacket), [servo_id], 3)
+        params, dxl_comm_result, dxl_error = results[servo_id]
+        model_number = DXL_MAKEWORD(params[0], params[1]) if dxl_comm_result == COMM_SUCCESS else 0
+        return model_number, dxl_comm_result, dxl_error
+
+    async def read(self, servo_id, address, length):
+        """@return A (data, dxl_comm_result, dxl_error) tuple, data being length bytes."""
+        _, results = await self._transaction(
+            lambda: self.packetHandler.readTx(self.portHandler, servo_id, address, length),
+            [servo_id], length)
+        return results[servo_id]
+
+    async def write(self, servo_id, address, length, value):
+        """
+        @brief Writes a length byte value (little endian) to one servo, or to all with BROADCAST_ID.
+
+        @return A (dxl_comm_result, dxl_error) tuple.
+        """
+        data = list(value.to_bytes(length, "little"))
+        answering = [] if servo_id == BROADCAST_ID else [servo_id]
+        dxl_comm_result, results = await self._transaction(
+            lambda: self.packetHandler.writeTxOnly(self.portHandler, servo_id, address, length, data),
+            answering, 0)
+        if not answering:
+            return dxl_comm_result, 0
+        return results[servo_id][1:]
+
+    async def sync_write(self, address, length, values):
+        """
+        @brief Writes one register of many servos with a single Sync Write, no status packets follow.
+
+        @param values A dict mapping servo ID to the value to write.
+
+        @return The communication result.
+        """
+        param = []
+        for servo_id, value in values.items():
+            param.append(servo_id)
+            param.extend(value.to_bytes(length, "little"))
+        dxl_comm_result, _ = await self._transaction(
+            lambda: self.packetHandler.syncWriteTxOnly(self.portHandler, address, length, param, len(param)),
+            [], 0)
+        return dxl_comm_result
+
+    async def sync_read(self, address, length, servo_ids):
+        """
+        @brief Reads one block of registers from many servos with a single Sync Read.
+
+        @return A dict mapping servo ID to a (data, dxl_comm_result, dxl_error) tuple.
+                A status packet without the length bytes asked for is COMM_RX_CORRUPT.
+        """
+        servo_ids = list(servo_ids)
+        _, results = await self._transaction(
+            lambda: self.packetHandler.syncReadTx(self.portHandler, address, length, servo_ids,
+                                                  len(servo_ids)),
+            servo_ids, length)
+        for servo_id, (data, dxl_comm_result, dxl_error) in results.items():
+            if dxl_comm_result == COMM_SUCCESS and len(data) != length:
+                results[servo_id] = (b"", COMM_RX_CORRUPT, dxl_error)
+        return results
+
+
+class AsyncServo:
+    """
+    @brief Awaitable counterpart of Servo(quiet=True) on an AsyncBus.
+
+    Setters return a ServoResult, getters return the value, and failures
+    raise CommError or HardwareError.
+    """
+
+    def __init__(self, servo_id, bus):
+        self.servo_id = servo_id
+        self.bus = bus
+
+    def _check(self, dxl_comm_result, dxl_error, value=None):
+        packetHandler = self.bus.packetHandler
+        if dxl_comm_result != COMM_SUCCESS:
+            raise CommError(self.servo_id, dxl_comm_result, dxl_error,
+                            packetHandler.getTxRxResult(dxl_comm_result))
+        if dxl_error != 0:
+            raise HardwareError(self.servo_id, dxl_comm_result, dxl_error,
+                                packetHandler.getRxPacketError(dxl_error))
+        return ServoResult(self.servo_id, dxl_comm_result, dxl_error, value)
+
+    async def _write(self, address, length, value):
+        dxl_comm_result, dxl_error = await self.bus.write(self.servo_id, address, length, value)
+        return self._check(dxl_comm_result, dxl_error, value)
+
+    async def _read(self, address, length):
+        data, dxl_comm_result, dxl_error = await self.bus.read(self.servo_id, address, length)
+        self._check(dxl_comm_result, dxl_error)
+        return int.from_bytes(data[:length], "little")
+
+    async def change_led_color(self, color):
+        return await self._write(config.ADDR_LED, 1, color)
+
+    async def enable_torque(self):
+        return await self._write(config.ADDR_TORQUE_ENABLE, 1, config.TORQUE_ENABLE)
+
+    async def disable_torque(self):
+        return await self._write(config.ADDR_TORQUE_ENABLE, 1, config.TORQUE_DISABLE)
+
+    async def get_position(self):
+        """@return The present position in range [0, 1023]."""
+        return await self._read(config.ADDR_PRESENT_POSITION, 2)
+
+    async def set_position(self, position):
+        return await self._write(config.ADDR_GOAL_POSITION, 2, position)
+
+    async def set_control_mode(self, mode):
+        """@param mode "wheel" or "joint". Torque must be disabled."""
+        if mode == "wheel":
+            return await self._write(config.ADDR_CONTROL_MODE, 1, config.WHEEL_MODE)
+        if mode == "joint":
+            return await self._write(config.ADDR_CONTROL_MODE, 1, config.JOINT_MODE)
+        raise ValueError("Invalid mode! Choose 'wheel' or 'joint'.")
+
+    async def set_joint_speed(self, speed):
+        """@param speed Range [0, 1023], 0 is the maximum speed without speed control."""
+        speed = int(speed)
+        if not 0 <= speed <= 1023:
+            raise ValueError("Speed must be between 0 and 1023")
+        return await self._write(config.ADDR_GOAL_SPEED, 2, speed)
+
+    async def set_wheel_ccw_speed(self, load):
+        """@param load The desired speed as a percentage (0-100)."""
+        load = int(load)
+        if not 0 <= load <= 100:
+            raise ValueError("Load must be between 0 and 100")
+        return await self._write(config.ADDR_GOAL_SPEED, 2, int(load * 0.01 * 1023))
+
+    async def set_wheel_cw_speed(self, load):
+        """@param load The desired speed as a percentage (0-100)."""
+        load = int(load)
+        if not 0 <= load <= 100:
+            raise ValueError("Load must be between 0 and 100")
+        return await self._write(config.ADDR_GOAL_SPEED, 2, int(load * 0.01 * 1023) + 1024)
+
+    async def read_register(self, address, length):
+        """@return The value of the length byte register at address."""
+        return await self._read(address, length)
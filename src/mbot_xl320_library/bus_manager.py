@@ -0,0 +1,247 @@
+import functools
+from .discovery import SCAN_BAUDRATES, scan_ports
+from .scheduler import PRIORITY_COMMAND, PRIORITY_TELEMETRY, BusScheduler
+from .servo import Servo
+from .servo_group import ServoGroup
+from dynamixel_sdk import MAX_ID  # Uses Dynamixel SDK library
+
+
+class RoutedServo:
+    """
+    @brief A Servo whose calls run on the worker thread of the bus it is on.
+
+    Every public method of Servo is available and blocks until the worker ran
+    it, so the handle is a drop-in replacement for a Servo shared between threads.
+    """
+
+    def __init__(self, servo, scheduler, priority=PRIORITY_COMMAND):
+        self.servo = servo
+        self.scheduler = scheduler
+        self.priority = priority
+
+    @property
+    def servo_id(self):
+        return self.servo.servo_id
+
+    def __getattr__(self, name):
+        attribute = getattr(self.servo, name)
+        if name.startswith("_") or not callable(attribute):
+            return attribute
+
+        def call(*args, **kwargs):
+            return self.scheduler.submit(self.priority, functools.partial(attribute, *args, **kwargs),
+                                         kind=name).result()
+
+        call.__name__ = name
+        call.__doc__ = attribute.__doc__
+        return call
+
+
+class BusManager:
+    """
+    @brief Drives servos spread over several serial ports as if they were on one bus.
+
+    Each port gets its own BusScheduler, so each bus has a worker thread and a
+    transaction queue of its own and the buses transfer at the same time. Servo
+    IDs are mapped to the bus they are on; servo() returns a handle that routes
+    calls to that bus, and the group methods split their servos by bus, run one
+    group transaction per bus in parallel and merge the results.
+    """
+
+    def __init__(self, buses, servo_map=None, quiet=False, logger=None, cycle_time=0.01, budget=None):
+        """
+        @param buses A dict mapping a bus name to its (portHandler, packetHandler) pair.
+        @param servo_map A dict mapping servo ID to bus name, see also assign().
+        @param quiet, logger Passed on to the Servo and ServoGroup objects, see Servo.
+        @param cycle_time, budget Passed on to each BusScheduler. The default budget of
+                                  None lets every bus run back to back.
+        """
+        self.buses = dict(buses)
+        self.quiet = quiet
+        self.logger = logger
+        self.schedulers = {
+            name: BusScheduler(portHandler, packetHandler, cycle_time=cycle_time, budget=budget)
+            for name, (portHandler, packetHandler) in self.buses.items()
+        }
+        self.servo_map = {}
+        self._handles = {}
+        self._groups = {}
+        for servo_id, name in (servo_map or {}).items():
+            self.assign([servo_id], name)
+
+    @classmethod
+    def from_discovery(cls, buses, baudrates=SCAN_BAUDRATES, max_id=MAX_ID, **kwargs):
+        """
+        @brief Scans every bus at the same time and maps each servo found to its bus.
+
+        Each port is left at the baudrate most of its servos answered at; servos
+        found at other baudrates are left out of the map.
+
+        @param buses A dict mapping a bus name to its (portHandler, packetHandler) pair.
+
+        @return A BusManager, not started yet.
+        """
+        names = {portHandler.getPortName(): name for name, (portHandler, _) in buses.items()}
+        found = scan_ports(buses.values(), baudrates, max_id)
+
+        servo_map = {}
+        for port_name, discovered in found.items():
+            if not discovered:
+                continue
+            counts = {}
+            for servo in discovered:
+                counts[servo.baudrate] = counts.get(servo.baudrate, 0) + 1
+            baudrate = max(counts, key=counts.get)
+            buses[names[port_name]][0].setBaudRate(baudrate)
+            for servo in discovered:
+                if servo.baudrate == baudrate:
+                    servo_map[servo.servo_id] = names[port_name]
+        return cls(buses, servo_map, **kwargs)
+
+    def assign(self, servo_ids, name):
+        """@brief Maps servo_ids to the bus called name, moving them off any other bus."""
+        if name not in self.buses:
+            raise ValueError("Unknown bus %r" % (name,))
+        for servo_id in servo_ids:
+            self.servo_map[servo_id] = name
+            self._handles.pop(servo_id, None)
+        self._groups.clear()
+
+    def start(self):
+        """@brief Starts the worker of every bus. From now on only the workers may use the ports."""
+        for scheduler in self.schedulers.values():
+            scheduler.start()
+        return self
+
+    def stop(self):
+        """@brief Stops the workers, cancelling the queued transactions."""
+        for scheduler in self.schedulers.values():
+            scheduler.stop()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def get_stats(self):
+        """@return A dict mapping bus name to the stats of its BusScheduler, see BusScheduler.get_stats()."""
+        return {name: scheduler.get_stats() for name, scheduler in self.schedulers.items()}
+
+    def bus_of(self, servo_id):
+        """@return The name of the bus servo_id is on."""
+        try:
+            return self.servo_map[servo_id]
+        except KeyError:
+            raise ValueError("Servo ID %d is not mapped to a bus" % servo_id) from None
+
+    def servo(self, servo_id):
+        """@return A RoutedServo for servo_id."""
+        handle = self._handles.get(servo_id)
+        if handle is None:
+            name = self.bus_of(servo_id)
+            portHandler, packetHandler = self.buses[name]
+            servo = Servo(servo_id, portHandler, packetHandler, quiet=self.quiet, logger=self.logger)
+            handle = self._handles[servo_id] = RoutedServo(servo, self.schedulers[name])
+        return handle
+
+    def submit(self, name, priority, function, *args, kind=None):
+        """
+        @brief Queues function(*args) on the worker of the bus called name.
+
+        @return A concurrent.futures.Future, see BusScheduler.submit().
+        """
+        return self.schedulers[name].submit(priority, function, *args, kind=kind)
+
+    def _group(self, name):
+        group = self._groups.get(name)
+        if group is None:
+            servo_ids = sorted(servo_id for servo_id, bus in self.servo_map.items() if bus == name)
+            portHandler, packetHandler = self.buses[name]
+            group = self._groups[name] = ServoGroup(servo_ids, portHandler, packetHandler,
+                                                    quiet=self.quiet, logger=self.logger)
+        return group
+
+    def _split(self, servo_ids):
+        """@return A dict mapping bus name to the list of servo_ids on it, every mapped servo by default."""
+        if servo_ids is None:
+            servo_ids = self.servo_map
+        per_bus = {}
+        for servo_id in servo_ids:
+            per_bus.setdefault(self.bus_of(servo_id), []).append(servo_id)
+        return per_bus
+
+    def _fan_out(self, method, per_bus, priority):
+        """
+        @brief Runs ServoGroup.method on every bus in per_bus at the same time.
+
+        @param per_bus A dict mapping bus name to the argument of method on that bus.
+
+        @return A dict mapping bus name to what method returned there.
+        """
+        futures = {
+            name: self.schedulers[name].group_call(self._group(name), method, argument, priority=priority)
+            for name, argument in per_bus.items()
+        }
+        return {name: future.result() for name, future in futures.items()}
+
+    def _write_values(self, method, values):
+        per_bus = {}
+        for servo_id, value in values.items():
+            per_bus.setdefault(self.bus_of(servo_id), {})[servo_id] = value
+        return self._fan_out(method, per_bus, PRIORITY_COMMAND)
+
+    def _read_merged(self, method, servo_ids):
+        merged = {}
+        for result in self._fan_out(method, self._split(servo_ids), PRIORITY_TELEMETRY).values():
+            merged.update(result)
+        return merged
+
+    def change_led_colors(self, colors):
+        """
+        @param colors A dict mapping servo ID to a color defined in config.py
+
+        @return A dict mapping bus name to the result of ServoGroup.change_led_colors on it.
+        """
+        return self._write_values("change_led_colors", colors)
+
+    def enable_torque(self, servo_ids=None):
+        """@return A dict mapping bus name to the result of ServoGroup.enable_torque on it."""
+        return self._fan_out("enable_torque", self._split(servo_ids), PRIORITY_COMMAND)
+
+    def disable_torque(self, servo_ids=None):
+        """@return A dict mapping bus name to the result of ServoGroup.disable_torque on it."""
+        return self._fan_out("disable_torque", self._split(servo_ids), PRIORITY_COMMAND)
+
+    def set_positions(self, goal_positions):
+        """
+        @param goal_positions A dict mapping servo ID to a goal position in range [0, 1023]
+
+        @return A dict mapping bus name to the result of ServoGroup.set_positions on it.
+        """
+        return self._write_values("set_positions", goal_positions)
+
+    def set_joint_speeds(self, speeds):
+        """@return A dict mapping bus name to the result of ServoGroup.set_joint_speeds on it."""
+        return self._write_values("set_joint_speeds", speeds)
+
+    def set_wheel_speeds(self, loads):
+        """@return A dict mapping bus name to the result of ServoGroup.set_wheel_speeds on it."""
+        return self._write_values("set_wheel_speeds", loads)
+
+    def get_positions(self, servo_ids=None):
+        """@return A dict mapping servo ID to its position, see ServoGroup.get_positions()."""
+        return self._read_merged("get_positions", servo_ids)
+
+    def read_feedback(self, servo_ids=None):
+        """@return A dict mapping servo ID to its feedback, see ServoGroup.read_feedback()."""
+        return self._read_merged("read_feedback", servo_ids)
+
+    def read_status(self, servo_ids=None):
+        """@return A dict mapping servo ID to its ServoStatus, see ServoGroup.read_status()."""
+        return self._read_merged("read_status", servo_ids)
+
+    def emergency_stop(self):
+        """@brief Disables torque on every bus at once, ahead of everything queued."""
+        futures = [scheduler.emergency_stop() for scheduler in self.schedulers.values()]
+        return [future.result() for future in futures]
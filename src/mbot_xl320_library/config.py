@@ -9,7 +9,10 @@ ADDR_LED                    = 25
 ADDR_GOAL_POSITION          = 30
 ADDR_GOAL_SPEED             = 32
 ADDR_PRESENT_POSITION       = 37
+ADDR_PRESENT_SPEED          = 39
+ADDR_PRESENT_LOAD           = 41
 ADDR_PRESENT_TEMPERATURE    = 46
+ADDR_MOVING                 = 49
 ADDR_HARDWARE_ERROR_STATUS  = 50
 
 # Define Actual Values
@@ -17,6 +20,8 @@ DXL_MINIMUM_POSITION_VALUE  = 0         # Refer to the CW Angle Limit of product
 DXL_MAXIMUM_POSITION_VALUE  = 1023      # Refer to the CCW Angle Limit of product eManual
 BAUDRATE                    = 1000000   # Default Baudrate of XL-320 is 1Mbps
 PROTOCOL_VERSION            = 2.0
+DXL_SPEED_UNIT_RPM          = 0.111     # Moving Speed unit, 0 means maximum speed
+DXL_POSITION_UNIT_DEGREE    = 300.0 / 1023  # Position unit, 1023 spans 300 degrees
 
 # Define Status in Decimal
 TORQUE_ENABLE               = 1     # Value for enabling the torque
@@ -37,4 +42,9 @@ LED_CYAN                    = 6
 LED_WHITE                   = 7
 
 # Jetson PIN number
-JETSON_CTL_PIN              = 12
\ No newline at end of file
+JETSON_CTL_PIN              = 12
+JETSON_CTL_LINE             = 79    # JETSON_CTL_PIN (GPIO79) as a line offset on gpiochip0, for libgpiod
+
+# Half-duplex turnaround modes of GPIOPacketHandler
+TURNAROUND_SLEEP            = "sleep"   # fixed sleeps after tx and between rx polls
+TURNAROUND_DRAIN            = "drain"   # wait for the UART to drain, block on the fd while receiving
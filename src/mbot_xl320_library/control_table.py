@@ -0,0 +1,155 @@
+from . import config
+
+EEPROM = "EEPROM"
+RAM = "RAM"
+
+
+class Register:
+    """@brief One entry of the XL320 control table."""
+
+    __slots__ = ("name", "address", "size", "area", "writable", "static")
+
+    def __init__(self, name, address, size, area, writable, static):
+        self.name = name
+        self.address = address
+        self.size = size
+        self.area = area
+        self.writable = writable
+        self.static = static  # the servo never changes it on its own, so reads can be cached
+
+
+# XL320 control table, see the product eManual
+XL320_CONTROL_TABLE = {register.address: register for register in [
+    Register("model_number", 0, 2, EEPROM, False, True),
+    Register("firmware_version", 2, 1, EEPROM, False, True),
+    Register("id", 3, 1, EEPROM, True, True),
+    Register("baud_rate", 4, 1, EEPROM, True, True),
+    Register("return_delay_time", 5, 1, EEPROM, True, True),
+    Register("cw_angle_limit", config.ADDR_CW_ANGLE_LIMIT, 2, EEPROM, True, True),
+    Register("ccw_angle_limit", config.ADDR_CCW_ANGLE_LIMIT, 2, EEPROM, True, True),
+    Register("control_mode", config.ADDR_CONTROL_MODE, 1, EEPROM, True, True),
+    Register("temperature_limit", 12, 1, EEPROM, True, True),
+    Register("min_voltage_limit", 13, 1, EEPROM, True, True),
+    Register("max_voltage_limit", 14, 1, EEPROM, True, True),
+    Register("max_torque", 15, 2, EEPROM, True, True),
+    Register("status_return_level", 17, 1, EEPROM, True, True),
+    Register("shutdown", config.ADDR_SHUTDOWN, 1, EEPROM, True, True),
+    Register("torque_enable", config.ADDR_TORQUE_ENABLE, 1, RAM, True, False),
+    Register("led", config.ADDR_LED, 1, RAM, True, True),
+    Register("d_gain", 27, 1, RAM, True, True),
+    Register("i_gain", 28, 1, RAM, True, True),
+    Register("p_gain", 29, 1, RAM, True, True),
+    Register("goal_position", config.ADDR_GOAL_POSITION, 2, RAM, True, False),
+    Register("moving_speed", config.ADDR_GOAL_SPEED, 2, RAM, True, False),
+    Register("torque_limit", 35, 2, RAM, True, False),
+    Register("present_position", config.ADDR_PRESENT_POSITION, 2, RAM, False, False),
+    Register("present_speed", config.ADDR_PRESENT_SPEED, 2, RAM, False, False),
+    Register("present_load", config.ADDR_PRESENT_LOAD, 2, RAM, False, False),
+    Register("present_voltage", 45, 1, RAM, False, False),
+    Register("present_temperature", config.ADDR_PRESENT_TEMPERATURE, 1, RAM, False, False),
+    Register("registered", 47, 1, RAM, False, False),
+    Register("moving", config.ADDR_MOVING, 1, RAM, False, False),
+    Register("hardware_error_status", config.ADDR_HARDWARE_ERROR_STATUS, 1, RAM, False, False),
+    Register("punch", 51, 2, RAM, True, True),
+]}
+
+# Registers the servo may rewrite itself when torque is switched on or off
+# (e.g. after an overload shutdown the goal is re-latched to the present position).
+TORQUE_DEPENDENT_ADDRESSES = (
+    config.ADDR_TORQUE_ENABLE,
+    config.ADDR_GOAL_POSITION,
+    config.ADDR_GOAL_SPEED,
+    35,  # torque limit
+)
+
+
+class ControlTableShadow:
+    """
+    @brief In-memory copy of the last known control table values of one servo.
+
+    The shadow only knows about traffic that goes through its Servo. Values are
+    recorded on every successful write and read, writes of an unchanged value
+    are elided, and reads of static registers are answered from memory.
+    Volatile registers (present values, status flags) are never cached.
+    """
+
+    def __init__(self, table=XL320_CONTROL_TABLE):
+        self.table = table
+        self.values = {}
+        self.reset_stats()
+
+    def reset_stats(self):
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+        self.elided_writes = 0
+
+    def get_stats(self):
+        """@return A dict with the read hits/misses and the issued/elided write counts."""
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "writes": self.writes,
+            "elided_writes": self.elided_writes,
+        }
+
+    def lookup(self, address):
+        """
+        @brief Serves a read from memory.
+
+        @return The cached value of a static register, or None if the read has to go to the bus.
+        """
+        register = self.table.get(address)
+        if register is None or not register.static:
+            return None
+        value = self.values.get(address)
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    def needs_write(self, address, value):
+        """
+        @brief Decides whether a write has to go to the bus.
+
+        @return False if the register is known to hold value already.
+        """
+        if self.values.get(address) == value:
+            self.elided_writes += 1
+            return False
+        self.writes += 1
+        return True
+
+    def record(self, address, value):
+        """@brief Remembers the value of a successful read or write, except of volatile registers."""
+        register = self.table.get(address)
+        if register is not None and not register.static and not register.writable:
+            # present values and status flags change on their own
+            return
+        if address == config.ADDR_TORQUE_ENABLE:
+            # Torque Enable is never remembered: an overload shutdown clears it
+            # without any status packet telling us, so enabling must always be sent.
+            for torque_address in TORQUE_DEPENDENT_ADDRESSES:
+                self.values.pop(torque_address, None)
+            return
+        self.values[address] = value
+
+    def invalidate(self, address=None):
+        """
+        @brief Forgets cached values.
+
+        @param address The register to forget, or None to forget everything
+                       (after a reboot or a hardware error).
+        """
+        if address is None:
+            self.values.clear()
+        else:
+            self.values.pop(address, None)
+
+    def invalidate_ram(self):
+        """@brief Forgets the RAM area, which the servo may rewrite after a hardware error shutdown."""
+        for address in list(self.values):
+            register = self.table.get(address)
+            if register is None or register.area == RAM:
+                del self.values[address]
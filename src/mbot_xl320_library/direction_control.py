@@ -0,0 +1,171 @@
+from . import config
+
+
+class DirectionControl:
+    """
+    @brief Base class of the half-duplex direction control backends used by GPIOPacketHandler.
+
+    A backend switches the bus transceiver between transmit and receive.
+    Backends whose direction is switched outside of Python (by the kernel or
+    by the adapter itself) set toggles to False and the packet handler skips
+    the transmit/receive calls and the turnaround wait entirely.
+    """
+
+    toggles = True
+
+    def setup(self, port):
+        """
+        @brief Called by the packet handler before the first packet on a newly opened port.
+
+        @param port The PortHandler the backend drives.
+        """
+        pass
+
+    def transmit(self):
+        pass
+
+    def receive(self):
+        pass
+
+    def cleanup(self):
+        pass
+
+
+class JetsonGPIODirection(DirectionControl):
+    """@brief Drives the transceiver's CTL pin from userspace with Jetson.GPIO."""
+
+    def __init__(self, pin=config.JETSON_CTL_PIN):
+        import Jetson.GPIO as GPIO
+
+        self.GPIO = GPIO
+        self.pin = pin
+
+    def transmit(self):
+        self.GPIO.output(self.pin, self.GPIO.LOW)
+
+    def receive(self):
+        self.GPIO.output(self.pin, self.GPIO.HIGH)
+
+    def cleanup(self):
+        self.GPIO.cleanup()
+
+
+class KernelRS485Direction(DirectionControl):
+    """
+    @brief Lets the UART driver switch the driver-enable line itself (TIOCSRS485).
+
+    The RS-485 mode is applied to the serial fd when the port is opened, after
+    that no Python code runs per packet to switch direction.
+    """
+
+    toggles = False
+
+    def __init__(self, rts_level_for_tx=True, rts_level_for_rx=False, delay_before_tx=None, delay_before_rx=None):
+        self.rts_level_for_tx = rts_level_for_tx
+        self.rts_level_for_rx = rts_level_for_rx
+        self.delay_before_tx = delay_before_tx
+        self.delay_before_rx = delay_before_rx
+
+    def setup(self, port):
+        import serial.rs485
+
+        port.ser.rs485_mode = serial.rs485.RS485Settings(
+            rts_level_for_tx=self.rts_level_for_tx,
+            rts_level_for_rx=self.rts_level_for_rx,
+            delay_before_tx=self.delay_before_tx,
+            delay_before_rx=self.delay_before_rx,
+        )
+
+
+class GpiodDirection(DirectionControl):
+    """
+    @brief Drives the transceiver's CTL pin through the libgpiod character device.
+
+    @param line The line offset of the CTL pin on the GPIO chip (not the BOARD pin number),
+                by default the one of JETSON_CTL_PIN on the Jetson Nano.
+    """
+
+    def __init__(self, line=config.JETSON_CTL_LINE, chip="/dev/gpiochip0", tx_value=0, rx_value=1):
+        import gpiod
+
+        self.line = line
+        self.tx_value = tx_value
+        self.rx_value = rx_value
+
+        if hasattr(gpiod, "request_lines"):
+            # libgpiod 2.x
+            value = gpiod.line.Value
+            self._values = {0: value.INACTIVE, 1: value.ACTIVE}
+            self._request = gpiod.request_lines(
+                chip,
+                consumer="mbot_xl320_library",
+                config={line: gpiod.LineSettings(
+                    direction=gpiod.line.Direction.OUTPUT, output_value=self._values[rx_value])},
+            )
+            self._set_value = lambda v: self._request.set_value(self.line, self._values[v])
+        else:
+            # libgpiod 1.x
+            self._request = gpiod.Chip(chip).get_line(line)
+            self._request.request(
+                consumer="mbot_xl320_library", type=gpiod.LINE_REQ_DIR_OUT, default_vals=[rx_value])
+            self._set_value = self._request.set_value
+
+    def transmit(self):
+        self._set_value(self.tx_value)
+
+    def receive(self):
+        self._set_value(self.rx_value)
+
+    def cleanup(self):
+        self._request.release()
+
+
+class NoOpDirection(DirectionControl):
+    """@brief For adapters that switch direction automatically (e.g. auto-direction RS-485 transceivers)."""
+
+    toggles = False
+
+
+class MockDirection(DirectionControl):
+    """@brief Records the direction switches instead of driving hardware, for tests."""
+
+    def __init__(self):
+        self.events = []
+        self.setup_count = 0
+
+    def setup(self, port):
+        self.setup_count += 1
+
+    def transmit(self):
+        self.events.append("tx")
+
+    def receive(self):
+        self.events.append("rx")
+
+    def cleanup(self):
+        self.events.clear()
+
+
+DIRECTION_BACKENDS = {
+    "jetson": JetsonGPIODirection,
+    "rs485": KernelRS485Direction,
+    "gpiod": GpiodDirection,
+    "none": NoOpDirection,
+    "mock": MockDirection,
+}
+
+
+def make_direction_control(direction):
+    """
+    @brief Resolves a direction control backend.
+
+    @param direction A DirectionControl instance or one of the names in DIRECTION_BACKENDS.
+    @throw ValueError if the name is unknown.
+
+    @return A DirectionControl instance.
+    """
+    if isinstance(direction, DirectionControl):
+        return direction
+    if direction not in DIRECTION_BACKENDS:
+        raise ValueError("direction has to be one of %s" % ", ".join(sorted(DIRECTION_BACKENDS)))
+    return DIRECTION_BACKENDS[direction]()
@@ -0,0 +1,137 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+from .packet_codec import parse_status, split_packets
+from dynamixel_sdk import (  # Uses Dynamixel SDK library
+    BROADCAST_ID,
+    COMM_SUCCESS,
+    DXL_MAKEWORD,
+    INST_PING,
+    MAX_ID,
+    PKT_ID,
+    PKT_INSTRUCTION,
+    PKT_LENGTH_H,
+    PKT_LENGTH_L,
+)
+
+PING_STATUS_LENGTH = 14         # status packet of a Ping: 11 bytes of framing, model number and firmware
+SLOT_TIME_MS = 3.0              # the SDK allows every ID 3 ms to answer a broadcast Ping
+LATENCY_MS = 16.0               # USB serial latency timer, as in the SDK's PortHandler
+SCAN_BAUDRATES = (1000000, 115200, 57600, 9600)     # the XL320 baudrates, most likely first
+
+
+class DiscoveredServo:
+    """@brief A servo that answered a Ping."""
+
+    __slots__ = ("port_name", "servo_id", "model_number", "firmware_version", "baudrate")
+
+    def __init__(self, port_name, servo_id, model_number, firmware_version, baudrate):
+        self.port_name = port_name
+        self.servo_id = servo_id
+        self.model_number = model_number
+        self.firmware_version = firmware_version
+        self.baudrate = baudrate
+
+    def __repr__(self):
+        return "DiscoveredServo(port_name=%r, servo_id=%d, model_number=%d, firmware_version=%d, baudrate=%d)" % (
+            self.port_name, self.servo_id, self.model_number, self.firmware_version, self.baudrate)
+
+
+def _ping_window(portHandler, max_id):
+    """@return The seconds to listen for the answers of IDs up to max_id to a broadcast Ping."""
+    wire_ms = PING_STATUS_LENGTH * (max_id + 1) * portHandler.tx_time_per_byte
+    return (wire_ms + SLOT_TIME_MS * (max_id + 1) + LATENCY_MS) / 1000.0
+
+
+def broadcast_ping(portHandler, packetHandler, max_id=MAX_ID, expected_count=None):
+    """
+    @brief Pings every servo on the bus with a single broadcast Ping (Protocol 2.0).
+
+    Every servo answers in turn within one receive window, which is sized for
+    IDs up to max_id and ends early once expected_count servos answered.
+    GPIOPacketHandler switches the direction pin around the instruction as usual.
+
+    @param max_id The highest ID to wait for; a smaller value gives a shorter window.
+    @param expected_count Stop listening once this many servos answered.
+
+    @return A dict mapping servo ID to a (model_number, firmware_version) tuple.
+    """
+    txpacket = [0] * 10
+    txpacket[PKT_ID] = BROADCAST_ID
+    txpacket[PKT_LENGTH_L] = 3
+    txpacket[PKT_LENGTH_H] = 0
+    txpacket[PKT_INSTRUCTION] = INST_PING
+
+    found = {}
+    if packetHandler.txPacket(portHandler, txpacket) != COMM_SUCCESS:
+        portHandler.is_using = False
+        return found
+
+    deadline = time.monotonic() + _ping_window(portHandler, max_id)
+    buffer = bytearray()
+    while time.monotonic() < deadline:
+        available = portHandler.getBytesAvailable()
+        if not available:
+            time.sleep(0.0002)
+            continue
+        buffer += portHandler.readPort(available)
+        for packet in split_packets(buffer):
+            status = parse_status(packet)
+            if status is None or len(status[2]) < 3:
+                continue
+            servo_id, _, params = status
+            found[servo_id] = (DXL_MAKEWORD(params[0], params[1]), params[2])
+        if expected_count is not None and len(found) >= expected_count:
+            break
+
+    portHandler.is_using = False
+    return found
+
+
+def scan_port(portHandler, packetHandler, baudrates=SCAN_BAUDRATES, max_id=MAX_ID, expected_count=None):
+    """
+    @brief Finds the servos on one port at each of baudrates with one broadcast Ping per baudrate.
+
+    The port is opened if needed and left at the baudrate it had before.
+
+    @param expected_count Stop scanning once this many servos were found.
+
+    @return A list of DiscoveredServo, ordered by baudrate and ID.
+    """
+    if not portHandler.is_open:
+        portHandler.openPort()
+    original_baudrate = portHandler.getBaudRate()
+
+    discovered = []
+    try:
+        for baudrate in baudrates:
+            if not portHandler.setBaudRate(baudrate):
+                continue
+            remaining = None if expected_count is None else expected_count - len(discovered)
+            found = broadcast_ping(portHandler, packetHandler, max_id, remaining)
+            for servo_id in sorted(found):
+                model_number, firmware_version = found[servo_id]
+                discovered.append(DiscoveredServo(portHandler.getPortName(), servo_id, model_number,
+                                                  firmware_version, baudrate))
+            if expected_count is not None and len(discovered) >= expected_count:
+                break
+    finally:
+        portHandler.setBaudRate(original_baudrate)
+    return discovered
+
+
+def scan_ports(handlers, baudrates=SCAN_BAUDRATES, max_id=MAX_ID):
+    """
+    @brief Scans several ports at the same time, one thread per port.
+
+    @param handlers A list of (portHandler, packetHandler) pairs, e.g. from
+                    initialize_handlers and initialize_gpio_handlers.
+
+    @return A dict mapping port name to the list of DiscoveredServo found on it.
+    """
+    handlers = list(handlers)
+    with ThreadPoolExecutor(max_workers=max(len(handlers), 1)) as executor:
+        futures = {
+            portHandler.getPortName(): executor.submit(scan_port, portHandler, packetHandler, baudrates, max_id)
+            for portHandler, packetHandler in handlers
+        }
+        return {port_name: future.result() for port_name, future in futures.items()}
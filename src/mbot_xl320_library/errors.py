@@ -0,0 +1,39 @@
+class ServoResult:
+    """@brief Outcome of a successful Servo call in quiet mode."""
+
+    __slots__ = ("servo_id", "comm_result", "error", "value")
+
+    def __init__(self, servo_id, comm_result, error, value=None):
+        self.servo_id = servo_id
+        self.comm_result = comm_result
+        self.error = error
+        self.value = value
+
+    def __repr__(self):
+        return "ServoResult(servo_id=%r, comm_result=%r, error=%r, value=%r)" % (
+            self.servo_id, self.comm_result, self.error, self.value)
+
+
+class ServoError(Exception):
+    """
+    @brief Base class of the errors raised by Servo and ServoGroup in quiet mode.
+
+    @param servo_id The ID of the servo, or None for port level errors.
+    @param comm_result The Dynamixel SDK communication result (COMM_*).
+    @param error The error byte of the status packet.
+    @param message The human readable description, as getTxRxResult/getRxPacketError return it.
+    """
+
+    def __init__(self, servo_id, comm_result, error, message):
+        super(ServoError, self).__init__(message if servo_id is None else "[ID:%s] %s" % (servo_id, message))
+        self.servo_id = servo_id
+        self.comm_result = comm_result
+        self.error = error
+
+
+class CommError(ServoError):
+    """@brief The instruction or status packet did not make it over the bus (comm_result != COMM_SUCCESS)."""
+
+
+class HardwareError(ServoError):
+    """@brief The servo answered with a non-zero error byte in its status packet."""
@@ -1,23 +1,332 @@
-import Jetson.GPIO as GPIO
-from . import config
-from dynamixel_sdk import *
+import select
+import termios
+import time
+from . import direction_control
+from .config import TURNAROUND_SLEEP, TURNAROUND_DRAIN
+from .packet_codec import FastPacketHandler
+from dynamixel_sdk import (
+    BROADCAST_ID, COMM_NOT_AVAILABLE, COMM_RX_TIMEOUT, COMM_SUCCESS, DXL_MAKEWORD, INST_ACTION, INST_BULK_READ, INST_READ,
+    INST_SYNC_READ, PKT_ERROR, PKT_ID, PKT_INSTRUCTION, PKT_LENGTH_H, PKT_LENGTH_L, PKT_PARAMETER0,
+)
+
+
+class TransactionTimer:
+    """@brief Accumulates per-transaction timing of a packet handler."""
+
+    __slots__ = ("count", "tx_total", "rx_total", "round_trip_total", "round_trip_min", "round_trip_max")
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.count = 0
+        self.tx_total = 0.0
+        self.rx_total = 0.0
+        self.round_trip_total = 0.0
+        self.round_trip_min = float("inf")
+        self.round_trip_max = 0.0
+
+    def record(self, tx_time, rx_time):
+        round_trip = tx_time + rx_time
+        self.count += 1
+        self.tx_total += tx_time
+        self.rx_total += rx_time
+        self.round_trip_total += round_trip
+        if round_trip < self.round_trip_min:
+            self.round_trip_min = round_trip
+        if round_trip > self.round_trip_max:
+            self.round_trip_max = round_trip
+
+    def summary(self):
+        """
+        @brief Summarizes the recorded transactions.
+
+        @return A dict with the transaction count and the mean tx, rx and
+                round-trip times plus round-trip min/max, all in milliseconds.
+        """
+        if self.count == 0:
+            return {"count": 0}
+        return {
+            "count": self.count,
+            "tx_mean_ms": self.tx_total / self.count * 1000.0,
+            "rx_mean_ms": self.rx_total / self.count * 1000.0,
+            "round_trip_mean_ms": self.round_trip_total / self.count * 1000.0,
+            "round_trip_min_ms": self.round_trip_min * 1000.0,
+            "round_trip_max_ms": self.round_trip_max * 1000.0,
+        }
+
+
+BREAKER_CLOSED = "closed"           # the servo answers, transactions go through
+BREAKER_OPEN = "open"               # the servo is silent, transactions fail without using the bus
+BREAKER_HALF_OPEN = "half_open"     # the backoff ran out, the next transaction probes the servo
+
+COMM_BREAKER_OPEN = -3100           # result of a transaction the open breaker kept off the bus
+
+ADAPTIVE_MIN_SAMPLES = 4            # answers needed before the timeout adapts
+TIMEOUT_MARGIN_MS = 10.0            # added to the learned timeout, host scheduling spikes reach several ms
+BREAKER_THRESHOLD = 3               # timeouts in a row that open the breaker...
+BREAKER_SILENCE = 0.25              # ...once the servo has been silent for this many seconds
+BACKOFF_INITIAL = 0.05              # seconds before the first probe of a silent servo
+BACKOFF_MAX = 2.0
+
+
+class ServoLink:
+    """
+    @brief What a packet handler learned about the answers of one servo ID.
+
+    The response time left after the status packet's wire time is tracked
+    with a smoothed mean and deviation, as TCP does for its retransmission
+    timeout, so the timeout follows the servo's Return Delay Time and the
+    latency of the adapter at any baudrate. The circuit breaker opens after
+    a threshold of timeouts in a row spanning at least BREAKER_SILENCE, so a
+    few status packets delayed by the host do not take a working servo off
+    the bus; an open breaker lets one probe through when its backoff ran
+    out, and doubles the backoff every time the probe goes unanswered.
+    """
+
+    __slots__ = ("answers", "overhead_mean", "overhead_dev", "latency_max", "timeouts", "consecutive_timeouts",
+                 "silent_since", "state", "backoff", "retry_at", "rejected", "probes")
 
-class GPIOPacketHandler(Protocol2PacketHandler):
     def __init__(self):
+        self.answers = 0
+        self.overhead_mean = 0.0    # ms from the end of the instruction to the status, minus its wire time
+        self.overhead_dev = 0.0
+        self.latency_max = 0.0
+        self.timeouts = 0
+        self.consecutive_timeouts = 0
+        self.silent_since = 0.0     # time of the first of the consecutive timeouts
+        self.state = BREAKER_CLOSED
+        self.backoff = BACKOFF_INITIAL
+        self.retry_at = 0.0
+        self.rejected = 0           # transactions failed by the open breaker
+        self.probes = 0
+
+    def timeout_ms(self, wire_ms):
+        """@return The timeout for a status packet of wire_ms on the wire, or None while still learning."""
+        if self.answers < ADAPTIVE_MIN_SAMPLES:
+            return None
+        return wire_ms + self.overhead_mean + 4.0 * self.overhead_dev + TIMEOUT_MARGIN_MS
+
+    def allow(self, now):
+        """@return False if the breaker is open and the transaction must not use the bus."""
+        if self.state == BREAKER_CLOSED:
+            return True
+        if now < self.retry_at:
+            self.rejected += 1
+            return False
+        self.state = BREAKER_HALF_OPEN
+        self.probes += 1
+        return True
+
+    def record_answer(self, latency_ms, wire_ms):
+        overhead = max(latency_ms - wire_ms, 0.0)
+        if self.answers == 0:
+            self.overhead_mean = overhead
+            self.overhead_dev = overhead / 2.0
+        else:
+            self.overhead_dev += (abs(overhead - self.overhead_mean) - self.overhead_dev) / 4.0
+            self.overhead_mean += (overhead - self.overhead_mean) / 8.0
+        self.answers += 1
+        if latency_ms > self.latency_max:
+            self.latency_max = latency_ms
+        self.consecutive_timeouts = 0
+        self.state = BREAKER_CLOSED
+        self.backoff = BACKOFF_INITIAL
+
+    def record_timeout(self, now, threshold):
+        self.timeouts += 1
+        self.consecutive_timeouts += 1
+        if self.consecutive_timeouts == 1:
+            self.silent_since = now
+        if self.state == BREAKER_HALF_OPEN:
+            self.backoff = min(self.backoff * 2.0, BACKOFF_MAX)
+        elif (threshold is None or self.consecutive_timeouts < threshold
+              or now - self.silent_since < BREAKER_SILENCE):
+            return
+        self.state = BREAKER_OPEN
+        self.retry_at = now + self.backoff
+
+    def summary(self, wire_ms):
+        """@return The stats of the link as a dict, with the timeout of a wire_ms status packet."""
+        return {
+            "answers": self.answers,
+            "latency_mean_ms": wire_ms + self.overhead_mean if self.answers else 0.0,
+            "latency_dev_ms": self.overhead_dev,
+            "latency_max_ms": self.latency_max,
+            "timeout_ms": self.timeout_ms(wire_ms),
+            "timeouts": self.timeouts,
+            "state": self.state,
+            "backoff_s": self.backoff,
+            "rejected": self.rejected,
+            "probes": self.probes,
+        }
+
+
+class GPIOPacketHandler(FastPacketHandler):
+    def __init__(self, turnaround=TURNAROUND_SLEEP, direction="jetson", adaptive=False, breaker_threshold=None):
+        """
+        @param adaptive If True, wait for each servo's status packet only as long as its
+                        answers so far suggest, see ServoLink, instead of the SDK's fixed timeout.
+                        IDs that did not answer often enough yet get the timeout learned from
+                        every answer on the bus.
+        @param breaker_threshold Timeouts in a row (BREAKER_THRESHOLD is a good start) after which
+                                 a servo ID that has been silent for BREAKER_SILENCE is considered
+                                 gone: its transactions return COMM_BREAKER_OPEN without using the
+                                 bus until a probe is answered. None always uses the bus.
+        """
         super(GPIOPacketHandler, self).__init__()
-        
+        if turnaround not in (TURNAROUND_SLEEP, TURNAROUND_DRAIN):
+            raise ValueError("turnaround has to be either '%s' or '%s'" % (TURNAROUND_SLEEP, TURNAROUND_DRAIN))
+        self.turnaround = turnaround
+        self.direction = direction_control.make_direction_control(direction)
+        self.timing = TransactionTimer()
+        self.adaptive = adaptive
+        self.breaker_threshold = breaker_threshold
+        self.links = {}
+        self.bus_link = ServoLink()     # every answer on the bus, for the IDs still learning
+        self._direction_ser = None
+        self._late_status = False   # a status packet may still arrive after a shortened timeout
+
+    def get_timing_stats(self):
+        """@return The round-trip timing summary of the transactions so far, see TransactionTimer.summary."""
+        return self.timing.summary()
+
+    def reset_timing_stats(self):
+        self.timing.reset()
+
+    def getTxRxResult(self, result):
+        if result == COMM_BREAKER_OPEN:
+            return "[TxRxResult] Servo stopped answering, packet not sent (circuit breaker open)!"
+        return super(GPIOPacketHandler, self).getTxRxResult(result)
+
+    def get_link_stats(self, port=None):
+        """
+        @brief Reports the response latency, timeout and circuit breaker state of every servo ID seen.
+
+        @param port The PortHandler the servos are on, to express the latency and timeout of a
+                    status packet without parameters at its baudrate. Without it the wire time
+                    of the status packet is left out.
+
+        @return A dict mapping servo ID to a dict with the number of answers, the mean, deviation
+                and max response latency and the current timeout in milliseconds (None while the
+                timeout is still learned), the number of timeouts, the breaker state (one of the
+                BREAKER_* constants), the probe backoff in seconds, and the transactions rejected
+                by the open breaker and the probes sent.
+        """
+        wire_ms = 11 * port.tx_time_per_byte if port is not None else 0.0
+        return {servo_id: link.summary(wire_ms) for servo_id, link in self.links.items()}
+
+    def reset_link_stats(self):
+        """@brief Forgets the learned timeouts and closes every breaker."""
+        self.links.clear()
+        self.bus_link = ServoLink()
+
+    def _wait_tx_complete(self, port, packet_length, tx_start):
+        """
+        @brief Blocks until the instruction packet has left the wire.
+
+        tcdrain waits for the kernel and UART buffers to empty; the wire time
+        computed from the baudrate bounds drivers that report drained while
+        the last byte is still being shifted out.
+        """
+        ser = getattr(port, "ser", None)
+        if ser is not None:
+            termios.tcdrain(ser.fileno())
+
+        wire_time = packet_length * 10.0 / port.getBaudRate()
+        while time.perf_counter() - tx_start < wire_time:
+            pass
+
+    def _wait_rx_bytes(self, port, count):
+        """
+        @brief Blocks until count more bytes are buffered or the packet times out.
+
+        rxPacket asks for the shortest status packet first and for the rest
+        once the LENGTH field is in, so an error status without parameters
+        is parsed as soon as its 11 bytes arrived. With no byte buffered the
+        serial fd is selected on; with part of the bytes buffered, the wire
+        time of the rest is slept.
+        """
+        ser = getattr(port, "ser", None)
+        if self.turnaround != TURNAROUND_DRAIN or ser is None:
+            return
+
+        fd = ser.fileno()
+        while True:
+            available = port.getBytesAvailable()
+            if available >= count:
+                return
+            remaining = (port.packet_timeout - port.getTimeSinceStart()) / 1000.0
+            if remaining <= 0:
+                return
+            if available == 0:
+                select.select([fd], [], [], remaining)
+            else:
+                time.sleep(min((count - available) * port.tx_time_per_byte / 1000.0, remaining))
+
+    def txPacket(self, port, txpacket):
+        """
+        @brief Sends an instruction packet and turns the half-duplex line around.
+
+        The direction backend switches to transmit before the packet and back
+        to receive once it is out, so every instruction that expects status
+        packets (read, ping, Sync Read, Bulk Read) listens with a single
+        direction flip no matter how many servos answer. The line also goes
+        back to receive after broadcast and Sync Write packets that no servo
+        answers, so the transceiver never keeps driving the idle bus. Backends
+        that switch direction outside of Python skip both calls and the
+        turnaround wait.
+        """
+        direction = self.direction
+        ser = getattr(port, "ser", None)
+        if ser is not self._direction_ser:
+            # the port was (re)opened, e.g. by setBaudRate
+            direction.setup(port)
+            self._direction_ser = ser
+
+        if not direction.toggles:
+            return super(GPIOPacketHandler, self).txPacket(port, txpacket)
+
+        tx_start = time.perf_counter()
+        direction.transmit()
+        result = super(GPIOPacketHandler, self).txPacket(port, txpacket)
+        if self.turnaround == TURNAROUND_DRAIN:
+            if result == COMM_SUCCESS:
+                packet_length = DXL_MAKEWORD(txpacket[PKT_LENGTH_L], txpacket[PKT_LENGTH_H]) + 7
+                self._wait_tx_complete(port, packet_length, tx_start)
+        else:
+            time.sleep(0.0001)
+        direction.receive()
+        return result
+
     def txRxPacket(self, port, txpacket):
         rxpacket = None
         error = 0
 
-        GPIO.output(config.JETSON_CTL_PIN, GPIO.LOW)
+        # Only unicast instructions are answered by a single servo, so only they teach the timeout and breaker
+        link = None
+        if (txpacket[PKT_ID] != BROADCAST_ID
+                and txpacket[PKT_INSTRUCTION] not in (INST_ACTION, INST_BULK_READ, INST_SYNC_READ)):
+            link = self.links.get(txpacket[PKT_ID])
+            if link is None:
+                link = self.links[txpacket[PKT_ID]] = ServoLink()
+            if self.breaker_threshold is not None and not link.allow(time.monotonic()):
+                return rxpacket, COMM_BREAKER_OPEN, error
+
+        if self._late_status:
+            # drop the status packet of a servo that answered after its timeout
+            ser = getattr(port, "ser", None)
+            if ser is not None:
+                ser.reset_input_buffer()
+            self._late_status = False
+
         # tx packet
+        tx_start = time.perf_counter()
         result = self.txPacket(port, txpacket)
-        time.sleep(0.0001)
         if result != COMM_SUCCESS:
             return rxpacket, result, error
 
-        # (Instruction == BulkRead or SyncRead) == this function is not available.
+        # (Instruction == BulkRead or SyncRead) == use syncReadTx / bulkReadTx and rxPacket instead.
         if txpacket[PKT_INSTRUCTION] == INST_BULK_READ or txpacket[PKT_INSTRUCTION] == INST_SYNC_READ:
             result = COMM_NOT_AVAILABLE
 
@@ -29,20 +338,42 @@ class GPIOPacketHandler(Protocol2PacketHandler):
 
         # set packet timeout
         if txpacket[PKT_INSTRUCTION] == INST_READ:
-            port.setPacketTimeout(DXL_MAKEWORD(txpacket[PKT_PARAMETER0 + 2], txpacket[PKT_PARAMETER0 + 3]) + 11)
+            wait_length = DXL_MAKEWORD(txpacket[PKT_PARAMETER0 + 2], txpacket[PKT_PARAMETER0 + 3]) + 11
         else:
-            port.setPacketTimeout(11)
+            wait_length = 11
             # HEADER0 HEADER1 HEADER2 RESERVED ID LENGTH_L LENGTH_H INST ERROR CRC16_L CRC16_H
+        port.setPacketTimeout(wait_length)
+        wire_ms = wait_length * port.tx_time_per_byte
+        adapted = False
+        if self.adaptive and link is not None:
+            timeout = link.timeout_ms(wire_ms)
+            if timeout is None:
+                timeout = self.bus_link.timeout_ms(wire_ms)
+            if timeout is not None and timeout < port.packet_timeout:
+                port.setPacketTimeoutMillis(timeout)
+                adapted = True
+        rx_start = time.perf_counter()
 
-        GPIO.output(config.JETSON_CTL_PIN, GPIO.HIGH)
         # rx packet
         while True:
             rxpacket, result = self.rxPacket(port)
-            time.sleep(0.0001)
+            if self.turnaround == TURNAROUND_SLEEP:
+                time.sleep(0.0001)
             if result != COMM_SUCCESS or txpacket[PKT_ID] == rxpacket[PKT_ID]:
                 break
 
         if result == COMM_SUCCESS and txpacket[PKT_ID] == rxpacket[PKT_ID]:
             error = rxpacket[PKT_ERROR]
 
-        return rxpacket, result, error
\ No newline at end of file
+        rx_end = time.perf_counter()
+        self.timing.record(rx_start - tx_start, rx_end - rx_start)
+
+        if link is not None:
+            if result == COMM_SUCCESS and txpacket[PKT_ID] == rxpacket[PKT_ID]:
+                link.record_answer((rx_end - rx_start) * 1000.0, wire_ms)
+                self.bus_link.record_answer((rx_end - rx_start) * 1000.0, wire_ms)
+            elif result == COMM_RX_TIMEOUT:
+                link.record_timeout(time.monotonic(), self.breaker_threshold)
+                self._late_status = adapted
+
+        return rxpacket, result, error
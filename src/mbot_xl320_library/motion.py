@@ -0,0 +1,124 @@
+import asyncio
+import time
+from . import config
+from .servo_group import ServoGroup
+from dynamixel_sdk import COMM_SUCCESS, DXL_MAKEWORD  # Uses Dynamixel SDK library
+
+# One read spans Goal Position .. Moving: the goal, the commanded speed, the
+# present position and the Moving flag of each servo.
+MOTION_START = config.ADDR_GOAL_POSITION
+MOTION_LENGTH = config.ADDR_MOVING - MOTION_START + 1
+
+MIN_POLL_INTERVAL = 0.002   # seconds, about one group read of a few servos at 1 Mbps
+MAX_POLL_INTERVAL = 0.1
+
+# Position units per second at Moving Speed 1
+UNITS_PER_SECOND_PER_SPEED = config.DXL_SPEED_UNIT_RPM * 6.0 / config.DXL_POSITION_UNIT_DEGREE
+
+
+class _ReachTracker:
+    """@brief Turns the group reads of a wait into per-servo completion times and the next poll interval."""
+
+    def __init__(self, servo_ids, goals, tolerance, timeout):
+        self.goals = goals
+        self.tolerance = tolerance
+        self.started_at = time.monotonic()
+        self.deadline = self.started_at + timeout
+        self.pending = set(servo_ids)
+        self.completed = {servo_id: None for servo_id in servo_ids}
+
+    def update(self, results):
+        """
+        @param results The group read of MOTION_START .. MOTION_START + MOTION_LENGTH.
+
+        @return The seconds to wait before the next poll, or None when every servo
+                arrived or the timeout expired.
+        """
+        now = time.monotonic()
+        remaining_time = 0.0
+        for servo_id, (data, dxl_comm_result, dxl_error) in results.items():
+            if servo_id not in self.pending or dxl_comm_result != COMM_SUCCESS:
+                continue
+            goal = self.goals.get(servo_id)
+            if goal is None:
+                goal = DXL_MAKEWORD(data[0], data[1])
+            position = DXL_MAKEWORD(data[config.ADDR_PRESENT_POSITION - MOTION_START],
+                                    data[config.ADDR_PRESENT_POSITION - MOTION_START + 1])
+            distance = abs(goal - position)
+            if not data[config.ADDR_MOVING - MOTION_START] and distance <= self.tolerance:
+                self.pending.discard(servo_id)
+                self.completed[servo_id] = now - self.started_at
+                continue
+
+            # Moving Speed 0 means no speed control, the servo goes as fast as it can
+            speed = DXL_MAKEWORD(data[config.ADDR_GOAL_SPEED - MOTION_START],
+                                 data[config.ADDR_GOAL_SPEED - MOTION_START + 1]) & 0x3FF or 1023
+            remaining_time = max(remaining_time, distance / (speed * UNITS_PER_SECOND_PER_SPEED))
+
+        if not self.pending or now >= self.deadline:
+            return None
+        # Poll sparsely while the servos are far away and closer together near the end
+        interval = min(max(remaining_time / 2.0, MIN_POLL_INTERVAL), MAX_POLL_INTERVAL)
+        return min(interval, self.deadline - now)
+
+
+def _prepare(servos, goals, tolerance, timeout):
+    servos = list(servos)
+    if not servos:
+        raise ValueError("servos must not be empty")
+    servo_ids = [servo.servo_id for servo in servos]
+    if goals is None:
+        goals = {}
+    elif not isinstance(goals, dict):
+        goals = dict(zip(servo_ids, goals))
+    return servos, _ReachTracker(servo_ids, goals, tolerance, timeout)
+
+
+def wait_until_reached(servos, goals=None, tolerance=config.DXL_MOVING_STATUS_THRESHOLD, timeout=10.0):
+    """
+    @brief Waits until every servo stopped moving within tolerance of its goal.
+
+    Each poll is one group read of the Moving flag and present position of all
+    servos still under way. The poll interval follows the estimated remaining
+    travel time at the commanded speed, so a long move costs a handful of reads.
+
+    @param servos The Servo objects to wait for, sharing one port.
+    @param goals A dict mapping servo ID to goal position, or a sequence in the order
+                 of servos. Defaults to each servo's Goal Position register.
+    @param tolerance The largest distance from the goal that counts as reached.
+    @param timeout The seconds to wait at most.
+
+    @return A dict mapping servo ID to the seconds it took to arrive, or None for
+            servos that did not arrive (or stalled outside tolerance) before the timeout.
+    """
+    servos, tracker = _prepare(servos, goals, tolerance, timeout)
+    group = ServoGroup([servo.servo_id for servo in servos], servos[0].portHandler, servos[0].packetHandler)
+    while True:
+        results = group.read_block(MOTION_START, MOTION_LENGTH, sorted(tracker.pending))
+        interval = tracker.update(results)
+        if interval is None:
+            return tracker.completed
+        time.sleep(interval)
+
+
+async def async_wait_until_reached(servos, goals=None, tolerance=config.DXL_MOVING_STATUS_THRESHOLD,
+                                   timeout=10.0):
+    """
+    @brief Awaitable variant of wait_until_reached, for AsyncServo objects.
+
+    Each poll is one Sync Read queued on the servos' AsyncBus like any other
+    transaction, so it never runs beside them on another thread, and the loop
+    is free while the status packets are in flight and between polls.
+
+    @param servos The AsyncServo objects to wait for, sharing one AsyncBus.
+
+    @return See wait_until_reached().
+    """
+    servos, tracker = _prepare(servos, goals, tolerance, timeout)
+    bus = servos[0].bus
+    while True:
+        results = await bus.sync_read(MOTION_START, MOTION_LENGTH, sorted(tracker.pending))
+        interval = tracker.update(results)
+        if interval is None:
+            return tracker.completed
+        await asyncio.sleep(interval)
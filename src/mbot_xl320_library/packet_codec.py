@@ -0,0 +1,284 @@
+import functools
+from dynamixel_sdk import (  # Uses Dynamixel SDK library
+    BROADCAST_ID,
+    COMM_NOT_AVAILABLE,
+    COMM_PORT_BUSY,
+    COMM_RX_CORRUPT,
+    COMM_RX_TIMEOUT,
+    COMM_SUCCESS,
+    COMM_TX_ERROR,
+    COMM_TX_FAIL,
+    INST_READ,
+    INST_WRITE,
+    PKT_ERROR,
+    PKT_ID,
+    PKT_INSTRUCTION,
+    PKT_LENGTH_H,
+    PKT_LENGTH_L,
+    PKT_PARAMETER0,
+    Protocol2PacketHandler,
+)
+
+HEADER = b"\xff\xff\xfd\x00"
+FLAG = b"\xff\xff\xfd"              # a header inside a packet body is stuffed with one more 0xFD
+STUFFED_FLAG = b"\xff\xff\xfd\xfd"
+STATUS_INSTRUCTION = 0x55
+MIN_STATUS_LENGTH = 11              # header, reserved, ID, length, instruction, error and CRC
+TXPACKET_MAX_LEN = 1024             # as in the Dynamixel SDK
+RXPACKET_MAX_LEN = 1024
+
+
+def _make_crc_table():
+    """@return The CRC-16 (polynomial 0x8005, not reflected) of every byte value, as in the SDK."""
+    table = []
+    for byte in range(256):
+        crc = byte << 8
+        for _ in range(8):
+            crc = ((crc << 1) ^ 0x8005) if crc & 0x8000 else crc << 1
+        table.append(crc & 0xFFFF)
+    return tuple(table)
+
+
+CRC_TABLE = _make_crc_table()
+
+
+def crc16(data, crc=0):
+    """
+    @brief Computes the Protocol 2.0 CRC of data, continuing from crc.
+
+    @param data Bytes, a bytearray, a memoryview or a list of ints.
+    """
+    table = CRC_TABLE
+    for byte in data:
+        crc = ((crc & 0xFF) << 8) ^ table[(crc >> 8) ^ byte]
+    return crc
+
+
+def stuff(body):
+    """@return body (instruction and parameters) with every FF FF FD followed by an extra FD."""
+    return body.replace(FLAG, STUFFED_FLAG) if FLAG in body else body
+
+
+def unstuff(body):
+    """@return body with the stuffing byte after every FF FF FD removed."""
+    return body.replace(STUFFED_FLAG, FLAG) if STUFFED_FLAG in body else body
+
+
+def encode(servo_id, body):
+    """
+    @brief Frames one instruction packet.
+
+    @param body The instruction byte and its parameters, before stuffing.
+
+    @return The packet as bytes, as the Dynamixel SDK frames it. A body holding FF FF FD
+            is sent stuffed as its addStuffing() returns it, which the SDK's own
+            txPacket() drops for the unstuffed packet.
+    """
+    body = stuff(bytes(body))
+    length = len(body) + 2
+    packet = HEADER + bytes((servo_id, length & 0xFF, length >> 8)) + body
+    crc = crc16(packet)
+    return packet + bytes((crc & 0xFF, crc >> 8))
+
+
+@functools.lru_cache(maxsize=1024)
+def _template(instruction, servo_id, address, length):
+    """
+    @return The packet up to the data bytes of an instruction writing length bytes at
+            address, and the CRC of that prefix. Only the data and the CRC change per call.
+    """
+    size = length + 5
+    prefix = HEADER + bytes((servo_id, size & 0xFF, size >> 8, instruction, address & 0xFF, address >> 8))
+    return prefix, crc16(prefix)
+
+
+def encode_write(servo_id, address, length, value, instruction=INST_WRITE):
+    """
+    @brief Frames a Write (or Reg Write) of a length byte value from a cached template.
+
+    @return The packet as bytes, identical to encode().
+    """
+    data = (value & (1 << 8 * length) - 1).to_bytes(length, "little")
+    prefix, crc = _template(instruction, servo_id, address, length)
+    if FLAG in prefix[PKT_INSTRUCTION:] + data:
+        return encode(servo_id, prefix[PKT_INSTRUCTION:] + data)
+    crc = crc16(data, crc)
+    return prefix + data + bytes((crc & 0xFF, crc >> 8))
+
+
+@functools.lru_cache(maxsize=1024)
+def encode_read(servo_id, address, length):
+    """@return The Read instruction packet as bytes; the whole packet is cached."""
+    return encode(servo_id, bytes((INST_READ, address & 0xFF, address >> 8, length & 0xFF, length >> 8)))
+
+
+def split_packets(buffer):
+    """
+    @brief Yields the complete packets at the front of buffer and removes them from it.
+
+    @param buffer A bytearray the received bytes are appended to. Bytes that cannot
+                  start a packet are dropped, a partial packet stays for the next call.
+    """
+    while True:
+        start = buffer.find(HEADER)
+        if start < 0:
+            del buffer[:max(len(buffer) - 3, 0)]
+            return
+        del buffer[:start]
+        if len(buffer) < PKT_INSTRUCTION + 1:
+            return
+        total = PKT_INSTRUCTION + (buffer[PKT_LENGTH_L] | buffer[PKT_LENGTH_H] << 8)
+        if len(buffer) < total:
+            return
+        packet = bytes(buffer[:total])
+        del buffer[:total]
+        yield packet
+
+
+def parse_status(packet):
+    """
+    @brief Checks the CRC of a status packet and unpacks it.
+
+    @return A (servo_id, error, params) tuple, params unstuffed, or None if the CRC is wrong.
+    """
+    view = memoryview(packet)
+    if crc16(view[:-2]) != packet[-2] | packet[-1] << 8:
+        return None
+    return packet[PKT_ID], packet[PKT_ERROR], unstuff(bytes(view[PKT_PARAMETER0 + 1:-2]))
+
+
+class FastPacketHandler(Protocol2PacketHandler):
+    """
+    @brief A Protocol 2.0 packet handler with the SDK's behaviour and wire bytes, at less CPU per packet.
+
+    Packets are built as bytes instead of 1 KiB lists, the CRC is table driven
+    with a table built once, headers are searched with bytearray.find, the
+    receive buffer of each port is reused, and Read and Write packets come from
+    cached templates where only the ID, data and CRC change. Status packets are
+    returned as bytes, which index and slice like the SDK's lists.
+    """
+
+    def __init__(self):
+        super(FastPacketHandler, self).__init__()
+        self._rx_buffers = {}
+
+    def updateCRC(self, crc_accum, data_blk_ptr, data_blk_size):
+        return crc16(data_blk_ptr[:data_blk_size], crc_accum)
+
+    def txPacket(self, port, txpacket):
+        """
+        @param txpacket An SDK style list with the ID, length, instruction and parameters
+                        filled in, or a packet already framed by encode() as bytes.
+        """
+        if port.is_using:
+            return COMM_PORT_BUSY
+        port.is_using = True
+
+        if isinstance(txpacket, bytes):
+            packet = txpacket
+        else:
+            length = txpacket[PKT_LENGTH_L] | txpacket[PKT_LENGTH_H] << 8
+            packet = encode(txpacket[PKT_ID], txpacket[PKT_INSTRUCTION:PKT_INSTRUCTION + length - 2])
+        if len(packet) > TXPACKET_MAX_LEN:
+            port.is_using = False
+            return COMM_TX_ERROR
+
+        port.clearPort()
+        if port.writePort(packet) != len(packet):
+            port.is_using = False
+            return COMM_TX_FAIL
+        return COMM_SUCCESS
+
+    def _wait_rx_bytes(self, port, count):
+        """
+        @brief Called while a status packet is incomplete, with the number of bytes still missing.
+
+        First the bytes of the shortest status packet are waited for, then
+        the rest of the length its header gives. Returns at once, so the
+        port is polled as the SDK does; subclasses may block instead.
+        """
+        pass
+
+    def rxPacket(self, port):
+        buffer = self._rx_buffers.get(port)
+        if buffer is None:
+            buffer = self._rx_buffers[port] = bytearray()
+        buffer.clear()
+
+        result = COMM_TX_FAIL
+        wait_length = MIN_STATUS_LENGTH
+        synced = False      # the buffer starts with a valid status header
+        while True:
+            buffer += port.readPort(wait_length - len(buffer))
+            if len(buffer) < wait_length:
+                if port.isPacketTimeout():
+                    result = COMM_RX_TIMEOUT if not buffer else COMM_RX_CORRUPT
+                    break
+                self._wait_rx_bytes(port, wait_length - len(buffer))
+                continue
+
+            if not synced:
+                start = buffer.find(HEADER)
+                if start != 0:
+                    # drop the noise, keeping what may be the start of a header
+                    del buffer[:start if start > 0 else len(buffer) - 3]
+                    continue
+                length = buffer[PKT_LENGTH_L] | buffer[PKT_LENGTH_H] << 8
+                if buffer[PKT_ID] > 0xFC or length > RXPACKET_MAX_LEN or buffer[PKT_INSTRUCTION] != STATUS_INSTRUCTION:
+                    del buffer[0]
+                    continue
+                synced = True
+                wait_length = length + PKT_INSTRUCTION
+                if len(buffer) < wait_length:
+                    continue
+
+            crc = buffer[wait_length - 2] | buffer[wait_length - 1] << 8
+            result = COMM_SUCCESS if crc16(memoryview(buffer)[:wait_length - 2]) == crc else COMM_RX_CORRUPT
+            break
+
+        port.is_using = False
+        if result != COMM_SUCCESS:
+            return bytes(buffer), result
+        if buffer.find(STUFFED_FLAG, PKT_INSTRUCTION, wait_length - 2) < 0:
+            return bytes(buffer[:wait_length]), result
+        body = unstuff(bytes(buffer[PKT_INSTRUCTION:wait_length - 2]))
+        length = len(body) + 2
+        return (bytes(buffer[:PKT_LENGTH_L]) + bytes((length & 0xFF, length >> 8)) + body
+                + bytes(buffer[wait_length - 2:wait_length])), result
+
+    def readTx(self, port, dxl_id, address, length):
+        result = self.txPacket(port, encode_read(dxl_id, address, length))
+        if result == COMM_SUCCESS:
+            port.setPacketTimeout(length + MIN_STATUS_LENGTH)
+        return result
+
+    def readTxRx(self, port, dxl_id, address, length):
+        if dxl_id >= BROADCAST_ID:
+            return [], COMM_NOT_AVAILABLE, 0
+        rxpacket, result, error = self.txRxPacket(port, encode_read(dxl_id, address, length))
+        if result != COMM_SUCCESS:
+            return [], result, error
+        return list(rxpacket[PKT_PARAMETER0 + 1:PKT_PARAMETER0 + 1 + length]), result, rxpacket[PKT_ERROR]
+
+    def _write(self, port, dxl_id, address, length, data, instruction, wait):
+        packet = encode(dxl_id, bytes((instruction, address & 0xFF, address >> 8)) + bytes(data[:length]))
+        if not wait:
+            result = self.txPacket(port, packet)
+            port.is_using = False
+            return result
+        return self.txRxPacket(port, packet)[1:]
+
+    def writeTxOnly(self, port, dxl_id, address, length, data):
+        return self._write(port, dxl_id, address, length, data, INST_WRITE, False)
+
+    def writeTxRx(self, port, dxl_id, address, length, data):
+        return self._write(port, dxl_id, address, length, data, INST_WRITE, True)
+
+    def write1ByteTxRx(self, port, dxl_id, address, data):
+        return self.txRxPacket(port, encode_write(dxl_id, address, 1, data))[1:]
+
+    def write2ByteTxRx(self, port, dxl_id, address, data):
+        return self.txRxPacket(port, encode_write(dxl_id, address, 2, data))[1:]
+
+    def write4ByteTxRx(self, port, dxl_id, address, data):
+        return self.txRxPacket(port, encode_write(dxl_id, address, 4, data))[1:]
@@ -0,0 +1,255 @@
+import time
+from . import config
+from .control_table import EEPROM, XL320_CONTROL_TABLE
+from .servo_group import ServoGroup
+from dynamixel_sdk import COMM_SUCCESS  # Uses Dynamixel SDK library
+
+# One Sync Read covers every register a profile sets, and the Return Delay Time for the bus time model
+PROVISION_START = 5
+PROVISION_LENGTH = config.ADDR_GOAL_SPEED + 2 - PROVISION_START
+ADDR_RETURN_DELAY_TIME = 5
+RETURN_DELAY_UNIT = 2e-6            # seconds per unit of Return Delay Time
+
+# Packet sizes, for the bus time model
+WRITE_LENGTH = 12                   # Write instruction without its data
+STATUS_LENGTH = 11                  # status packet without parameters
+SYNC_WRITE_LENGTH = 14              # Sync Write instruction without the per-servo IDs and data
+SYNC_READ_LENGTH = 14               # Sync Read instruction without the IDs
+
+
+class ServoProfile:
+    """
+    @brief How one servo should be set up. Settings left at None are not touched.
+
+    The control mode and the angle limits live in EEPROM, which the servo
+    only accepts with torque disabled; the LED, the moving speed and the
+    torque are RAM registers.
+    """
+
+    __slots__ = ("mode", "cw_angle_limit", "ccw_angle_limit", "speed", "led", "torque")
+
+    def __init__(self, mode=None, cw_angle_limit=None, ccw_angle_limit=None, speed=None, led=None, torque=None):
+        """
+        @param mode "wheel" or "joint".
+        @param cw_angle_limit, ccw_angle_limit Angle limits in range [0, 1023].
+        @param speed The Moving Speed, in range [0, 1023] in joint mode and [0, 2047] in wheel mode.
+        @param led A color defined in config.py.
+        @param torque True to leave the servo with torque enabled, False to leave it disabled.
+        @throw ValueError If a setting is out of range.
+        """
+        if mode not in (None, "wheel", "joint"):
+            raise ValueError("The control mode has to be either 'wheel' or 'joint'")
+        for name, value, maximum in (("CW angle limit", cw_angle_limit, 1023),
+                                     ("CCW angle limit", ccw_angle_limit, 1023),
+                                     ("Speed", speed, 1023 if mode == "joint" else 2047),
+                                     ("LED color", led, config.LED_WHITE)):
+            if value is not None and not 0 <= value <= maximum:
+                raise ValueError("%s must be between 0 and %d" % (name, maximum))
+        self.mode = mode
+        self.cw_angle_limit = cw_angle_limit
+        self.ccw_angle_limit = ccw_angle_limit
+        self.speed = speed
+        self.led = led
+        self.torque = torque
+
+    def registers(self):
+        """@return A dict mapping the address of every register the profile sets to its value."""
+        registers = {}
+        if self.mode is not None:
+            registers[config.ADDR_CONTROL_MODE] = config.WHEEL_MODE if self.mode == "wheel" else config.JOINT_MODE
+        if self.cw_angle_limit is not None:
+            registers[config.ADDR_CW_ANGLE_LIMIT] = self.cw_angle_limit
+        if self.ccw_angle_limit is not None:
+            registers[config.ADDR_CCW_ANGLE_LIMIT] = self.ccw_angle_limit
+        if self.led is not None:
+            registers[config.ADDR_LED] = self.led
+        if self.speed is not None:
+            registers[config.ADDR_GOAL_SPEED] = self.speed
+        if self.torque is not None:
+            registers[config.ADDR_TORQUE_ENABLE] = config.TORQUE_ENABLE if self.torque else config.TORQUE_DISABLE
+        return registers
+
+    def __repr__(self):
+        return "ServoProfile(%s)" % ", ".join(
+            "%s=%r" % (name, getattr(self, name)) for name in self.__slots__ if getattr(self, name) is not None)
+
+
+def _value(data, address):
+    offset = address - PROVISION_START
+    if XL320_CONTROL_TABLE[address].size == 1:
+        return data[offset]
+    return data[offset] | data[offset + 1] << 8
+
+
+class Provisioner:
+    """
+    @brief Brings servos to their ServoProfile with as few transactions and EEPROM writes as possible.
+
+    The current settings of every servo come from one Sync Read. Only the
+    registers that differ from the profile are written, each register of
+    all servos with one Sync Write, so a servo that is already set up costs
+    nothing but its share of the read. Torque is switched off only on the
+    servos with an EEPROM change and switched back on after it. The report
+    compares the transactions and the modelled bus time with the naive
+    bring-up of the examples, one write per setting and servo with torque
+    toggled around the control mode.
+    """
+
+    def __init__(self, portHandler, packetHandler, quiet=False, logger=None):
+        """@param quiet, logger Passed on to the ServoGroup the writes are reported through, see Servo."""
+        self.portHandler = portHandler
+        self.packetHandler = packetHandler
+        self.quiet = quiet
+        self.logger = logger
+
+    def read_current(self, group):
+        """@return A dict mapping servo ID to its PROVISION_LENGTH bytes from PROVISION_START, or None."""
+        return {
+            servo_id: data if dxl_comm_result == COMM_SUCCESS else None
+            for servo_id, (data, dxl_comm_result, _) in group.read_block(PROVISION_START, PROVISION_LENGTH,
+                                                                         report=True).items()
+        }
+
+    def plan(self, profiles, current):
+        """
+        @brief Computes the register writes that bring each servo from its current settings to its profile.
+
+        @param profiles A dict mapping servo ID to its ServoProfile.
+        @param current The settings read by read_current().
+
+        @return A dict mapping servo ID to a dict of address -> (current value, new value), for
+                the registers that differ only.
+        """
+        changes = {}
+        for servo_id, profile in profiles.items():
+            data = current.get(servo_id)
+            if data is None:
+                continue
+            changes[servo_id] = {
+                address: (_value(data, address), value)
+                for address, value in profile.registers().items()
+                if _value(data, address) != value
+            }
+        return changes
+
+    def _write(self, group, address, values, bus):
+        if not values:
+            return
+        group.write_registers(address, values)
+        bus.append((SYNC_WRITE_LENGTH + len(values) * (1 + XL320_CONTROL_TABLE[address].size), 0, 0.0))
+
+    def apply(self, profiles, verify=True):
+        """
+        @brief Reads the current settings of the servos in profiles and writes only what differs.
+
+        @param profiles A dict mapping servo ID to its ServoProfile.
+        @param verify If True, read the settings back with one more Sync Read and compare them.
+
+        @return A dict with the changes made (servo ID -> register name -> (old, new)), the
+                servos that did not answer, the EEPROM registers written, the transactions
+                used, the servos whose torque was switched off for an EEPROM change, the
+                registers that did not read back as written (verify only), the modelled bus
+                time in milliseconds and the elapsed time, and the transactions, EEPROM
+                writes and modelled bus time of the naive bring-up.
+        """
+        started = time.perf_counter()
+        servo_ids = sorted(profiles)
+        group = ServoGroup(servo_ids, self.portHandler, self.packetHandler, quiet=self.quiet, logger=self.logger)
+        current = self.read_current(group)
+        present = [servo_id for servo_id in servo_ids if current[servo_id] is not None]
+        delays = {servo_id: _value(current[servo_id], ADDR_RETURN_DELAY_TIME) * RETURN_DELAY_UNIT
+                  for servo_id in present}
+        # (bytes sent, bytes received, Return Delay Times) of every transaction
+        bus = [(SYNC_READ_LENGTH + len(servo_ids), len(present) * (STATUS_LENGTH + PROVISION_LENGTH),
+                sum(delays.values()))]
+        changes = self.plan(profiles, current)
+
+        # EEPROM is locked while torque is on
+        eeprom_ids = [servo_id for servo_id in present
+                      if any(XL320_CONTROL_TABLE[address].area == EEPROM for address in changes[servo_id])]
+        unlock = [servo_id for servo_id in eeprom_ids if _value(current[servo_id], config.ADDR_TORQUE_ENABLE)]
+        self._write(group, config.ADDR_TORQUE_ENABLE, dict.fromkeys(unlock, config.TORQUE_DISABLE), bus)
+        eeprom_writes = 0
+        for address in (config.ADDR_CONTROL_MODE, config.ADDR_CW_ANGLE_LIMIT, config.ADDR_CCW_ANGLE_LIMIT,
+                        config.ADDR_LED, config.ADDR_GOAL_SPEED):
+            values = {servo_id: changes[servo_id][address][1] for servo_id in present
+                      if address in changes[servo_id]}
+            if XL320_CONTROL_TABLE[address].area == EEPROM:
+                eeprom_writes += len(values)
+            self._write(group, address, values, bus)
+
+        # Torque last, so a servo starts with its new mode and speed
+        torque = {}
+        for servo_id in present:
+            enabled = config.TORQUE_DISABLE if servo_id in unlock else _value(current[servo_id],
+                                                                               config.ADDR_TORQUE_ENABLE)
+            wanted = profiles[servo_id].registers().get(config.ADDR_TORQUE_ENABLE,
+                                                        _value(current[servo_id], config.ADDR_TORQUE_ENABLE))
+            if wanted != enabled:
+                torque[servo_id] = wanted
+        self._write(group, config.ADDR_TORQUE_ENABLE, torque, bus)
+
+        mismatches = {}
+        if verify and any(changes[servo_id] for servo_id in present):
+            readback = self.read_current(group)
+            bus.append((SYNC_READ_LENGTH + len(present), len(present) * (STATUS_LENGTH + PROVISION_LENGTH),
+                        sum(delays.values())))
+            for servo_id in present:
+                data = readback.get(servo_id)
+                wrong = [XL320_CONTROL_TABLE[address].name for address, value in profiles[servo_id].registers().items()
+                         if data is None or _value(data, address) != value]
+                if wrong:
+                    mismatches[servo_id] = wrong
+
+        naive, naive_eeprom_writes = self._naive(profiles, present, delays)
+        baudrate = self.portHandler.getBaudRate()
+        return {
+            "changes": {
+                servo_id: {XL320_CONTROL_TABLE[address].name: change for address, change in changes[servo_id].items()}
+                for servo_id in present
+            },
+            "missing": [servo_id for servo_id in servo_ids if current[servo_id] is None],
+            "eeprom_writes": eeprom_writes,
+            "torque_toggled": unlock,
+            "mismatches": mismatches,
+            "transactions": len(bus),
+            "bus_time_ms": self._bus_time(bus, baudrate) * 1000.0,
+            "elapsed_ms": (time.perf_counter() - started) * 1000.0,
+            "naive_transactions": len(naive),
+            "naive_eeprom_writes": naive_eeprom_writes,
+            "naive_bus_time_ms": self._bus_time(naive, baudrate) * 1000.0,
+        }
+
+    @staticmethod
+    def _naive(profiles, servo_ids, delays):
+        """@return The transactions of the examples' bring-up of servo_ids, and its EEPROM writes."""
+        naive = []
+        eeprom_writes = 0
+        for servo_id in servo_ids:
+            registers = profiles[servo_id].registers()
+            eeprom = [address for address in registers if XL320_CONTROL_TABLE[address].area == EEPROM]
+            ram = [address for address in registers if address != config.ADDR_TORQUE_ENABLE and address not in eeprom]
+            writes = ram
+            if eeprom:
+                # torque off, the EEPROM settings, torque on
+                writes = ram + [config.ADDR_TORQUE_ENABLE] + eeprom + [config.ADDR_TORQUE_ENABLE]
+                eeprom_writes += len(eeprom)
+            elif config.ADDR_TORQUE_ENABLE in registers:
+                writes = ram + [config.ADDR_TORQUE_ENABLE]
+            for address in writes:
+                naive.append((WRITE_LENGTH + XL320_CONTROL_TABLE[address].size, STATUS_LENGTH, delays[servo_id]))
+        return naive, eeprom_writes
+
+    @staticmethod
+    def _bus_time(transactions, baudrate):
+        """@return The seconds the transactions keep the bus busy: bytes on the wire and Return Delay Times."""
+        return sum((sent + received) * 10.0 / baudrate + delay for sent, received, delay in transactions)
+
+
+def provision(profiles, portHandler, packetHandler, verify=True, quiet=False, logger=None):
+    """
+    @brief Brings every servo in profiles to its ServoProfile, see Provisioner.
+
+    @return The report of Provisioner.apply().
+    """
+    return Provisioner(portHandler, packetHandler, quiet=quiet, logger=logger).apply(profiles, verify)
@@ -0,0 +1,403 @@
+import bisect
+import collections
+import threading
+import time
+from concurrent.futures import Future
+from . import config
+from dynamixel_sdk import BROADCAST_ID  # Uses Dynamixel SDK library
+
+PRIORITY_EMERGENCY = 0
+PRIORITY_COMMAND = 1
+PRIORITY_TELEMETRY = 2
+PRIORITY_DIAGNOSTIC = 3
+PRIORITY_NAMES = ("emergency", "command", "telemetry", "diagnostic")
+
+WAIT_BUCKETS_MS = (0.1, 0.2, 0.5, 1.0, 2.0, 5.0, 10.0, 20.0, 50.0, 100.0)
+DEPTH_BUCKETS = (0, 1, 2, 4, 8, 16, 32, 64)
+DEFAULT_BUS_TIME = 0.001    # estimate for a kind of transaction that has not run yet
+JITTER_HISTORY = 4096       # cycles a FixedRateLoop keeps for its jitter percentile
+
+
+class Histogram:
+    """@brief Counts samples into buckets; a sample falls into the first bucket whose bound is >= it."""
+
+    __slots__ = ("bounds", "counts")
+
+    def __init__(self, bounds):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+
+    def add(self, value):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+
+    def as_dict(self):
+        """@return A dict mapping each upper bound (and "inf" for the overflow bucket) to its count."""
+        buckets = {bound: count for bound, count in zip(self.bounds, self.counts)}
+        buckets["inf"] = self.counts[-1]
+        return buckets
+
+
+class FixedRateLoop:
+    """
+    @brief Calls a function at a fixed rate on the calling thread until its stop event is set.
+
+    Cycles are scheduled against the ideal timeline, so the rate does not
+    drift, and the cycles an overrun made us miss are skipped and counted.
+    """
+
+    def __init__(self, rate, stop_event=None):
+        """
+        @param rate The cycle rate in Hz.
+        @param stop_event The threading.Event that ends run(), a new one by default.
+        """
+        self.period = 1.0 / rate
+        self.stop_event = threading.Event() if stop_event is None else stop_event
+        self.reset_stats()
+
+    def reset_stats(self):
+        self.cycles = 0
+        self.overruns = 0
+        self.skipped_cycles = 0
+        self.jitter = collections.deque(maxlen=JITTER_HISTORY)
+        self.jitter_total = 0.0
+        self.jitter_max = 0.0
+        self.loop_time_total = 0.0
+        self.loop_time_max = 0.0
+
+    def get_stats(self):
+        """
+        @return A dict with the number of cycles, of overruns and of the cycles they made
+                us skip, the mean, p99 and max jitter of the cycle start and the mean and
+                max time spent in a cycle, in milliseconds.
+        """
+        jitter = sorted(self.jitter)
+        return {
+            "cycles": self.cycles,
+            "overruns": self.overruns,
+            "skipped_cycles": self.skipped_cycles,
+            "jitter_mean_ms": self.jitter_total / self.cycles * 1000.0 if self.cycles else 0.0,
+            "jitter_p99_ms": jitter[int(0.99 * (len(jitter) - 1))] * 1000.0 if jitter else 0.0,
+            "jitter_max_ms": self.jitter_max * 1000.0,
+            "loop_time_mean_ms": self.loop_time_total / self.cycles * 1000.0 if self.cycles else 0.0,
+            "loop_time_max_ms": self.loop_time_max * 1000.0,
+        }
+
+    def run(self, cycle):
+        """
+        @brief Calls cycle(dt) once per period until the stop event is set.
+
+        @param cycle The function to call, with the seconds since its previous call.
+        """
+        period = self.period
+        next_cycle = time.monotonic()
+        last_cycle = next_cycle - period
+        while not self.stop_event.is_set():
+            now = time.monotonic()
+            if now < next_cycle:
+                self.stop_event.wait(next_cycle - now)
+                continue
+
+            jitter = now - next_cycle
+            self.jitter.append(jitter)
+            self.jitter_total += jitter
+            if jitter > self.jitter_max:
+                self.jitter_max = jitter
+
+            cycle(now - last_cycle)
+            last_cycle = now
+            self.cycles += 1
+            finished = time.monotonic()
+            loop_time = finished - now
+            self.loop_time_total += loop_time
+            if loop_time > self.loop_time_max:
+                self.loop_time_max = loop_time
+
+            next_cycle += period
+            if finished > next_cycle:
+                self.overruns += 1
+                missed = int((finished - next_cycle) / period)
+                self.skipped_cycles += missed
+                next_cycle += missed * period
+
+
+class Transaction:
+    """@brief One queued call on the bus."""
+
+    __slots__ = ("priority", "kind", "function", "args", "key", "submitted_at", "futures")
+
+    def __init__(self, priority, kind, function, args, key):
+        self.priority = priority
+        self.kind = kind
+        self.function = function
+        self.args = args
+        self.key = key
+        self.submitted_at = time.monotonic()
+        self.futures = [Future()]
+
+
+class _PriorityStats:
+    __slots__ = ("submitted", "executed", "coalesced", "cancelled", "max_depth", "wait_ms", "depth")
+
+    def __init__(self):
+        self.submitted = 0
+        self.executed = 0
+        self.coalesced = 0
+        self.cancelled = 0
+        self.max_depth = 0
+        self.wait_ms = Histogram(WAIT_BUCKETS_MS)
+        self.depth = Histogram(DEPTH_BUCKETS)
+
+
+class BusScheduler:
+    """
+    @brief Owns a port and runs transactions from any thread on one worker thread, by priority.
+
+    Transactions wait in one FIFO queue per priority (PRIORITY_EMERGENCY first,
+    PRIORITY_DIAGNOSTIC last). A queued write to the same register of the same
+    servo at the same priority is coalesced: the queued transaction takes the
+    new value and every caller gets its result. Time is split into cycles of
+    cycle_time seconds, and at most budget seconds of bus time are spent per
+    cycle, so bursts of low priority traffic cannot crowd out the next cycle's
+    commands. Emergency transactions ignore the budget, and lower priorities
+    only get the bus time the higher ones leave. With budget=None the bus is
+    used back to back.
+    """
+
+    def __init__(self, portHandler, packetHandler, cycle_time=0.01, budget=0.008):
+        self.portHandler = portHandler
+        self.packetHandler = packetHandler
+        self.cycle_time = cycle_time
+        self.budget = budget
+
+        self._queues = [collections.deque() for _ in PRIORITY_NAMES]
+        self._pending_writes = {}
+        self._bus_time = {}     # kind -> running estimate of its bus time in seconds
+        self._condition = threading.Condition()
+        self._cycle_start = 0.0
+        self._spent = 0.0       # bus time used in the current cycle
+        self._running = False
+        self._thread = None
+        self.reset_stats()
+
+    def reset_stats(self):
+        self._stats = [_PriorityStats() for _ in PRIORITY_NAMES]
+        self.cycles = 0
+        self.deferred = 0
+        self.bus_time_total = 0.0
+
+    def get_stats(self):
+        """
+        @brief Reports the load on the bus.
+
+        @return A dict with the number of cycles, of transactions deferred to a later
+                cycle by the budget and the total bus time in milliseconds, and per
+                priority name the submitted, executed, coalesced and cancelled counts,
+                the maximum queue depth, and the histograms of queue depth (sampled at
+                every submit) and of wait time in milliseconds.
+        """
+        with self._condition:
+            stats = {
+                "cycles": self.cycles,
+                "deferred": self.deferred,
+                "bus_time_ms": self.bus_time_total * 1000.0,
+            }
+            for name, priority_stats in zip(PRIORITY_NAMES, self._stats):
+                stats[name] = {
+                    "submitted": priority_stats.submitted,
+                    "executed": priority_stats.executed,
+                    "coalesced": priority_stats.coalesced,
+                    "cancelled": priority_stats.cancelled,
+                    "max_depth": priority_stats.max_depth,
+                    "depth_histogram": priority_stats.depth.as_dict(),
+                    "wait_ms_histogram": priority_stats.wait_ms.as_dict(),
+                }
+            return stats
+
+    def start(self):
+        """@brief Starts the worker thread. From now on only the scheduler may use the port."""
+        with self._condition:
+            if self._running:
+                return self
+            self._running = True
+        self._thread = threading.Thread(target=self._run, name="xl320-scheduler", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """@brief Finishes the transaction in flight, cancels the queued ones and stops the worker."""
+        with self._condition:
+            self._running = False
+            for priority in range(len(self._queues)):
+                self._cancel_queue(priority)
+            self._condition.notify_all()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def _cancel_queue(self, priority):
+        queue = self._queues[priority]
+        while queue:
+            transaction = queue.popleft()
+            if transaction.key is not None:
+                self._pending_writes.pop(transaction.key, None)
+            for future in transaction.futures:
+                future.cancel()
+            self._stats[priority].cancelled += 1
+
+    def submit(self, priority, function, *args, kind=None, key=None):
+        """
+        @brief Queues function(*args) to run on the worker thread.
+
+        @param priority One of the PRIORITY_* constants.
+        @param kind Groups transactions of similar bus time for the budget, defaults to
+                    the function name.
+        @param key Coalescing key: a queued transaction with the same key and priority
+                   has its args replaced instead of queueing a new one.
+
+        @return A concurrent.futures.Future with the return value of function.
+        """
+        transaction = Transaction(priority, kind or function.__name__, function, args, key)
+        future = transaction.futures[0]
+        with self._condition:
+            if not self._running:
+                future.cancel()
+                return future
+            stats = self._stats[priority]
+            stats.submitted += 1
+            if key is not None:
+                queued = self._pending_writes.get((priority, key))
+                if queued is not None:
+                    queued.args = args
+                    queued.futures.append(future)
+                    stats.coalesced += 1
+                    return future
+                self._pending_writes[(priority, key)] = transaction
+                transaction.key = (priority, key)
+
+            queue = self._queues[priority]
+            queue.append(transaction)
+            stats.depth.add(len(queue))
+            if len(queue) > stats.max_depth:
+                stats.max_depth = len(queue)
+            self._condition.notify()
+        return future
+
+    def _next(self):
+        """@return The transaction to run now, waiting for work or for the next cycle. None once stopped."""
+        with self._condition:
+            while self._running:
+                priority = next((index for index, queue in enumerate(self._queues) if queue), None)
+                if priority is None:
+                    self._condition.wait()
+                    continue
+
+                now = time.monotonic()
+                if now - self._cycle_start >= self.cycle_time:
+                    # Stay on the cycle grid, skipping the idle cycles
+                    self._cycle_start += (now - self._cycle_start) // self.cycle_time * self.cycle_time
+                    self._spent = 0.0
+                    self.cycles += 1
+
+                transaction = self._queues[priority][0]
+                estimate = self._bus_time.get(transaction.kind, DEFAULT_BUS_TIME)
+                if (self.budget is not None and priority != PRIORITY_EMERGENCY and self._spent > 0.0
+                        and self._spent + estimate > self.budget):
+                    self.deferred += 1
+                    self._condition.wait(self._cycle_start + self.cycle_time - now)
+                    continue
+
+                self._queues[priority].popleft()
+                if transaction.key is not None:
+                    self._pending_writes.pop(transaction.key, None)
+                stats = self._stats[priority]
+                stats.executed += 1
+                stats.wait_ms.add((now - transaction.submitted_at) * 1000.0)
+                return transaction
+        return None
+
+    def _run(self):
+        self._cycle_start = time.monotonic()
+        self._spent = 0.0
+        while True:
+            transaction = self._next()
+            if transaction is None:
+                return
+            # Callers may have cancelled their futures while the transaction was queued
+            futures = [future for future in transaction.futures if future.set_running_or_notify_cancel()]
+            if not futures:
+                continue
+
+            began = time.monotonic()
+            try:
+                result = transaction.function(*transaction.args)
+                error = None
+            except Exception as exception:
+                error = exception
+            elapsed = time.monotonic() - began
+
+            with self._condition:
+                self._spent += elapsed
+                self.bus_time_total += elapsed
+                estimate = self._bus_time.get(transaction.kind)
+                self._bus_time[transaction.kind] = elapsed if estimate is None else 0.8 * estimate + 0.2 * elapsed
+
+            for future in futures:
+                if error is None:
+                    future.set_result(result)
+                else:
+                    future.set_exception(error)
+
+    # Convenience transactions, returning the Dynamixel SDK result tuples in a Future
+
+    def write(self, servo_id, address, length, value, priority=PRIORITY_COMMAND):
+        """
+        @brief Queues a register write, coalesced with a queued write to the same register.
+
+        @return A Future of (dxl_comm_result, dxl_error).
+        """
+        if length == 1:
+            function = self.packetHandler.write1ByteTxRx
+        elif length == 2:
+            function = self.packetHandler.write2ByteTxRx
+        else:
+            function = self.packetHandler.write4ByteTxRx
+        return self.submit(priority, function, self.portHandler, servo_id, address, value,
+                           kind="write", key=(servo_id, address))
+
+    def read(self, servo_id, address, length, priority=PRIORITY_TELEMETRY):
+        """@return A Future of (data, dxl_comm_result, dxl_error)."""
+        return self.submit(priority, self.packetHandler.readTxRx, self.portHandler, servo_id, address, length,
+                           kind="read%d" % length)
+
+    def group_call(self, group, method, *args, priority=PRIORITY_TELEMETRY):
+        """
+        @brief Queues a call of a ServoGroup method, e.g. group_call(group, "read_feedback").
+
+        @return A Future of the method's return value.
+        """
+        return self.submit(priority, getattr(group, method), *args,
+                           kind="%s%d" % (method, len(group.servo_ids)))
+
+    def emergency_stop(self, servo_ids=None):
+        """
+        @brief Disables torque ahead of everything else and drops the queued commands.
+
+        @param servo_ids The servos to stop, defaults to all of them with one broadcast write.
+
+        @return A Future of the list of (dxl_comm_result, dxl_error) of the writes.
+        """
+        with self._condition:
+            self._cancel_queue(PRIORITY_COMMAND)
+        targets = [BROADCAST_ID] if servo_ids is None else list(servo_ids)
+
+        def stop_all():
+            return [self.packetHandler.write1ByteTxRx(self.portHandler, servo_id, config.ADDR_TORQUE_ENABLE,
+                                                      config.TORQUE_DISABLE) for servo_id in targets]
+
+        return self.submit(PRIORITY_EMERGENCY, stop_all, kind="emergency_stop")
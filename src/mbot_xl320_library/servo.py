@@ -1,19 +1,172 @@
-import os
-import sys
 import time
 from . import config
-from dynamixel_sdk import *  # Uses Dynamixel SDK library
-import Jetson.GPIO as GPIO
+from .control_table import XL320_CONTROL_TABLE, ControlTableShadow
+from .errors import CommError, HardwareError, ServoResult
+from .status import STATUS_LENGTH, STATUS_START, ServoStatus
+from dynamixel_sdk import (  # Uses Dynamixel SDK library
+    COMM_NOT_AVAILABLE, COMM_SUCCESS, ERRBIT_ALERT, INST_ACTION, PKT_ERROR, PKT_ID, PKT_INSTRUCTION, PKT_LENGTH_H, PKT_LENGTH_L,
+)
 
 
 class Servo:
     """@brief Class to control a Dynamixel Servo."""
 
-    def __init__(self, servo_id, portHandler, packetHandler):
+    def __init__(self, servo_id, portHandler, packetHandler, telemetry=None, shadow=False, quiet=False,
+                 logger=None):
+        """
+        @param telemetry A TelemetryPoller serving get_position(cached=True).
+        @param shadow If True, keep a ControlTableShadow to skip redundant register traffic.
+        @param quiet If True, never print: calls return a ServoResult (getters return the value)
+                     and failures raise CommError or HardwareError.
+        @param logger An optional logging.Logger. Successful calls are logged at DEBUG level and
+                      failures at WARNING level. Without a logger nothing is formatted.
+        """
         self.servo_id = servo_id
         self.portHandler = portHandler
         self.packetHandler = packetHandler
         self.CTL_PIN = config.JETSON_CTL_PIN
+        self.telemetry = telemetry
+        self.shadow = ControlTableShadow() if shadow else None
+        self.quiet = quiet
+        self.logger = logger
+
+    def _finish(self, dxl_comm_result, dxl_error, value=None, message=None, *args):
+        """
+        @brief Reports the outcome of a call.
+
+        Prints the error or the success message (formatted with args), or in
+        quiet mode raises CommError/HardwareError on failure.
+
+        @return A ServoResult in quiet mode, None otherwise.
+        """
+        logger = self.logger
+        if dxl_comm_result != COMM_SUCCESS:
+            description = self.packetHandler.getTxRxResult(dxl_comm_result)
+            if logger is not None:
+                logger.warning("[ID:%d] %s", self.servo_id, description)
+            if self.quiet:
+                raise CommError(self.servo_id, dxl_comm_result, dxl_error, description)
+            print("%s" % description)
+        elif dxl_error != 0:
+            description = self.packetHandler.getRxPacketError(dxl_error)
+            if logger is not None:
+                logger.warning("[ID:%d] %s", self.servo_id, description)
+            if self.quiet:
+                raise HardwareError(self.servo_id, dxl_comm_result, dxl_error, description)
+            print("%s" % description)
+        elif message is not None:
+            if logger is not None:
+                logger.debug("[ID:%d] " + message, self.servo_id, *args)
+            if not self.quiet:
+                print("[ID:%d] %s" % (self.servo_id, message % args))
+
+        if self.quiet:
+            return ServoResult(self.servo_id, dxl_comm_result, dxl_error, value)
+        return None
+
+    def _write_register(self, address, length, value):
+        """
+        @brief Writes a register, unless the control table shadow knows it already holds value.
+
+        @return A (dxl_comm_result, dxl_error) tuple, (COMM_SUCCESS, 0) for an elided write.
+        """
+        shadow = self.shadow
+        if shadow is not None and not shadow.needs_write(address, value):
+            return COMM_SUCCESS, 0
+
+        if length == 1:
+            dxl_comm_result, dxl_error = self.packetHandler.write1ByteTxRx(
+                self.portHandler, self.servo_id, address, value)
+        else:
+            dxl_comm_result, dxl_error = self.packetHandler.write2ByteTxRx(
+                self.portHandler, self.servo_id, address, value)
+
+        if shadow is not None:
+            if dxl_comm_result != COMM_SUCCESS or dxl_error & ~ERRBIT_ALERT:
+                shadow.invalidate(address)
+            else:
+                shadow.record(address, value)
+            if dxl_error & ERRBIT_ALERT:
+                shadow.invalidate_ram()
+        return dxl_comm_result, dxl_error
+
+    def _read_register(self, address, length):
+        """
+        @brief Reads a register, answering static registers from the control table shadow when possible.
+
+        @return A (value, dxl_comm_result, dxl_error) tuple.
+        """
+        shadow = self.shadow
+        if shadow is not None:
+            value = shadow.lookup(address)
+            if value is not None:
+                return value, COMM_SUCCESS, 0
+
+        if length == 1:
+            value, dxl_comm_result, dxl_error = self.packetHandler.read1ByteTxRx(
+                self.portHandler, self.servo_id, address)
+        else:
+            value, dxl_comm_result, dxl_error = self.packetHandler.read2ByteTxRx(
+                self.portHandler, self.servo_id, address)
+
+        if shadow is not None:
+            if dxl_error & ERRBIT_ALERT:
+                shadow.invalidate_ram()
+            if dxl_comm_result == COMM_SUCCESS and dxl_error == 0:
+                shadow.record(address, value)
+        return value, dxl_comm_result, dxl_error
+
+    def read_register(self, address):
+        """
+        @brief Reads any register of the XL320 control table.
+
+        @param address The control table address, its size is looked up in XL320_CONTROL_TABLE.
+        @throw ValueError if the address is not the start of a register.
+
+        @return The register value.
+        """
+        if address not in XL320_CONTROL_TABLE:
+            raise ValueError("%d is not the address of an XL320 register" % address)
+        value, dxl_comm_result, dxl_error = self._read_register(address, XL320_CONTROL_TABLE[address].size)
+        self._finish(dxl_comm_result, dxl_error)
+        return value
+
+    def write_register(self, address, value):
+        """
+        @brief Writes any writable register of the XL320 control table.
+
+        @param address The control table address, its size is looked up in XL320_CONTROL_TABLE.
+        @param value The value to write.
+        @throw ValueError if the address is not the start of a writable register.
+
+        @return None, or a ServoResult in quiet mode.
+        """
+        register = XL320_CONTROL_TABLE.get(address)
+        if register is None or not register.writable:
+            raise ValueError("%d is not the address of a writable XL320 register" % address)
+        dxl_comm_result, dxl_error = self._write_register(address, register.size, value)
+        return self._finish(dxl_comm_result, dxl_error, value)
+
+    def reboot(self):
+        """
+        @brief Reboots the servo. The servo comes back with torque disabled and its RAM area reset.
+
+        @return None, or a ServoResult in quiet mode.
+        """
+        dxl_comm_result, dxl_error = self.packetHandler.reboot(self.portHandler, self.servo_id)
+        if self.shadow is not None:
+            self.shadow.invalidate()
+        return self._finish(dxl_comm_result, dxl_error, None, "Rebooted!")
+
+    def get_shadow_stats(self):
+        """
+        @brief Reports how much bus traffic the control table shadow saved.
+
+        @return A dict with hits, misses, writes and elided_writes, or None if the shadow is disabled.
+        """
+        if self.shadow is None:
+            return None
+        return self.shadow.get_stats()
 
     def change_led_color(self, color):
         """
@@ -21,71 +174,59 @@ class Servo:
 
         @param color The color is defined in config.py
 
-        @return None.
+        @return None, or a ServoResult in quiet mode.
 
         For example: servo.change_led_color(LED_RED)
         """
-        dxl_comm_result, dxl_error = self.packetHandler.write1ByteTxRx(
-            self.portHandler, self.servo_id, config.ADDR_LED, color)
-        
-        if dxl_comm_result != COMM_SUCCESS:
-            print("%s" % self.packetHandler.getTxRxResult(dxl_comm_result))
-        elif dxl_error != 0:
-            print("%s" % self.packetHandler.getRxPacketError(dxl_error))
+        dxl_comm_result, dxl_error = self._write_register(config.ADDR_LED, 1, color)
+        return self._finish(dxl_comm_result, dxl_error, color)
 
     def enable_torque(self):
         """
         @brief Enable torque for the servo.
 
-        @return None.
+        @return None, or a ServoResult in quiet mode.
 
         Note: Torque must be enabled before moving the servo.
         """
-        dxl_comm_result, dxl_error = self.packetHandler.write1ByteTxRx(
-            self.portHandler, self.servo_id, config.ADDR_TORQUE_ENABLE, config.TORQUE_ENABLE)
-        
-        if dxl_comm_result != COMM_SUCCESS:
-            print("%s" % self.packetHandler.getTxRxResult(dxl_comm_result))
-        elif dxl_error != 0:
-            print("%s" % self.packetHandler.getRxPacketError(dxl_error))
-        else:
-            print(f"[ID:{self.servo_id}] Torque is enabled!")
+        dxl_comm_result, dxl_error = self._write_register(config.ADDR_TORQUE_ENABLE, 1, config.TORQUE_ENABLE)
+        return self._finish(dxl_comm_result, dxl_error, config.TORQUE_ENABLE, "Torque is enabled!")
 
     def disable_torque(self):
         """
         @brief Disable torque for the servo.
         
-        @return None.
+        @return None, or a ServoResult in quiet mode.
 
         Note: Torque must be disabled before changing control mode
         """
-        dxl_comm_result, dxl_error = self.packetHandler.write1ByteTxRx(
-            self.portHandler, self.servo_id, config.ADDR_TORQUE_ENABLE, config.TORQUE_DISABLE)
+        dxl_comm_result, dxl_error = self._write_register(config.ADDR_TORQUE_ENABLE, 1, config.TORQUE_DISABLE)
+        return self._finish(dxl_comm_result, dxl_error, config.TORQUE_DISABLE, "Torque is disabled!")
 
-        if dxl_comm_result != COMM_SUCCESS:
-            print("%s" % self.packetHandler.getTxRxResult(dxl_comm_result))
-        elif dxl_error != 0:
-            print("%s" % self.packetHandler.getRxPacketError(dxl_error))
-        else:
-            print(f"[ID:{self.servo_id}] Torque is disabled!")
-
-    def get_position(self):
+    def get_position(self, cached=False, max_age=0.1):
         """
         @brief Get servo's current position by reading from address
 
-        @return servo's current position in range [0, 1023]
-        """
-        dxl_present_position, dxl_comm_result, dxl_error = self.packetHandler.read2ByteTxRx(
-            self.portHandler, self.servo_id, config.ADDR_PRESENT_POSITION)
+        @param cached If True and a TelemetryPoller is attached, return its latest
+                      sample instead of reading from the bus.
+        @param max_age The oldest cached sample accepted, in seconds. Older samples
+                       fall back to reading from the bus, unless the poller is
+                       running: it owns the port then and the stale sample is returned.
 
-        if dxl_comm_result != COMM_SUCCESS:
-            print("%s" % self.packetHandler.getTxRxResult(dxl_comm_result))
-            return dxl_present_position
-        elif dxl_error != 0:
-            print("%s" % self.packetHandler.getRxPacketError(dxl_error))
-            return dxl_present_position
-        else:
-            return dxl_present_position
+        @return servo's current position in range [0, 1023], or None if the running
+                poller has no sample yet (quiet mode raises CommError instead).
+        """
+        if cached and self.telemetry is not None:
+            sample = self.telemetry.get_latest(self.servo_id)
+            if sample is not None and (self.telemetry.running or time.monotonic() - sample.timestamp <= max_age):
+                return sample.position
+            if self.telemetry.running:
+                self._finish(COMM_NOT_AVAILABLE, 0)
+                return None
+
+        dxl_present_position, dxl_comm_result, dxl_error = self._read_register(config.ADDR_PRESENT_POSITION, 2)
+        self._finish(dxl_comm_result, dxl_error)
+        return dxl_present_position
 
     def set_position(self, goal_position):
         """
@@ -94,17 +235,69 @@ class Servo:
         @param goal_position in range [0, 1023] defined in config.py
                              as [DXL_MINIMUM_POSITION_VALUE, DXL_MAXIMUM_POSITION_VALUE]
 
-        @return None.
+        @return None, or a ServoResult in quiet mode.
         """
-        dxl_comm_result, dxl_error = self.packetHandler.write2ByteTxRx(
-            self.portHandler, self.servo_id, config.ADDR_GOAL_POSITION, goal_position)
-        
-        if dxl_comm_result != COMM_SUCCESS:
-            print("%s" % self.packetHandler.getTxRxResult(dxl_comm_result))
-        elif dxl_error != 0:
-            print("%s" % self.packetHandler.getRxPacketError(dxl_error))
-        else:
-            print(f"[ID:{self.servo_id}] Set the goal position!")
+        dxl_comm_result, dxl_error = self._write_register(config.ADDR_GOAL_POSITION, 2, goal_position)
+        return self._finish(dxl_comm_result, dxl_error, goal_position, "Set the goal position!")
+
+    def stage_register(self, address, value):
+        """
+        @brief Stages a register write with Reg Write. It takes effect on the next Action.
+
+        A servo holds one staged write, staging another one replaces it. Stage
+        the writes of several servos and release them with ServoGroup.action()
+        to start them at the same time.
+
+        @param address The control table address, its size is looked up in XL320_CONTROL_TABLE.
+        @param value The value to write.
+        @throw ValueError if the address is not the start of a writable register.
+
+        @return None, or a ServoResult in quiet mode.
+        """
+        register = XL320_CONTROL_TABLE.get(address)
+        if register is None or not register.writable:
+            raise ValueError("%d is not the address of a writable XL320 register" % address)
+        dxl_comm_result, dxl_error = self.packetHandler.regWriteTxRx(
+            self.portHandler, self.servo_id, address, register.size, list(value.to_bytes(register.size, "little")))
+        if self.shadow is not None:
+            self.shadow.invalidate(address)
+        return self._finish(dxl_comm_result, dxl_error, value, "Staged %s = %d", register.name, value)
+
+    def stage_position(self, goal_position):
+        """
+        @brief Stages the goal position, see stage_register().
+
+        @return None, or a ServoResult in quiet mode.
+        """
+        return self.stage_register(config.ADDR_GOAL_POSITION, goal_position)
+
+    def action(self):
+        """
+        @brief Applies the write staged on this servo.
+
+        @return None, or a ServoResult in quiet mode.
+        """
+        # The SDK's action() does not wait for the status packet a unicast Action
+        # is answered with, which would then be taken for the answer to the next read.
+        txpacket = [0] * 10
+        txpacket[PKT_ID] = self.servo_id
+        txpacket[PKT_LENGTH_L] = 3
+        txpacket[PKT_LENGTH_H] = 0
+        txpacket[PKT_INSTRUCTION] = INST_ACTION
+        dxl_error = 0
+        dxl_comm_result = self.packetHandler.txPacket(self.portHandler, txpacket)
+        if dxl_comm_result == COMM_SUCCESS:
+            # The port is ours from here on, a busy or failed txPacket leaves it as it was
+            self.portHandler.setPacketTimeout(11)
+            while True:
+                # Skip stray status packets of other servos, like txRxPacket does
+                rxpacket, dxl_comm_result = self.packetHandler.rxPacket(self.portHandler)
+                if dxl_comm_result != COMM_SUCCESS or rxpacket[PKT_ID] == self.servo_id:
+                    break
+            if dxl_comm_result == COMM_SUCCESS:
+                dxl_error = rxpacket[PKT_ERROR]
+            self.portHandler.is_using = False
+        return self._finish(dxl_comm_result, dxl_error, None, "Applied the staged write!")
 
     def set_control_mode(self, mode):
         """
@@ -113,25 +306,20 @@ class Servo:
         This method configures the servo's operating mode to either 'wheel' for continuous rotation or 'joint' for standard angular movement.
 
         @param mode A string that must be either "wheel" or "joint" to set the corresponding mode.
-        @throw ValueError if the provided mode string is not "wheel" or "joint".
+        @throw ValueError if the provided mode string is not "wheel" or "joint" (in quiet mode).
 
-        @return None.  
+        @return None, or a ServoResult in quiet mode.
         """
         if mode not in ["wheel", "joint"]:
+            if self.quiet:
+                raise ValueError("The control mode has to be either 'wheel' or 'joint'")
             print("The control mode has to be either 'wheel' or 'joint'")
             return
 
         mode_value = config.WHEEL_MODE if mode == "wheel" else config.JOINT_MODE
 
-        dxl_comm_result, dxl_error = self.packetHandler.write1ByteTxRx(
-            self.portHandler, self.servo_id, config.ADDR_CONTROL_MODE, mode_value)
-
-        if dxl_comm_result != COMM_SUCCESS:
-            print("%s" % self.packetHandler.getTxRxResult(dxl_comm_result))
-        elif dxl_error != 0:
-            print("%s" % self.packetHandler.getRxPacketError(dxl_error))
-        else:
-            print(f"[ID:{self.servo_id}] Set the control mode to {mode}!")
+        dxl_comm_result, dxl_error = self._write_register(config.ADDR_CONTROL_MODE, 1, mode_value)
+        return self._finish(dxl_comm_result, dxl_error, mode_value, "Set the control mode to %s!", mode)
 
     def set_joint_speed(self, speed):
         """
@@ -144,24 +332,17 @@ class Servo:
         @param speed An integer value in range [0, 1023]
         @throw ValueError if the speed is not within the valid range.
 
-        @return None.
+        @return None, or a ServoResult in quiet mode.
         """
         speed = int(speed)
         if not 0 <= speed <= 1023:
             raise ValueError("Speed must be between 0 and 1023")
-        dxl_comm_result, dxl_error = self.packetHandler.write2ByteTxRx(
-            self.portHandler, self.servo_id, config.ADDR_GOAL_SPEED, speed)
-        
-        if dxl_comm_result != COMM_SUCCESS:
-            print("%s" % self.packetHandler.getTxRxResult(dxl_comm_result))
-        elif dxl_error != 0:
-            print("%s" % self.packetHandler.getRxPacketError(dxl_error))
-        else:
-            rpm_speed = 0.111 * speed
-            if speed == 0:
-                print(f"[ID:{self.servo_id}] Set speed to maximum rpm")
-            else:
-                print(f"[ID:{self.servo_id}] Set speed to: {speed}, {rpm_speed:.2f} in rpm")
+        dxl_comm_result, dxl_error = self._write_register(config.ADDR_GOAL_SPEED, 2, speed)
+
+        if speed == 0:
+            return self._finish(dxl_comm_result, dxl_error, speed, "Set speed to maximum rpm")
+        return self._finish(dxl_comm_result, dxl_error, speed,
+                            "Set speed to: %d, %.2f in rpm", speed, 0.111 * speed)
 
     def set_wheel_ccw_speed(self, load):
         """
@@ -170,7 +351,7 @@ class Servo:
         @param load The desired speed as a percentage (0-100).
         @throw ValueError If the load parameter is outside the range of 0 to 100.
 
-        @return None
+        @return None, or a ServoResult in quiet mode.
 
         This function will convert the percentage to the corresponding speed value that the servo understands.
         The actual value range is range: 0~1023 and it is stopped by setting to 0.
@@ -180,16 +361,10 @@ class Servo:
             raise ValueError("Load must be between 0 and 100")
 
         speed = int(load * 0.01 * 1023)
-        dxl_comm_result, dxl_error = self.packetHandler.write2ByteTxRx(
-            self.portHandler, self.servo_id, config.ADDR_GOAL_SPEED, speed)
+        dxl_comm_result, dxl_error = self._write_register(config.ADDR_GOAL_SPEED, 2, speed)
+        return self._finish(dxl_comm_result, dxl_error, speed,
+                            "Set wheel mode to rotate Counter-Clockwise with %d%% output", load)
 
-        if dxl_comm_result != COMM_SUCCESS:
-            print("%s" % self.packetHandler.getTxRxResult(dxl_comm_result))
-        elif dxl_error != 0:
-            print("%s" % self.packetHandler.getRxPacketError(dxl_error))
-        else:
-            print(f"[ID:{self.servo_id}] Set wheel mode to rotate Counter-Clockwise with {load}% output")
-        
     def set_wheel_cw_speed(self, load):
         """
         @brief Sets the moving speed of the servo in the clockwise direction.
@@ -197,7 +372,7 @@ class Servo:
         @param load The desired speed as a percentage (0-100).
         @throw ValueError If the load parameter is outside the range of 0 to 100.
 
-        @return None
+        @return None, or a ServoResult in quiet mode.
 
         This function will convert the percentage to the corresponding speed value that the servo understands.
         The actual value range is range: 1024~2047 and it is stopped by setting to 1024.
@@ -207,21 +382,52 @@ class Servo:
             raise ValueError("Load must be between 0 and 100")
         speed = int((load / 100.0) * 1023)
         speed += 1024
-        dxl_comm_result, dxl_error = self.packetHandler.write2ByteTxRx(
-            self.portHandler, self.servo_id, config.ADDR_GOAL_SPEED, speed)
-        
+        dxl_comm_result, dxl_error = self._write_register(config.ADDR_GOAL_SPEED, 2, speed)
+        return self._finish(dxl_comm_result, dxl_error, speed,
+                            "Set wheel mode to rotate Clockwise with %d%% output", load)
+
+    def read_status(self):
+        """
+        @brief Reads the whole RAM area, Torque Enable to Punch, with a single Read instruction.
+
+        One round trip instead of separate reads of position, speed, load,
+        voltage, temperature and error status. The alert bit of the status
+        packet is not reported as an error, the snapshot carries the Hardware
+        Error Status instead.
+
+        @return A ServoStatus, or None if the servo did not answer (quiet mode raises instead).
+        """
+        data, dxl_comm_result, dxl_error = self.packetHandler.readTxRx(
+            self.portHandler, self.servo_id, STATUS_START, STATUS_LENGTH)
+        shadow = self.shadow
+        if shadow is not None and dxl_comm_result == COMM_SUCCESS:
+            if dxl_error & ERRBIT_ALERT:
+                shadow.invalidate_ram()
+            elif dxl_error == 0:
+                for address, register in XL320_CONTROL_TABLE.items():
+                    if STATUS_START <= address < STATUS_START + STATUS_LENGTH:
+                        offset = address - STATUS_START
+                        shadow.record(address, int.from_bytes(bytes(data[offset:offset + register.size]), "little"))
+
+        self._finish(dxl_comm_result, dxl_error & ~ERRBIT_ALERT)
         if dxl_comm_result != COMM_SUCCESS:
-            print("%s" % self.packetHandler.getTxRxResult(dxl_comm_result))
-        elif dxl_error != 0:
-            print("%s" % self.packetHandler.getRxPacketError(dxl_error))
-        else:
-            print(f"[ID:{self.servo_id}] Set wheel mode to rotate Clockwise with {load}% output")
+            return None
+        return ServoStatus(self.servo_id, data)
 
     def look_error_info(self):
-        hardware_error_status, dxl_comm_result, dxl_error = self.packetHandler.read1ByteTxRx(
-            self.portHandler, self.servo_id, config.ADDR_HARDWARE_ERROR_STATUS)
-        print("Hardware Error Status: ", hardware_error_status)
+        """
+        @brief Reads the Hardware Error Status and Shutdown registers.
+
+        @return None, or in quiet mode a (hardware_error_status, shutdown_error_info) tuple.
+        """
+        hardware_error_status, dxl_comm_result, dxl_error = self._read_register(config.ADDR_HARDWARE_ERROR_STATUS, 1)
+        if self.quiet:
+            self._finish(dxl_comm_result, dxl_error)
+        else:
+            print("Hardware Error Status: ", hardware_error_status)
 
-        shutdown_error_info, dxl_comm_result, dxl_error = self.packetHandler.read1ByteTxRx(
-            self.portHandler, self.servo_id, config.ADDR_SHUTDOWN)
-        print("Shutdown Error Information: ", shutdown_error_info)
\ No newline at end of file
+        shutdown_error_info, dxl_comm_result, dxl_error = self._read_register(config.ADDR_SHUTDOWN, 1)
+        if self.quiet:
+            self._finish(dxl_comm_result, dxl_error)
+            return hardware_error_status, shutdown_error_info
+        print("Shutdown Error Information: ", shutdown_error_info)
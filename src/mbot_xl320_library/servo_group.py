@@ -0,0 +1,405 @@
+import time
+from . import config
+from .errors import CommError, HardwareError, ServoError, ServoResult
+from .control_table import XL320_CONTROL_TABLE
+from .servo import Servo
+from .status import STATUS_LENGTH, STATUS_START, ServoStatus
+from dynamixel_sdk import (  # Uses Dynamixel SDK library
+    BROADCAST_ID, COMM_NOT_AVAILABLE, COMM_RX_CORRUPT, COMM_SUCCESS, DXL_HIBYTE, DXL_LOBYTE, DXL_MAKEWORD, PKT_ERROR, PKT_ID,
+    PKT_LENGTH_H, PKT_LENGTH_L, PKT_PARAMETER0,
+)
+
+
+class ServoGroup:
+    """@brief Class to control several Dynamixel Servos sharing one bus."""
+
+    def __init__(self, servo_ids, portHandler, packetHandler, quiet=False, logger=None):
+        """
+        @param quiet If True, never print: writes return a ServoResult and failures
+                     raise CommError or HardwareError, like Servo(quiet=True).
+        @param logger An optional logging.Logger, see Servo.
+        """
+        self.servo_ids = list(servo_ids)
+        self.portHandler = portHandler
+        self.packetHandler = packetHandler
+        self.quiet = quiet
+        self.logger = logger
+        self.servos = {
+            servo_id: Servo(servo_id, portHandler, packetHandler, quiet=quiet, logger=logger)
+            for servo_id in self.servo_ids
+        }
+
+    def sync_write(self, address, length, values):
+        """
+        @brief Writes one register of many servos with a single Sync Write instruction.
+
+        @param address The control table address to write.
+        @param length The register size in bytes (1 or 2).
+        @param values A dict mapping servo ID to the value to write.
+
+        @return The communication result of the transaction. Nothing is printed or raised,
+                so control loops can call it every cycle; see write_registers().
+
+        Sync Write is a broadcast instruction, so the servos do not answer with a
+        status packet and the whole group costs a single transmission.
+        """
+        if not values:
+            return COMM_NOT_AVAILABLE
+
+        param = []
+        for servo_id, value in values.items():
+            param.append(servo_id)
+            if length == 1:
+                param.append(DXL_LOBYTE(value))
+            else:
+                param.extend([DXL_LOBYTE(value), DXL_HIBYTE(value)])
+
+        return self.packetHandler.syncWriteTxOnly(
+            self.portHandler, address, length, param, len(param))
+
+    def _sync_read(self, address, length, servo_ids=None):
+        """
+        @brief Reads one block of registers from many servos with a single Sync Read instruction.
+
+        @param address The first control table address to read.
+        @param length The number of bytes to read from each servo.
+        @param servo_ids The IDs to read, defaults to every servo in the group.
+
+        @return A dict mapping servo ID to a (data, dxl_comm_result, dxl_error) tuple.
+
+        The instruction is sent once and the status packets of every addressed
+        servo are collected and demultiplexed by ID in the same receive window.
+        A status packet carrying fewer than length bytes (a servo answering with
+        an error and no data) is reported as COMM_RX_CORRUPT.
+        """
+        servo_ids = self.servo_ids if servo_ids is None else list(servo_ids)
+        results = {}
+
+        dxl_comm_result = self.packetHandler.syncReadTx(
+            self.portHandler, address, length, servo_ids, len(servo_ids))
+
+        pending = set(servo_ids)
+        while pending and dxl_comm_result == COMM_SUCCESS:
+            rxpacket, dxl_comm_result = self.packetHandler.rxPacket(self.portHandler)
+            if dxl_comm_result != COMM_SUCCESS:
+                break
+            servo_id = rxpacket[PKT_ID]
+            if servo_id in pending:
+                pending.discard(servo_id)
+                # the packet length counts the instruction, error and CRC bytes besides the data
+                if DXL_MAKEWORD(rxpacket[PKT_LENGTH_L], rxpacket[PKT_LENGTH_H]) - 4 != length:
+                    results[servo_id] = ([], COMM_RX_CORRUPT, rxpacket[PKT_ERROR])
+                else:
+                    data = rxpacket[PKT_PARAMETER0 + 1: PKT_PARAMETER0 + 1 + length]
+                    results[servo_id] = (data, COMM_SUCCESS, rxpacket[PKT_ERROR])
+
+        self.portHandler.is_using = False
+        for servo_id in pending:
+            results[servo_id] = ([], dxl_comm_result, 0)
+        return results
+
+    def read_block(self, address, length, servo_ids=None, report=False):
+        """
+        @brief Reads one block of registers from many servos, with a single Sync Read
+               on Protocol 2.0 and one read per servo otherwise.
+
+        @param address The first control table address to read.
+        @param length The number of bytes to read from each servo.
+        @param servo_ids The IDs to read, defaults to every servo in the group.
+        @param report If True, report the servos that did not answer like get_positions()
+                      does: print them, or raise CommError in quiet mode.
+
+        @return A dict mapping servo ID to a (data, dxl_comm_result, dxl_error) tuple.
+        """
+        if self.packetHandler.getProtocolVersion() == 2.0:
+            results = self._sync_read(address, length, servo_ids)
+        else:
+            servo_ids = self.servo_ids if servo_ids is None else servo_ids
+            results = {
+                servo_id: self.packetHandler.readTxRx(self.portHandler, servo_id, address, length)
+                for servo_id in servo_ids
+            }
+        if report:
+            for servo_id, (_, dxl_comm_result, dxl_error) in results.items():
+                self._check_read(servo_id, dxl_comm_result, dxl_error, check_error=False)
+        return results
+
+    def write_registers(self, address, values):
+        """
+        @brief Writes one register of many servos with sync_write() and reports it like the setters.
+
+        @param address The control table address, its size is looked up in XL320_CONTROL_TABLE.
+        @param values A dict mapping servo ID to the value to write.
+
+        @return None, or a ServoResult in quiet mode.
+        """
+        register = XL320_CONTROL_TABLE[address]
+        return self._report(self.sync_write(address, register.size, values), values, "Set the %s!" % register.name)
+
+    def _report(self, dxl_comm_result, values, message):
+        """
+        @brief Reports the outcome of a group write.
+
+        @return A ServoResult carrying the written values in quiet mode, None otherwise.
+        """
+        ids = ",".join(str(servo_id) for servo_id in values)
+        if dxl_comm_result != COMM_SUCCESS:
+            description = self.packetHandler.getTxRxResult(dxl_comm_result)
+            if self.logger is not None:
+                self.logger.warning("[ID:%s] %s", ids, description)
+            if self.quiet:
+                raise CommError(None, dxl_comm_result, 0, "[ID:%s] %s" % (ids, description))
+            print("%s" % description)
+        else:
+            if self.logger is not None:
+                self.logger.debug("[ID:%s] %s", ids, message)
+            if not self.quiet:
+                print(f"[ID:{ids}] {message}")
+
+        if self.quiet:
+            return ServoResult(None, dxl_comm_result, 0, values)
+        return None
+
+    def _check_read(self, servo_id, dxl_comm_result, dxl_error, check_error=True):
+        """
+        @brief Reports a failed read of one servo of the group: prints it, or raises in quiet mode.
+        """
+        if dxl_comm_result != COMM_SUCCESS:
+            description = self.packetHandler.getTxRxResult(dxl_comm_result)
+            error_type = CommError
+        elif check_error and dxl_error != 0:
+            description = self.packetHandler.getRxPacketError(dxl_error)
+            error_type = HardwareError
+        else:
+            return
+
+        if self.logger is not None:
+            self.logger.warning("[ID:%d] %s", servo_id, description)
+        if self.quiet:
+            raise error_type(servo_id, dxl_comm_result, dxl_error, description)
+        print("[ID:%d] %s" % (servo_id, description))
+
+    def change_led_colors(self, colors):
+        """
+        @brief Changes the LED color of many servos at once.
+
+        @param colors A dict mapping servo ID to a color defined in config.py
+
+        @return None, or a ServoResult in quiet mode.
+
+        For example: group.change_led_colors({1: LED_RED, 2: LED_BLUE})
+        """
+        dxl_comm_result = self.sync_write(config.ADDR_LED, 1, colors)
+        return self._report(dxl_comm_result, colors, "Changed the LED colors!")
+
+    def enable_torque(self, servo_ids=None):
+        """
+        @brief Enable torque for the servos.
+
+        @param servo_ids The IDs to enable, defaults to every servo in the group.
+
+        @return None, or a ServoResult in quiet mode.
+        """
+        servo_ids = self.servo_ids if servo_ids is None else servo_ids
+        values = {servo_id: config.TORQUE_ENABLE for servo_id in servo_ids}
+        dxl_comm_result = self.sync_write(config.ADDR_TORQUE_ENABLE, 1, values)
+        return self._report(dxl_comm_result, values, "Torque is enabled!")
+
+    def disable_torque(self, servo_ids=None):
+        """
+        @brief Disable torque for the servos.
+
+        @param servo_ids The IDs to disable, defaults to every servo in the group.
+
+        @return None, or a ServoResult in quiet mode.
+        """
+        servo_ids = self.servo_ids if servo_ids is None else servo_ids
+        values = {servo_id: config.TORQUE_DISABLE for servo_id in servo_ids}
+        dxl_comm_result = self.sync_write(config.ADDR_TORQUE_ENABLE, 1, values)
+        return self._report(dxl_comm_result, values, "Torque is disabled!")
+
+    def set_positions(self, goal_positions):
+        """
+        @brief Sets the goal positions for many servos in joint mode.
+
+        @param goal_positions A dict mapping servo ID to a goal position in range [0, 1023]
+
+        @return None, or a ServoResult in quiet mode.
+
+        For example: group.set_positions({1: 512, 2: 300})
+        """
+        dxl_comm_result = self.sync_write(config.ADDR_GOAL_POSITION, 2, goal_positions)
+        return self._report(dxl_comm_result, goal_positions, "Set the goal positions!")
+
+    def set_joint_speeds(self, speeds):
+        """
+        @brief Sets the joint speed of many servos at once.
+
+        @param speeds A dict mapping servo ID to a speed in range [0, 1023]
+        @throw ValueError if a speed is not within the valid range.
+
+        @return None, or a ServoResult in quiet mode.
+        """
+        speeds = {servo_id: int(speed) for servo_id, speed in speeds.items()}
+        for speed in speeds.values():
+            if not 0 <= speed <= 1023:
+                raise ValueError("Speed must be between 0 and 1023")
+
+        dxl_comm_result = self.sync_write(config.ADDR_GOAL_SPEED, 2, speeds)
+        return self._report(dxl_comm_result, speeds, "Set the joint speeds!")
+
+    def set_wheel_speeds(self, loads):
+        """
+        @brief Sets the moving speed of many servos in wheel mode.
+
+        @param loads A dict mapping servo ID to a signed percentage (-100 to 100).
+                     Positive values rotate counter-clockwise, negative values clockwise.
+        @throw ValueError If a load is outside the range of -100 to 100.
+
+        @return None, or a ServoResult in quiet mode.
+        """
+        speeds = {}
+        for servo_id, load in loads.items():
+            load = int(load)
+            if not -100 <= load <= 100:
+                raise ValueError("Load must be between -100 and 100")
+            if load >= 0:
+                speeds[servo_id] = int(load * 0.01 * 1023)
+            else:
+                speeds[servo_id] = int((-load / 100.0) * 1023) + 1024
+
+        dxl_comm_result = self.sync_write(config.ADDR_GOAL_SPEED, 2, speeds)
+        return self._report(dxl_comm_result, speeds, "Set the wheel speeds!")
+
+    def stage_registers(self, address, values):
+        """
+        @brief Stages a register write on many servos with one Reg Write each, see action().
+
+        @param address The control table address, its size is looked up in XL320_CONTROL_TABLE.
+        @param values A dict mapping servo ID to the value to write.
+        @throw ValueError if the address is not the start of a writable register.
+
+        @return None, or a ServoResult in quiet mode carrying the values that were staged.
+
+        Every servo is tried even if one fails. In quiet mode the first failure is
+        raised after the loop, with the values that were staged anyway in its
+        staged attribute: they still take effect on the next Action.
+        """
+        register = XL320_CONTROL_TABLE.get(address)
+        if register is None or not register.writable:
+            raise ValueError("%d is not the address of a writable XL320 register" % address)
+        staged = {}
+        failures = []
+        for servo_id, value in values.items():
+            dxl_comm_result, dxl_error = self.packetHandler.regWriteTxRx(
+                self.portHandler, servo_id, address, register.size, list(value.to_bytes(register.size, "little")))
+            try:
+                self._check_read(servo_id, dxl_comm_result, dxl_error)
+            except ServoError as error:
+                failures.append(error)
+                continue
+            if dxl_comm_result == COMM_SUCCESS and dxl_error == 0:
+                staged[servo_id] = value
+        if failures:
+            failures[0].staged = staged
+            raise failures[0]
+        return self._report(COMM_SUCCESS, staged, "Staged %s!" % register.name)
+
+    def stage_positions(self, goal_positions):
+        """
+        @brief Stages goal positions to start every servo at once with action().
+
+        @param goal_positions A dict mapping servo ID to a goal position in range [0, 1023]
+
+        @return None, or a ServoResult in quiet mode.
+
+        For example: group.stage_positions({1: 512, 2: 300}); group.action()
+        """
+        return self.stage_registers(config.ADDR_GOAL_POSITION, goal_positions)
+
+    def action(self):
+        """
+        @brief Applies the staged writes of every servo on the bus with one broadcast Action.
+
+        Broadcast instructions are not answered, so all servos act on the same
+        packet instead of one round trip apart. Servos outside the group that
+        have a staged write act as well.
+
+        @return None, or a ServoResult in quiet mode.
+        """
+        dxl_comm_result = self.packetHandler.action(self.portHandler, BROADCAST_ID)
+        return self._report(dxl_comm_result, dict.fromkeys(self.servo_ids), "Applied the staged writes!")
+
+    def get_positions(self, servo_ids=None):
+        """
+        @brief Get the current position of many servos in one bus transaction.
+
+        @param servo_ids The IDs to read, defaults to every servo in the group.
+
+        @return A dict mapping servo ID to its position in range [0, 1023],
+                or None if the servo did not answer (quiet mode raises instead).
+        """
+        positions = {}
+        for servo_id, (data, dxl_comm_result, dxl_error) in self._sync_read(
+                config.ADDR_PRESENT_POSITION, 2, servo_ids).items():
+            self._check_read(servo_id, dxl_comm_result, dxl_error)
+            if dxl_comm_result != COMM_SUCCESS:
+                positions[servo_id] = None
+                continue
+            positions[servo_id] = DXL_MAKEWORD(data[0], data[1])
+        return positions
+
+    def read_feedback(self, servo_ids=None):
+        """
+        @brief Reads position, temperature and error status of many servos in one bus transaction.
+
+        A single Sync Read covers the control table from ADDR_PRESENT_POSITION
+        to ADDR_HARDWARE_ERROR_STATUS.
+
+        @param servo_ids The IDs to read, defaults to every servo in the group.
+
+        @return A dict mapping servo ID to a dict with the keys "position",
+                "temperature", "hardware_error_status" and "error" (the status
+                packet error byte). The values are None if the servo did not answer
+                (quiet mode raises CommError instead).
+        """
+        start = config.ADDR_PRESENT_POSITION
+        length = config.ADDR_HARDWARE_ERROR_STATUS - start + 1
+
+        feedback = {}
+        for servo_id, (data, dxl_comm_result, dxl_error) in self._sync_read(
+                start, length, servo_ids).items():
+            # the status error byte is part of the feedback, only a missing answer is reported
+            self._check_read(servo_id, dxl_comm_result, dxl_error, check_error=False)
+            if dxl_comm_result != COMM_SUCCESS:
+                feedback[servo_id] = {
+                    "position": None,
+                    "temperature": None,
+                    "hardware_error_status": None,
+                    "error": None,
+                }
+                continue
+            feedback[servo_id] = {
+                "position": DXL_MAKEWORD(data[0], data[1]),
+                "temperature": data[config.ADDR_PRESENT_TEMPERATURE - start],
+                "hardware_error_status": data[config.ADDR_HARDWARE_ERROR_STATUS - start],
+                "error": dxl_error,
+            }
+        return feedback
+
+    def read_status(self, servo_ids=None):
+        """
+        @brief Reads the whole RAM area of many servos in one bus transaction, see Servo.read_status().
+
+        @param servo_ids The IDs to read, defaults to every servo in the group.
+
+        @return A dict mapping servo ID to a ServoStatus, or None if the servo did not
+                answer (quiet mode raises CommError instead).
+        """
+        statuses = {}
+        results = self.read_block(STATUS_START, STATUS_LENGTH, servo_ids)
+        timestamp = time.monotonic()
+        for servo_id, (data, dxl_comm_result, dxl_error) in results.items():
+            self._check_read(servo_id, dxl_comm_result, dxl_error, check_error=False)
+            statuses[servo_id] = ServoStatus(servo_id, data, timestamp) if dxl_comm_result == COMM_SUCCESS else None
+        return statuses
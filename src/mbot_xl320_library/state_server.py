@@ -0,0 +1,444 @@
+import argparse
+import fcntl
+import mmap
+import os
+import struct
+import tempfile
+import threading
+import time
+from multiprocessing import shared_memory
+from . import config
+from .scheduler import FixedRateLoop
+from .servo_group import ServoGroup
+from .status import STATUS_LENGTH, STATUS_START, ServoStatus
+from dynamixel_sdk import COMM_SUCCESS  # Uses Dynamixel SDK library
+
+DEFAULT_NAME = "xl320_state"
+SHM_DIRECTORY = "/dev/shm"              # where Linux keeps the POSIX shared memory segments
+MAGIC = b"XLSM"
+VERSION = 1
+CACHE_LINE = 64
+
+# Segment layout, every part starting on a cache line:
+#   header, slot index of every servo ID (0 = not served), one state slot per servo,
+#   the command ring's head, its tail and its entries.
+HEADER = struct.Struct("<4sHHIIdQ")     # magic, version, servo count, ring capacity, server pid, started, cycles
+HEADER_CYCLES = 24                      # offset of the cycle counter in the header
+INDEX_OFFSET = CACHE_LINE
+SLOTS_OFFSET = INDEX_OFFSET + 256
+SEQUENCE = struct.Struct("<Q")
+SLOT = struct.Struct("<QdHB")           # sequence, timestamp, failed reads in a row, servo ID
+SLOT_BODY = struct.Struct("<dHB")       # SLOT after the sequence
+SLOT_DATA = SLOT.size                   # the STATUS_LENGTH bytes read from STATUS_START follow
+SLOT_SIZE = CACHE_LINE
+COMMAND = struct.Struct("<dBBxxi")      # timestamp, servo ID, command, value
+POSITION = struct.Struct("<H")
+
+# Commands and the register each one writes
+COMMAND_TORQUE = 0
+COMMAND_LED = 1
+COMMAND_GOAL_POSITION = 2
+COMMAND_GOAL_SPEED = 3
+COMMAND_REGISTERS = {
+    COMMAND_TORQUE: (config.ADDR_TORQUE_ENABLE, 1, 1),          # address, length, max value
+    COMMAND_LED: (config.ADDR_LED, 1, 7),
+    COMMAND_GOAL_POSITION: (config.ADDR_GOAL_POSITION, 2, 1023),
+    COMMAND_GOAL_SPEED: (config.ADDR_GOAL_SPEED, 2, 2047),
+}
+
+
+def _layout(servo_count, ring_capacity):
+    """@return The offsets of the ring head, ring tail and ring entries, and the segment size."""
+    head = SLOTS_OFFSET + servo_count * SLOT_SIZE
+    tail = head + CACHE_LINE
+    entries = tail + CACHE_LINE
+    return head, tail, entries, entries + ring_capacity * COMMAND.size
+
+
+def _lock_path(name):
+    return os.path.join(tempfile.gettempdir(), name + ".lock")
+
+
+class StateServer:
+    """
+    @brief Owns the bus and shares the state of its servos with other processes through shared memory.
+
+    Each cycle applies the commands queued by StateClient objects, one Sync
+    Write per kind of command, then reads the RAM area of every servo with
+    one Sync Read and publishes each ServoStatus into the servo's slot of a
+    fixed-layout shared memory segment. A slot is written under a seqlock:
+    its sequence number is odd while the slot changes, so readers in other
+    processes never lock and never see half a write, and the writer never
+    waits for them. Commands come in through a ring in the same segment;
+    the server is its only consumer, and producers serialize on a lock file.
+    The cycles run in a FixedRateLoop.
+
+    A cycle that raises is counted and logged and serving goes on. An OSError
+    means the port itself is gone: serving then ends and the exception is kept
+    in error.
+    """
+
+    def __init__(self, servo_ids, portHandler, packetHandler, name=DEFAULT_NAME, rate=100.0, ring_capacity=256,
+                 logger=None):
+        """
+        @param name The name of the shared memory segment the clients attach to.
+        @param rate The publish rate in Hz.
+        @param ring_capacity The number of commands that can wait in the ring.
+        @param logger An optional logging.Logger the failed cycles are logged to, see Servo.
+        """
+        self.servo_ids = sorted(servo_ids)
+        self.portHandler = portHandler
+        self.packetHandler = packetHandler
+        self.name = name
+        self.ring_capacity = ring_capacity
+        self.logger = logger
+        self.error = None           # the exception that ended serving, if any
+        self.group = ServoGroup(self.servo_ids, portHandler, packetHandler)
+
+        self._head, self._tail, self._entries, size = _layout(len(self.servo_ids), ring_capacity)
+        self.memory = shared_memory.SharedMemory(name=name, create=True, size=size)
+        self.buffer = self.memory.buf
+        self.buffer[:size] = bytes(size)
+        HEADER.pack_into(self.buffer, 0, MAGIC, VERSION, len(self.servo_ids), ring_capacity, os.getpid(),
+                         time.time(), 0)
+        self._slots = {}
+        for index, servo_id in enumerate(self.servo_ids):
+            self.buffer[INDEX_OFFSET + servo_id] = index + 1
+            self._slots[servo_id] = SLOTS_OFFSET + index * SLOT_SIZE
+        self._failures = dict.fromkeys(self.servo_ids, 0)
+        self._sequences = dict.fromkeys(self.servo_ids, 0)
+
+        self._thread = None
+        self._stop_event = threading.Event()
+        self.loop = FixedRateLoop(rate, self._stop_event)
+        self.period = self.loop.period
+        self.reset_stats()
+
+    def reset_stats(self):
+        self.loop.reset_stats()
+        self.cycles = 0
+        self.failed_reads = 0
+        self.failed_cycles = 0
+        self.commands = 0
+
+    def get_stats(self):
+        """
+        @return A dict with the number of cycles, of cycles dropped because a cycle
+                overran its period, of failed servo reads, of cycles that raised and
+                of commands applied,
+                and the mean and max jitter of the cycle start in milliseconds.
+        """
+        loop = self.loop.get_stats()
+        return {
+            "cycles": self.cycles,
+            "dropped_cycles": loop["skipped_cycles"],
+            "failed_reads": self.failed_reads,
+            "failed_cycles": self.failed_cycles,
+            "commands": self.commands,
+            "jitter_mean_ms": loop["jitter_mean_ms"],
+            "jitter_max_ms": loop["jitter_max_ms"],
+        }
+
+    def _publish(self, servo_id, timestamp, data):
+        """@brief Writes a new state into the slot of the servo, or only the failure count if data is None."""
+        offset = self._slots[servo_id]
+        sequence = self._sequences[servo_id] + 1
+        # An odd sequence tells the readers the slot is changing
+        SEQUENCE.pack_into(self.buffer, offset, sequence)
+        if data is None:
+            timestamp = SLOT.unpack_from(self.buffer, offset)[1]
+        else:
+            self.buffer[offset + SLOT_DATA:offset + SLOT_DATA + STATUS_LENGTH] = bytes(data)
+        SLOT_BODY.pack_into(self.buffer, offset + SEQUENCE.size, timestamp, self._failures[servo_id], servo_id)
+        self._sequences[servo_id] = sequence + 1
+        SEQUENCE.pack_into(self.buffer, offset, sequence + 1)
+
+    def apply_commands(self):
+        """@brief Writes the commands queued in the ring, the last value per servo and command."""
+        head = SEQUENCE.unpack_from(self.buffer, self._head)[0]
+        tail = SEQUENCE.unpack_from(self.buffer, self._tail)[0]
+        if head == tail:
+            return
+        writes = {}
+        for position in range(tail, head):
+            offset = self._entries + position % self.ring_capacity * COMMAND.size
+            _, servo_id, command, value = COMMAND.unpack_from(self.buffer, offset)
+            if servo_id in self._slots and command in COMMAND_REGISTERS:
+                writes.setdefault(command, {})[servo_id] = value
+        SEQUENCE.pack_into(self.buffer, self._tail, head)
+        self.commands += head - tail
+
+        for command, values in writes.items():
+            address, length, _ = COMMAND_REGISTERS[command]
+            self.group.sync_write(address, length, values)
+
+    def poll_once(self):
+        """@brief Applies the queued commands, then reads and publishes the state of every servo."""
+        self.apply_commands()
+        results = self.group.read_block(STATUS_START, STATUS_LENGTH)
+        timestamp = time.monotonic()
+        for servo_id, (data, dxl_comm_result, dxl_error) in results.items():
+            if dxl_comm_result != COMM_SUCCESS or len(data) != STATUS_LENGTH:
+                # Keep the last state, readers see its age and the failure count
+                self.failed_reads += 1
+                self._failures[servo_id] += 1
+                if self._sequences[servo_id]:
+                    self._publish(servo_id, timestamp, None)
+                continue
+            self._failures[servo_id] = 0
+            self._publish(servo_id, timestamp, data)
+        self.cycles += 1
+        struct.pack_into("<Q", self.buffer, HEADER_CYCLES, self.cycles)
+
+    def _cycle(self, dt):
+        try:
+            self.poll_once()
+        except OSError as error:
+            self.failed_cycles += 1
+            self.error = error
+            if self.logger is not None:
+                self.logger.exception("State server stopped, the port failed")
+            self._stop_event.set()
+        except Exception:
+            self.failed_cycles += 1
+            if self.logger is not None:
+                self.logger.exception("State server cycle failed")
+
+    def _run(self):
+        self.loop.run(self._cycle)
+
+    def start(self):
+        """@brief Starts serving on a background thread. From now on only the server may use the port."""
+        if self._thread is not None:
+            return self
+        self._stop_event.clear()
+        self.error = None
+        self._thread = threading.Thread(target=self._run, name="xl320-state-server", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """@brief Stops serving; the segment stays readable until close()."""
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def serve_forever(self):
+        """
+        @brief Serves on the calling thread until stop() is called from another one.
+
+        @throw OSError If the port failed.
+        """
+        self._stop_event.clear()
+        self.error = None
+        self._run()
+        if self.error is not None:
+            raise self.error
+
+    def close(self):
+        """@brief Stops serving and removes the shared memory segment."""
+        self.stop()
+        self.buffer = None
+        self.memory.close()
+        self.memory.unlink()
+        try:
+            os.remove(_lock_path(self.name))
+        except FileNotFoundError:
+            pass
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class StateClient:
+    """
+    @brief Reads the servo states a StateServer publishes and queues commands for it, from any process.
+
+    Reads go straight to the shared memory segment and retry only while the
+    server is writing the same slot, so they take microseconds, never block
+    the server and need no system call. The segment is mapped from /dev/shm,
+    so clients run on Linux only. A StateClient is not thread-safe; use one
+    per thread.
+    """
+
+    def __init__(self, name=DEFAULT_NAME):
+        self.name = name
+        # Map the segment directly: SharedMemory would register it with the resource
+        # tracker of this process, which removes it when the process exits.
+        fd = os.open(os.path.join(SHM_DIRECTORY, name), os.O_RDWR)
+        try:
+            self.memory = mmap.mmap(fd, 0)
+        finally:
+            os.close(fd)
+        self.buffer = memoryview(self.memory)
+        magic, version, servo_count, self.ring_capacity, self.server_pid, self.started_at, _ = \
+            HEADER.unpack_from(self.buffer, 0)
+        if magic != MAGIC or version != VERSION:
+            self.close()
+            raise ValueError("%s is not a servo state segment of version %d" % (name, VERSION))
+        self._head, self._tail, self._entries, _ = _layout(servo_count, self.ring_capacity)
+        self._slots = {}
+        for servo_id in range(256):
+            index = self.buffer[INDEX_OFFSET + servo_id]
+            if index:
+                self._slots[servo_id] = SLOTS_OFFSET + (index - 1) * SLOT_SIZE
+        self.servo_ids = sorted(self._slots)
+        self.retries = 0
+        self._lock_fd = None
+
+    @property
+    def cycles(self):
+        """@return The number of cycles the server ran, to tell if it is still alive."""
+        return struct.unpack_from("<Q", self.buffer, HEADER_CYCLES)[0]
+
+    def _offset(self, servo_id):
+        try:
+            return self._slots[servo_id]
+        except KeyError:
+            raise ValueError("Servo ID %d is not served" % servo_id) from None
+
+    def read(self, servo_id):
+        """
+        @return The newest ServoStatus of the servo, or None if it has not been read yet.
+                ServoStatus.timestamp is the server's time.monotonic() of the read.
+        """
+        offset = self._offset(servo_id)
+        buffer = self.buffer
+        while True:
+            sequence = SEQUENCE.unpack_from(buffer, offset)[0]
+            if sequence & 1:
+                # the server is writing the slot; let it run in case it was preempted mid-write
+                self.retries += 1
+                os.sched_yield()
+                continue
+            if sequence == 0:
+                return None
+            _, timestamp, _, _ = SLOT.unpack_from(buffer, offset)
+            data = bytes(buffer[offset + SLOT_DATA:offset + SLOT_DATA + STATUS_LENGTH])
+            if SEQUENCE.unpack_from(buffer, offset)[0] == sequence:
+                return ServoStatus(servo_id, data, timestamp)
+            self.retries += 1
+
+    def read_position(self, servo_id):
+        """@return A (present position, timestamp) tuple, or None if the servo has not been read yet."""
+        offset = self._offset(servo_id)
+        position_offset = offset + SLOT_DATA + config.ADDR_PRESENT_POSITION - STATUS_START
+        buffer = self.buffer
+        while True:
+            sequence = SEQUENCE.unpack_from(buffer, offset)[0]
+            if sequence & 1:
+                # the server is writing the slot; let it run in case it was preempted mid-write
+                self.retries += 1
+                os.sched_yield()
+                continue
+            if sequence == 0:
+                return None
+            timestamp = SLOT.unpack_from(buffer, offset)[1]
+            position = POSITION.unpack_from(buffer, position_offset)[0]
+            if SEQUENCE.unpack_from(buffer, offset)[0] == sequence:
+                return position, timestamp
+            self.retries += 1
+
+    def failed_reads(self, servo_id):
+        """@return How many reads of the servo failed in a row, as of its last published state."""
+        return SLOT.unpack_from(self.buffer, self._offset(servo_id))[2]
+
+    def read_all(self):
+        """@return A dict mapping every served servo ID to its ServoStatus, see read()."""
+        return {servo_id: self.read(servo_id) for servo_id in self.servo_ids}
+
+    def send(self, commands):
+        """
+        @brief Queues commands for the next cycle of the server.
+
+        @param commands A list of (servo ID, COMMAND_* constant, value) tuples.
+        @throw ValueError If a servo is not served or a value is out of range.
+
+        @return False if the ring has no room for all of them, in which case none is queued.
+        """
+        for servo_id, command, value in commands:
+            self._offset(servo_id)
+            if command not in COMMAND_REGISTERS:
+                raise ValueError("Unknown command %r" % (command,))
+            if not 0 <= value <= COMMAND_REGISTERS[command][2]:
+                raise ValueError("Value must be between 0 and %d" % COMMAND_REGISTERS[command][2])
+
+        if self._lock_fd is None:
+            self._lock_fd = os.open(_lock_path(self.name), os.O_RDWR | os.O_CREAT, 0o666)
+        fcntl.flock(self._lock_fd, fcntl.LOCK_EX)
+        try:
+            head = SEQUENCE.unpack_from(self.buffer, self._head)[0]
+            tail = SEQUENCE.unpack_from(self.buffer, self._tail)[0]
+            if head + len(commands) - tail > self.ring_capacity:
+                return False
+            now = time.monotonic()
+            for servo_id, command, value in commands:
+                COMMAND.pack_into(self.buffer, self._entries + head % self.ring_capacity * COMMAND.size,
+                                  now, servo_id, command, value)
+                head += 1
+            # Publishing the head last hands the entries to the server
+            SEQUENCE.pack_into(self.buffer, self._head, head)
+            return True
+        finally:
+            fcntl.flock(self._lock_fd, fcntl.LOCK_UN)
+
+    def set_positions(self, goal_positions):
+        """@param goal_positions A dict mapping servo ID to a goal position in range [0, 1023]"""
+        return self.send([(servo_id, COMMAND_GOAL_POSITION, value) for servo_id, value in goal_positions.items()])
+
+    def set_speeds(self, speeds):
+        """@param speeds A dict mapping servo ID to a Moving Speed in range [0, 2047]"""
+        return self.send([(servo_id, COMMAND_GOAL_SPEED, value) for servo_id, value in speeds.items()])
+
+    def set_torque(self, servo_ids, enabled):
+        return self.send([(servo_id, COMMAND_TORQUE, int(bool(enabled))) for servo_id in servo_ids])
+
+    def set_led_colors(self, colors):
+        """@param colors A dict mapping servo ID to a color defined in config.py"""
+        return self.send([(servo_id, COMMAND_LED, value) for servo_id, value in colors.items()])
+
+    def close(self):
+        if self._lock_fd is not None:
+            os.close(self._lock_fd)
+            self._lock_fd = None
+        self.buffer.release()
+        self.memory.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def main():
+    from .utils import initialize_handlers, open_port, close_port, set_baudrate
+
+    parser = argparse.ArgumentParser(description="Share the state of a chain of XL320 servos with other processes.")
+    parser.add_argument("ids", type=int, nargs="+", help="IDs of the servos to serve")
+    parser.add_argument("--port", required=True, help="serial port of the bus, e.g. /dev/ttyTHS1")
+    parser.add_argument("--baudrate", type=int, default=config.BAUDRATE)
+    parser.add_argument("--rate", type=float, default=100.0, help="publish rate in Hz")
+    parser.add_argument("--name", default=DEFAULT_NAME, help="name of the shared memory segment")
+    args = parser.parse_args()
+
+    portHandler, packetHandler = initialize_handlers(args.port, fast=True)
+    open_port(portHandler, quiet=True)
+    set_baudrate(portHandler, args.baudrate, quiet=True)
+    server = StateServer(args.ids, portHandler, packetHandler, name=args.name, rate=args.rate)
+    print("Serving the state of IDs %s from %s as %s" % (", ".join(map(str, args.ids)), args.port, args.name))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.close()
+        close_port(portHandler)
+
+
+if __name__ == "__main__":
+    main()
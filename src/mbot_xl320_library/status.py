@@ -0,0 +1,109 @@
+import time
+from . import config
+
+# The RAM area of the XL320 control table, Torque Enable .. Punch, in one read
+STATUS_START = config.ADDR_TORQUE_ENABLE
+STATUS_LENGTH = 53 - STATUS_START
+
+DIRECTION_BIT = 0x400           # set in Present Speed and Present Load when turning clockwise
+LOAD_UNIT_PERCENT = 0.1
+VOLTAGE_UNIT_VOLT = 0.1
+
+
+def _word(data, address):
+    offset = address - STATUS_START
+    return data[offset] | data[offset + 1] << 8
+
+
+def _signed(value):
+    """@return The magnitude of a direction-bit value, negative for clockwise."""
+    return -(value & 0x3FF) if value & DIRECTION_BIT else value & 0x3FF
+
+
+class ServoStatus:
+    """
+    @brief A snapshot of the RAM area of one servo, read with a single instruction.
+
+    The attributes hold the raw register values; the properties convert them
+    to degrees, rpm, percent, volts and degrees Celsius. Speed and load are
+    positive counter-clockwise and negative clockwise, like the loads of
+    ServoGroup.set_wheel_speeds.
+    """
+
+    __slots__ = (
+        "servo_id", "timestamp", "torque_enable", "led", "d_gain", "i_gain", "p_gain", "goal_position",
+        "moving_speed", "torque_limit", "present_position", "present_speed", "present_load",
+        "present_voltage", "present_temperature", "registered", "moving", "hardware_error_status", "punch",
+    )
+
+    def __init__(self, servo_id, data, timestamp=None):
+        """
+        @param data The STATUS_LENGTH bytes read from STATUS_START.
+        @param timestamp The time.monotonic() of the read, defaults to now.
+        """
+        self.servo_id = servo_id
+        self.timestamp = time.monotonic() if timestamp is None else timestamp
+        self.torque_enable = data[0]
+        self.led = data[config.ADDR_LED - STATUS_START]
+        self.d_gain = data[27 - STATUS_START]
+        self.i_gain = data[28 - STATUS_START]
+        self.p_gain = data[29 - STATUS_START]
+        self.goal_position = _word(data, config.ADDR_GOAL_POSITION)
+        self.moving_speed = _word(data, config.ADDR_GOAL_SPEED)
+        self.torque_limit = _word(data, 35)
+        self.present_position = _word(data, config.ADDR_PRESENT_POSITION)
+        self.present_speed = _word(data, config.ADDR_PRESENT_SPEED)
+        self.present_load = _word(data, config.ADDR_PRESENT_LOAD)
+        self.present_voltage = data[45 - STATUS_START]
+        self.present_temperature = data[config.ADDR_PRESENT_TEMPERATURE - STATUS_START]
+        self.registered = data[47 - STATUS_START]
+        self.moving = data[config.ADDR_MOVING - STATUS_START]
+        self.hardware_error_status = data[config.ADDR_HARDWARE_ERROR_STATUS - STATUS_START]
+        self.punch = _word(data, 51)
+
+    @property
+    def position_degrees(self):
+        return self.present_position * config.DXL_POSITION_UNIT_DEGREE
+
+    @property
+    def goal_degrees(self):
+        return self.goal_position * config.DXL_POSITION_UNIT_DEGREE
+
+    @property
+    def speed_rpm(self):
+        return _signed(self.present_speed) * config.DXL_SPEED_UNIT_RPM
+
+    @property
+    def load_percent(self):
+        return _signed(self.present_load) * LOAD_UNIT_PERCENT
+
+    @property
+    def voltage(self):
+        """@return The supply voltage in volts."""
+        return self.present_voltage * VOLTAGE_UNIT_VOLT
+
+    @property
+    def temperature(self):
+        """@return The internal temperature in degrees Celsius."""
+        return self.present_temperature
+
+    @property
+    def torque_enabled(self):
+        return bool(self.torque_enable)
+
+    @property
+    def is_moving(self):
+        return bool(self.moving)
+
+    def as_dict(self):
+        """@return The raw registers and the converted values in a dict."""
+        values = {name: getattr(self, name) for name in self.__slots__}
+        for name in ("position_degrees", "goal_degrees", "speed_rpm", "load_percent", "voltage"):
+            values[name] = getattr(self, name)
+        return values
+
+    def __repr__(self):
+        return ("ServoStatus(servo_id=%d, position=%.1f deg, speed=%.1f rpm, load=%.1f%%, voltage=%.1f V, "
+                "temperature=%d C, moving=%d, hardware_error_status=%d)" % (
+                    self.servo_id, self.position_degrees, self.speed_rpm, self.load_percent, self.voltage,
+                    self.temperature, self.moving, self.hardware_error_status))
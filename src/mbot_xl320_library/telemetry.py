@@ -0,0 +1,196 @@
+import threading
+import time
+from . import config
+from .scheduler import FixedRateLoop
+from .servo_group import ServoGroup
+from dynamixel_sdk import COMM_SUCCESS, DXL_MAKEWORD  # Uses Dynamixel SDK library
+
+# The telemetry block spans ADDR_PRESENT_POSITION .. ADDR_HARDWARE_ERROR_STATUS
+TELEMETRY_START = config.ADDR_PRESENT_POSITION
+TELEMETRY_LENGTH = config.ADDR_HARDWARE_ERROR_STATUS - TELEMETRY_START + 1
+
+
+class TelemetrySample:
+    """@brief One timestamped telemetry reading of a servo. Samples are never modified once published."""
+
+    __slots__ = ("timestamp", "position", "speed", "load", "temperature", "hardware_error_status")
+
+    def __init__(self, timestamp, position, speed, load, temperature, hardware_error_status):
+        self.timestamp = timestamp
+        self.position = position
+        self.speed = speed
+        self.load = load
+        self.temperature = temperature
+        self.hardware_error_status = hardware_error_status
+
+    def __repr__(self):
+        return ("TelemetrySample(timestamp=%.6f, position=%d, speed=%d, load=%d, temperature=%d, "
+                "hardware_error_status=%d)" % (self.timestamp, self.position, self.speed, self.load,
+                                               self.temperature, self.hardware_error_status))
+
+
+class TelemetryRing:
+    """
+    @brief Fixed-size ring buffer of TelemetrySample for one servo.
+
+    There is a single writer (the poller thread). It stores the sample in its
+    slot before publishing it through latest, and readers only ever read
+    references to immutable samples, so no lock is needed on either side.
+    """
+
+    __slots__ = ("size", "latest", "_samples", "_count")
+
+    def __init__(self, size):
+        self.size = size
+        self.latest = None
+        self._samples = [None] * size
+        self._count = 0
+
+    def append(self, sample):
+        self._samples[self._count % self.size] = sample
+        self._count += 1
+        self.latest = sample
+
+    def history(self):
+        """@return The buffered samples, oldest first."""
+        count = self._count
+        if count <= self.size:
+            return self._samples[:count]
+        start = count % self.size
+        return self._samples[start:] + self._samples[:start]
+
+
+class TelemetryPoller:
+    """
+    @brief Owns the bus and polls the telemetry of a set of servos at a fixed rate on a background thread.
+
+    Each cycle reads present position, speed, load, temperature and hardware
+    error status of every servo, with a single Sync Read when the protocol
+    supports it and one read per servo otherwise, and publishes the samples
+    into a TelemetryRing per servo.
+
+    A cycle that raises is counted and logged and polling goes on. An OSError
+    means the port itself is gone: polling then ends and the exception is kept
+    in error.
+    """
+
+    def __init__(self, servo_ids, portHandler, packetHandler, rate=50.0, history_size=64, logger=None):
+        """@param logger An optional logging.Logger the failed cycles are logged to, see Servo."""
+        self.servo_ids = list(servo_ids)
+        self.portHandler = portHandler
+        self.packetHandler = packetHandler
+        self.group = ServoGroup(self.servo_ids, portHandler, packetHandler)
+        self.rings = {servo_id: TelemetryRing(history_size) for servo_id in self.servo_ids}
+        self.logger = logger
+        self.error = None           # the exception that ended polling, if any
+
+        self._thread = None
+        self._stop_event = threading.Event()
+        self.loop = FixedRateLoop(rate, self._stop_event)
+        self.period = self.loop.period
+        self.reset_stats()
+
+    def reset_stats(self):
+        self.loop.reset_stats()
+        self.failed_reads = 0
+        self.failed_cycles = 0
+        self._started_at = time.monotonic()
+        self._stopped_at = None
+
+    @property
+    def running(self):
+        """@return True while the poller thread owns the port."""
+        return self._thread is not None and self.error is None
+
+    def attach(self, servo):
+        """
+        @brief Lets servo.get_position(cached=True) answer from this poller.
+
+        @param servo A Servo whose ID is polled by this poller.
+        """
+        servo.telemetry = self
+
+    def get_latest(self, servo_id):
+        """@return The newest TelemetrySample of the servo, or None if it has not been read yet."""
+        return self.rings[servo_id].latest
+
+    def get_history(self, servo_id):
+        """@return The buffered TelemetrySample of the servo, oldest first."""
+        return self.rings[servo_id].history()
+
+    def get_stats(self):
+        """
+        @brief Reports how well the poller keeps its rate.
+
+        @return A dict with the target and achieved poll rate in Hz, the mean
+                and max jitter of the cycle start in milliseconds, the number
+                of cycles dropped because a cycle overran its period, the
+                number of servo reads that failed and of cycles that raised.
+        """
+        end = self._stopped_at if self._stopped_at is not None else time.monotonic()
+        elapsed = end - self._started_at
+        loop = self.loop.get_stats()
+        return {
+            "target_rate": 1.0 / self.period,
+            "poll_rate": loop["cycles"] / elapsed if elapsed > 0 else 0.0,
+            "jitter_mean_ms": loop["jitter_mean_ms"],
+            "jitter_max_ms": loop["jitter_max_ms"],
+            "dropped_cycles": loop["skipped_cycles"],
+            "failed_reads": self.failed_reads,
+            "failed_cycles": self.failed_cycles,
+        }
+
+    def poll_once(self):
+        """@brief Reads every servo once and publishes the samples."""
+        results = self.group.read_block(TELEMETRY_START, TELEMETRY_LENGTH)
+        timestamp = time.monotonic()
+        for servo_id, (data, dxl_comm_result, dxl_error) in results.items():
+            if dxl_comm_result != COMM_SUCCESS:
+                self.failed_reads += 1
+                continue
+            self.rings[servo_id].append(TelemetrySample(
+                timestamp,
+                DXL_MAKEWORD(data[0], data[1]),
+                DXL_MAKEWORD(data[config.ADDR_PRESENT_SPEED - TELEMETRY_START],
+                             data[config.ADDR_PRESENT_SPEED - TELEMETRY_START + 1]),
+                DXL_MAKEWORD(data[config.ADDR_PRESENT_LOAD - TELEMETRY_START],
+                             data[config.ADDR_PRESENT_LOAD - TELEMETRY_START + 1]),
+                data[config.ADDR_PRESENT_TEMPERATURE - TELEMETRY_START],
+                data[config.ADDR_HARDWARE_ERROR_STATUS - TELEMETRY_START],
+            ))
+
+    def _cycle(self, dt):
+        try:
+            self.poll_once()
+        except OSError as error:
+            self.failed_cycles += 1
+            self.error = error
+            if self.logger is not None:
+                self.logger.exception("Telemetry polling stopped, the port failed")
+            self._stop_event.set()
+        except Exception:
+            self.failed_cycles += 1
+            if self.logger is not None:
+                self.logger.exception("Telemetry poll failed")
+
+    def _run(self):
+        self.loop.run(self._cycle)
+
+    def start(self):
+        """@brief Starts polling on a background thread."""
+        if self._thread is not None:
+            return
+        self._stop_event.clear()
+        self.error = None
+        self.reset_stats()
+        self._thread = threading.Thread(target=self._run, name="xl320-telemetry", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """@brief Stops polling and waits for the background thread to exit."""
+        if self._thread is None:
+            return
+        self._stop_event.set()
+        self._thread.join()
+        self._thread = None
+        self._stopped_at = time.monotonic()
@@ -0,0 +1,338 @@
+import mmap
+import struct
+import threading
+import time
+from .packet_codec import HEADER, encode
+from dynamixel_sdk import (  # Uses Dynamixel SDK library
+    COMM_SUCCESS,
+    PKT_ID,
+    PKT_INSTRUCTION,
+    PKT_LENGTH_H,
+    PKT_LENGTH_L,
+    PortHandler,
+)
+
+# Log layout: FILE_HEADER, then one RECORD header per packet followed by the packet bytes
+MAGIC = b"XL320LOG"
+VERSION = 1
+FILE_HEADER = struct.Struct("<8sHH")        # magic, version, size of a record header
+RECORD = struct.Struct("<dhBBBxH")          # timestamp, result, direction, servo ID, instruction, length
+
+DIRECTION_TX = 0
+DIRECTION_RX = 1
+DIRECTION_BAUDRATE = 2      # the port changed baudrate, the packet is the new baudrate as 4 bytes
+DIRECTION_NAMES = ("tx", "rx", "baudrate")
+NO_ID = 0xFF                # servo ID and instruction of a record without a packet to take them from
+
+DEFAULT_BUFFER_SIZE = 1 << 20
+
+
+class TrafficRecorder:
+    """
+    @brief Appends every packet a packet handler sends and receives to a binary log.
+
+    attach() wraps txPacket and rxPacket of a packet handler instance, the SDK's
+    or a GPIOPacketHandler, so every transaction of the library goes through
+    the recorder. A record is the time.monotonic() timestamp, the result code,
+    the direction, the servo ID, the instruction and the raw packet. Sent
+    packets are stamped when they start to go out and status packets when
+    they are complete, so the difference is the round trip. A status packet is
+    recorded with the instruction it answers. Records are packed into a
+    preallocated buffer, which is written to the file only when it is full,
+    on flush() and on close(), so recording costs a few microseconds per
+    packet and no system call.
+    """
+
+    def __init__(self, path, buffer_size=DEFAULT_BUFFER_SIZE):
+        self.path = path
+        self._file = open(path, "wb")
+        self._file.write(FILE_HEADER.pack(MAGIC, VERSION, RECORD.size))
+        self._buffer = bytearray(buffer_size)
+        self._view = memoryview(self._buffer)
+        self._used = 0
+        self._lock = threading.Lock()
+        self._attached = []
+        self._baudrates = {}        # port -> last baudrate recorded
+        self._last_tx = {}          # port -> (servo ID, instruction) of the last packet sent
+        self.records = 0
+        self.bytes_written = 0
+
+    def attach(self, packetHandler):
+        """
+        @brief Records the traffic of packetHandler from now on. Attaching it again does nothing.
+
+        @return packetHandler, so the call can wrap initialize_handlers().
+        """
+        if packetHandler in self._attached:
+            return packetHandler
+        tx_packet = packetHandler.txPacket
+        rx_packet = packetHandler.rxPacket
+
+        def txPacket(port, txpacket):
+            timestamp = time.monotonic()
+            result = tx_packet(port, txpacket)
+            self._record_tx(port, txpacket, result, timestamp)
+            return result
+
+        def rxPacket(port):
+            rxpacket, result = rx_packet(port)
+            self._record_rx(port, rxpacket, result, time.monotonic())
+            return rxpacket, result
+
+        packetHandler.txPacket = txPacket
+        packetHandler.rxPacket = rxPacket
+        self._attached.append(packetHandler)
+        return packetHandler
+
+    def detach(self, packetHandler=None):
+        """@brief Stops recording packetHandler, or every attached packet handler by default."""
+        for handler in list(self._attached) if packetHandler is None else [packetHandler]:
+            if handler not in self._attached:
+                continue
+            del handler.txPacket
+            del handler.rxPacket
+            self._attached.remove(handler)
+
+    def _record_tx(self, port, txpacket, result, timestamp):
+        if isinstance(txpacket, bytes):
+            packet = txpacket
+        else:
+            length = txpacket[PKT_LENGTH_L] | txpacket[PKT_LENGTH_H] << 8
+            if bytes(txpacket[:4]) == HEADER:
+                # the SDK framed the list in place
+                packet = bytes(txpacket[:length + 7])
+            else:
+                packet = encode(txpacket[PKT_ID], txpacket[PKT_INSTRUCTION:PKT_INSTRUCTION + length - 2])
+
+        baudrate = port.getBaudRate()
+        if self._baudrates.get(port) != baudrate:
+            self._baudrates[port] = baudrate
+            self._append(timestamp, COMM_SUCCESS, DIRECTION_BAUDRATE, NO_ID, NO_ID, baudrate.to_bytes(4, "little"))
+        self._last_tx[port] = (packet[PKT_ID], packet[PKT_INSTRUCTION])
+        self._append(timestamp, result, DIRECTION_TX, packet[PKT_ID], packet[PKT_INSTRUCTION], packet)
+
+    def _record_rx(self, port, rxpacket, result, timestamp):
+        packet = rxpacket if isinstance(rxpacket, bytes) else bytes(rxpacket or ())
+        servo_id, instruction = self._last_tx.get(port, (NO_ID, NO_ID))
+        if len(packet) > PKT_ID and packet[:4] == HEADER:
+            servo_id = packet[PKT_ID]
+        self._append(timestamp, result, DIRECTION_RX, servo_id, instruction, packet)
+
+    def _append(self, timestamp, result, direction, servo_id, instruction, packet):
+        size = RECORD.size + len(packet)
+        with self._lock:
+            if self._used + size > len(self._buffer):
+                self._write_buffer()
+            if size > len(self._buffer):
+                self._file.write(RECORD.pack(timestamp, result, direction, servo_id, instruction, len(packet)))
+                self._file.write(packet)
+            else:
+                RECORD.pack_into(self._buffer, self._used, timestamp, result, direction, servo_id, instruction,
+                                 len(packet))
+                self._buffer[self._used + RECORD.size:self._used + size] = packet
+                self._used += size
+            self.records += 1
+            self.bytes_written += size
+
+    def _write_buffer(self):
+        self._file.write(self._view[:self._used])
+        self._used = 0
+
+    def flush(self):
+        """@brief Writes the buffered records to the file."""
+        with self._lock:
+            self._write_buffer()
+            self._file.flush()
+
+    def close(self):
+        """@brief Detaches from every packet handler, writes the buffered records and closes the file."""
+        self.detach()
+        self.flush()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class TrafficRecord:
+    """@brief One packet of a traffic log."""
+
+    __slots__ = ("timestamp", "result", "direction", "servo_id", "instruction", "packet")
+
+    def __init__(self, timestamp, result, direction, servo_id, instruction, packet):
+        self.timestamp = timestamp
+        self.result = result
+        self.direction = direction
+        self.servo_id = servo_id
+        self.instruction = instruction
+        self.packet = packet
+
+    def __repr__(self):
+        return "TrafficRecord(timestamp=%.6f, %s, result=%d, servo_id=%d, instruction=0x%02X, packet=%s)" % (
+            self.timestamp, DIRECTION_NAMES[self.direction], self.result, self.servo_id, self.instruction,
+            self.packet.hex(" "))
+
+
+class TrafficLog:
+    """
+    @brief Reads a log written by TrafficRecorder.
+
+    The file is memory-mapped and the filters compare the fixed record
+    headers in place, so only the packets of matching records are copied.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as log_file:
+            self._map = mmap.mmap(log_file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, record_size = FILE_HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC or version != VERSION or record_size != RECORD.size:
+            self._map.close()
+            raise ValueError("%s is not a traffic log of version %d" % (path, VERSION))
+
+    def close(self):
+        self._map.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def __iter__(self):
+        return self.records()
+
+    def records(self, servo_id=None, instruction=None, direction=None):
+        """
+        @brief Yields the records that match every filter given, in the order they were recorded.
+
+        @param servo_id Only packets to or from this servo ID.
+        @param instruction Only packets of this instruction, or status packets answering it.
+        @param direction Only DIRECTION_TX, DIRECTION_RX or DIRECTION_BAUDRATE records.
+
+        A log cut short by a crash ends at its last complete record.
+        """
+        data = self._map
+        end = len(data)
+        offset = FILE_HEADER.size
+        unpack = RECORD.unpack_from
+        while offset + RECORD.size <= end:
+            timestamp, result, record_direction, record_id, record_instruction, length = unpack(data, offset)
+            start = offset + RECORD.size
+            offset = start + length
+            if offset > end:
+                return
+            if ((servo_id is None or record_id == servo_id)
+                    and (instruction is None or record_instruction == instruction)
+                    and (direction is None or record_direction == direction)):
+                yield TrafficRecord(timestamp, result, record_direction, record_id, record_instruction,
+                                    data[start:offset])
+
+    def round_trips(self, servo_id=None, instruction=None):
+        """
+        @brief Pairs every sent packet with the status packets that followed it.
+
+        @return A list of (tx record, [rx records]) tuples.
+        """
+        transactions = []
+        for record in self.records(servo_id, instruction):
+            if record.direction == DIRECTION_TX:
+                transactions.append((record, []))
+            elif record.direction == DIRECTION_RX and transactions:
+                transactions[-1][1].append(record)
+        return transactions
+
+    def latencies(self, servo_id=None, instruction=None):
+        """@return The seconds from each sent packet to its first successful status packet."""
+        return [
+            next(rx.timestamp for rx in replies if rx.result == COMM_SUCCESS) - tx.timestamp
+            for tx, replies in self.round_trips(servo_id, instruction)
+            if any(rx.result == COMM_SUCCESS for rx in replies)
+        ]
+
+
+class ReplayPort(PortHandler):
+    """
+    @brief A port that answers with the status packets of a recorded session.
+
+    Every packet written to the port is matched with the next sent packet of
+    the log, and the status packets recorded after it become readable as long
+    after the write as they were received in the recording, scaled by
+    time_scale. Packets that timed out in the recording time out again. The
+    packet handler code runs as it did on the bus, so a latency regression of
+    the host side can be reproduced without servos. Packets written that
+    differ from the recording are counted in mismatches and answered anyway.
+    """
+
+    def __init__(self, log, time_scale=1.0, port_name="replay"):
+        """
+        @param log A TrafficLog or the path of a log.
+        @param time_scale Multiplies the recorded delays, 0 makes every answer readable at once.
+        """
+        super(ReplayPort, self).__init__(port_name)
+        if not isinstance(log, TrafficLog):
+            log = TrafficLog(log)
+        self.time_scale = time_scale
+        self.transactions = []
+        for record in log.records():
+            if record.direction == DIRECTION_BAUDRATE and not self.transactions:
+                self.baudrate = int.from_bytes(record.packet, "little")
+            elif record.direction == DIRECTION_TX:
+                self.transactions.append((record, []))
+            elif record.direction == DIRECTION_RX and self.transactions:
+                self.transactions[-1][1].append(record)
+        self.position = 0
+        self.mismatches = 0
+        self._pending = []          # [readable at, bytes] of the answers not read yet
+
+    def setupPort(self, cflag_baud):
+        self.is_open = True
+        self.tx_time_per_byte = (1000.0 / self.baudrate) * 10.0
+        return True
+
+    def closePort(self):
+        self.is_open = False
+
+    def clearPort(self):
+        now = time.monotonic()
+        self._pending = [answer for answer in self._pending if answer[0] > now]
+
+    def writePort(self, packet):
+        written = time.monotonic()
+        if self.position >= len(self.transactions):
+            return len(packet)
+        tx, replies = self.transactions[self.position]
+        self.position += 1
+        if bytes(packet) != tx.packet:
+            self.mismatches += 1
+        for rx in replies:
+            if rx.result == COMM_SUCCESS:
+                self._pending.append([written + (rx.timestamp - tx.timestamp) * self.time_scale, rx.packet])
+            elif rx.packet:
+                # the bytes of a broken status packet came in before the timeout that ended it
+                self._pending.append([written, rx.packet])
+        return len(packet)
+
+    def getBytesAvailable(self):
+        now = time.monotonic()
+        return sum(len(data) for readable_at, data in self._pending if readable_at <= now)
+
+    def readPort(self, length):
+        now = time.monotonic()
+        data = b""
+        while self._pending and self._pending[0][0] <= now and len(data) < length:
+            answer = self._pending[0]
+            take = answer[1][:length - len(data)]
+            data += take
+            answer[1] = answer[1][len(take):]
+            if not answer[1]:
+                self._pending.pop(0)
+        return data
+
+    @property
+    def finished(self):
+        """@return True once every recorded transaction was replayed."""
+        return self.position >= len(self.transactions)
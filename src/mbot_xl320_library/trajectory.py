@@ -0,0 +1,249 @@
+import threading
+import time
+import numpy as np
+from . import config
+from .servo_group import ServoGroup
+from dynamixel_sdk import COMM_SUCCESS  # Uses Dynamixel SDK library
+
+PROFILE_LINEAR = "linear"
+PROFILE_MIN_JERK = "min_jerk"
+PROFILE_TRAPEZOIDAL = "trapezoidal"
+
+
+def _linear(tau, accel_fraction):
+    return tau
+
+
+def _min_jerk(tau, accel_fraction):
+    return tau ** 3 * (10.0 - 15.0 * tau + 6.0 * tau ** 2)
+
+
+def _trapezoidal(tau, accel_fraction):
+    # Constant acceleration for accel_fraction of the segment, cruise, then the
+    # mirrored deceleration. The cruise velocity makes the area under the trapezoid 1.
+    ta = accel_fraction
+    peak = 1.0 / (1.0 - ta)
+    return np.where(
+        tau < ta,
+        0.5 * peak / ta * tau ** 2,
+        np.where(tau <= 1.0 - ta, peak * (tau - 0.5 * ta), 1.0 - 0.5 * peak / ta * (1.0 - tau) ** 2),
+    )
+
+
+PROFILES = {
+    PROFILE_LINEAR: _linear,
+    PROFILE_MIN_JERK: _min_jerk,
+    PROFILE_TRAPEZOIDAL: _trapezoidal,
+}
+
+
+class Trajectory:
+    """
+    @brief A precomputed stream of goal positions for several servos, one row per tick.
+
+    @param servo_ids The servo IDs, one per column of positions.
+    @param positions An integer array of shape (ticks, len(servo_ids)).
+    @param rate The tick rate in Hz the stream was sampled at.
+    """
+
+    def __init__(self, servo_ids, positions, rate):
+        self.servo_ids = list(servo_ids)
+        self.positions = positions
+        self.rate = rate
+
+    def __len__(self):
+        return len(self.positions)
+
+    @property
+    def duration(self):
+        return (len(self.positions) - 1) / self.rate
+
+    @classmethod
+    def from_waypoints(cls, servo_ids, waypoints, durations, rate=100.0, profile=PROFILE_MIN_JERK,
+                       accel_fraction=0.25):
+        """
+        @brief Interpolates waypoints into a setpoint stream.
+
+        @param servo_ids The servo IDs, in the order of the waypoint columns.
+        @param waypoints A sequence of at least two waypoints, each with one goal position per servo.
+        @param durations The duration in seconds of each segment between consecutive waypoints.
+        @param rate The tick rate in Hz.
+        @param profile PROFILE_LINEAR, PROFILE_MIN_JERK or PROFILE_TRAPEZOIDAL. Every segment
+                       starts and ends at rest except with the linear profile.
+        @param accel_fraction The share of each segment spent accelerating (and decelerating)
+                              with the trapezoidal profile, in range (0, 0.5].
+        @throw ValueError on inconsistent waypoints, durations or profile.
+
+        @return A Trajectory clamped to [DXL_MINIMUM_POSITION_VALUE, DXL_MAXIMUM_POSITION_VALUE].
+        """
+        points = np.asarray(waypoints, dtype=np.float64)
+        durations = np.asarray(durations, dtype=np.float64)
+        if points.ndim != 2 or points.shape[1] != len(servo_ids) or len(points) < 2:
+            raise ValueError("waypoints must have at least two rows of %d positions" % len(servo_ids))
+        if durations.shape != (len(points) - 1,) or np.any(durations <= 0):
+            raise ValueError("durations must hold one positive duration per segment")
+        if profile not in PROFILES:
+            raise ValueError("profile must be one of %s" % ", ".join(PROFILES))
+        if not 0.0 < accel_fraction <= 0.5:
+            raise ValueError("accel_fraction must be in range (0, 0.5]")
+
+        boundaries = np.concatenate(([0.0], np.cumsum(durations)))
+        ticks = int(round(boundaries[-1] * rate)) + 1
+        times = np.arange(ticks) / rate
+
+        segment = np.clip(np.searchsorted(boundaries, times, side="right") - 1, 0, len(durations) - 1)
+        tau = np.clip((times - boundaries[segment]) / durations[segment], 0.0, 1.0)
+        shape = PROFILES[profile](tau, accel_fraction)
+
+        start = points[segment]
+        positions = start + (points[segment + 1] - start) * shape[:, None]
+        positions[-1] = points[-1]
+        np.clip(positions, config.DXL_MINIMUM_POSITION_VALUE, config.DXL_MAXIMUM_POSITION_VALUE,
+                out=positions)
+        return cls(servo_ids, np.rint(positions).astype(np.int64), rate)
+
+
+class TrajectoryStreamer:
+    """
+    @brief Streams a Trajectory to the servos at its tick rate, with one Sync Write per tick.
+
+    Ticks are scheduled against the ideal timeline so the stream does not drift.
+    When a write overruns into later ticks, those ticks' setpoints are stale and
+    are skipped, so the servos jump to the setpoint that is due now.
+    """
+
+    def __init__(self, portHandler, packetHandler, group=None):
+        self.portHandler = portHandler
+        self.packetHandler = packetHandler
+        self.group = group
+        self._thread = None
+        self._stop_event = threading.Event()
+        self._playing = False
+        self.reset_stats()
+
+    def reset_stats(self):
+        self.ticks = 0
+        self.deadline_misses = 0
+        self.skipped_ticks = 0
+        self.failed_writes = 0
+        self.jitter = np.zeros(0)
+        self.write_time_total = 0.0
+        self.write_time_max = 0.0
+        self.period = 0.0
+
+    def get_stats(self):
+        """
+        @brief Reports how well the stream kept its rate.
+
+        @return A dict with the number of ticks sent, deadline misses (writes that
+                ended after the next tick was due), skipped ticks, failed writes,
+                the mean, p99 and max tick jitter in milliseconds, and the mean
+                and max write time in milliseconds. A write time close to the
+                period means the bus is saturated at this rate.
+        """
+        jitter = self.jitter * 1000.0
+        return {
+            "ticks": self.ticks,
+            "deadline_misses": self.deadline_misses,
+            "skipped_ticks": self.skipped_ticks,
+            "failed_writes": self.failed_writes,
+            "jitter_mean_ms": float(jitter.mean()) if len(jitter) else 0.0,
+            "jitter_p99_ms": float(np.percentile(jitter, 99)) if len(jitter) else 0.0,
+            "jitter_max_ms": float(jitter.max()) if len(jitter) else 0.0,
+            "write_time_mean_ms": self.write_time_total / self.ticks * 1000.0 if self.ticks else 0.0,
+            "write_time_max_ms": self.write_time_max * 1000.0,
+            "period_ms": self.period * 1000.0,
+        }
+
+    def _group_for(self, trajectory):
+        if self.group is None or self.group.servo_ids != trajectory.servo_ids:
+            self.group = ServoGroup(trajectory.servo_ids, self.portHandler, self.packetHandler)
+        return self.group
+
+    def play(self, trajectory):
+        """
+        @brief Streams trajectory and blocks until it is done or stop() is called.
+
+        @return The stats, see get_stats().
+        """
+        group = self._group_for(trajectory)
+        servo_ids = trajectory.servo_ids
+        # Plain Python ints per tick, so the loop does no NumPy scalar conversions
+        setpoints = trajectory.positions.tolist()
+        period = 1.0 / trajectory.rate
+        count = len(setpoints)
+
+        self.reset_stats()
+        self.period = period
+        jitter = np.zeros(count)
+        write = group.sync_write
+        stop_event = self._stop_event
+
+        self._playing = True
+        try:
+            start = time.monotonic()
+            tick = 0
+            while tick < count and not stop_event.is_set():
+                deadline = start + tick * period
+                now = time.monotonic()
+                if now < deadline:
+                    time.sleep(deadline - now)
+                    now = time.monotonic()
+                jitter[self.ticks] = now - deadline
+
+                dxl_comm_result = write(config.ADDR_GOAL_POSITION, 2, dict(zip(servo_ids, setpoints[tick])))
+                if dxl_comm_result != COMM_SUCCESS:
+                    self.failed_writes += 1
+                self.ticks += 1
+
+                finished = time.monotonic()
+                elapsed = finished - now
+                self.write_time_total += elapsed
+                if elapsed > self.write_time_max:
+                    self.write_time_max = elapsed
+
+                tick += 1
+                if finished > start + tick * period:
+                    self.deadline_misses += 1
+                    due = min(int((finished - start) / period), count - 1)
+                    if due > tick:
+                        self.skipped_ticks += due - tick
+                        tick = due
+        finally:
+            # A stop() ends this play() only, the next one streams again
+            self._playing = False
+            stop_event.clear()
+
+        self.jitter = jitter[:self.ticks]
+        return self.get_stats()
+
+    def start(self, trajectory):
+        """@brief Streams trajectory on a background thread."""
+        if self._thread is not None:
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(
+            target=self.play, args=(trajectory,), name="xl320-trajectory", daemon=True)
+        self._thread.start()
+
+    def wait(self, timeout=None):
+        """
+        @brief Waits for a trajectory started with start() to finish.
+
+        @return True if it finished, False on timeout.
+        """
+        if self._thread is None:
+            return True
+        self._thread.join(timeout)
+        if self._thread.is_alive():
+            return False
+        self._thread = None
+        return True
+
+    def stop(self):
+        """@brief Stops streaming; the servos hold the last setpoint sent."""
+        self._stop_event.set()
+        self.wait()
+        if not self._playing:
+            # Nothing was streaming, or it is done: do not stop the next play()
+            self._stop_event.clear()
@@ -3,11 +3,9 @@
 
 import os
 import sys
-import time
-from . import config 
-from dynamixel_sdk import *  # Uses Dynamixel SDK library
-import Jetson.GPIO as GPIO
-from . import gpio_protocol2_packet_handler
+from . import config
+from .errors import CommError
+from dynamixel_sdk import COMM_NOT_AVAILABLE, PacketHandler, PortHandler  # Uses Dynamixel SDK library
 
 
 def getch():
@@ -32,47 +30,76 @@ def getch():
             termios.tcsetattr(fd, termios.TCSADRAIN, old_settings)
         return ch
 
-def initialize_handlers(port_name):
+def initialize_handlers(port_name, fast=False):
     """
     Initializes the port handler and packet handler for Dynamixel motors.
 
     @param port_name: The port name where the Dynamixel motor is connected.
+    @param fast: If True, use a FastPacketHandler, which sends the same bytes as the
+                 SDK's Protocol 2.0 handler with less CPU time per packet.
     @return: A tuple containing the initialized port handler and packet handler.
     """
 
     portHandler = PortHandler(port_name)
-    packetHandler = PacketHandler(config.PROTOCOL_VERSION)
+    if fast:
+        from .packet_codec import FastPacketHandler
+
+        packetHandler = FastPacketHandler()
+    else:
+        packetHandler = PacketHandler(config.PROTOCOL_VERSION)
     return portHandler, packetHandler
 
-def initialize_gpio_handlers(port_name):
+def initialize_gpio_handlers(port_name, turnaround=config.TURNAROUND_SLEEP, direction="jetson"):
     """
     Initializes the port handler and customized packet handler for Dynamixel motors.
 
     @param port_name: The port name where the Dynamixel motor is connected.
+    @param turnaround: TURNAROUND_SLEEP to keep the fixed sleeps around the direction switch,
+                       or TURNAROUND_DRAIN to wait for the UART to drain and block on the fd.
+    @param direction: The half-duplex direction control backend, either a DirectionControl
+                      instance or one of "jetson" (Jetson.GPIO on JETSON_CTL_PIN), "gpiod"
+                      (libgpiod on JETSON_CTL_LINE), "rs485" (kernel TIOCSRS485), "none"
+                      (auto-direction adapter) or "mock". Use a GpiodDirection instance for
+                      another chip or line.
     @return: A tuple containing the initialized port handler and packet handler.
     """
 
+    from . import gpio_protocol2_packet_handler
+
     portHandler = PortHandler(port_name)
-    packetHandler = gpio_protocol2_packet_handler.GPIOPacketHandler()
+    packetHandler = gpio_protocol2_packet_handler.GPIOPacketHandler(turnaround, direction)
     return portHandler, packetHandler
 
 def initialize_GPIO():
+    import Jetson.GPIO as GPIO
+
     GPIO.setmode(GPIO.BOARD)  # BOARD pin-numbering scheme, meaning using physical number
     GPIO.setup(config.JETSON_CTL_PIN, GPIO.OUT)  # CTL pin set as output
     GPIO.output(config.JETSON_CTL_PIN, GPIO.LOW)  # Initialize as LOW (receiving mode)
     print("Initializing...GPIO pin set to LOW")
 
 def close_GPIO():
+    import Jetson.GPIO as GPIO
+
     GPIO.cleanup()
 
 
-def open_port(portHandler):
+def open_port(portHandler, quiet=False):
     """
     Opens the port for Dynamixel motor communication.
 
     @param portHandler: The port handler instance to open.
+    @param quiet: If True, print nothing and raise CommError on failure instead of exiting.
+                   Its comm_result is COMM_NOT_AVAILABLE, the message is pyserial's when it raised.
     """
-    if portHandler.openPort():
+    if quiet:
+        try:
+            opened = portHandler.openPort()
+        except OSError as exception:  # pyserial's SerialException is an OSError
+            raise CommError(None, COMM_NOT_AVAILABLE, 0, str(exception)) from exception
+        if not opened:
+            raise CommError(None, COMM_NOT_AVAILABLE, 0, "Failed to open the port %s" % portHandler.getPortName())
+    elif portHandler.openPort():
         print("Succeeded to open the port")
     else:
         print("Failed to open the port")
@@ -88,14 +115,23 @@ def close_port(portHandler):
     portHandler.closePort()
 
 
-def set_baudrate(portHandler, baudrate):
+def set_baudrate(portHandler, baudrate, quiet=False):
     """
     Sets the baud rate for the port handler used in Dynamixel motor communication.
 
     @param portHandler: The port handler instance on which to set the baud rate.
     @param baudrate: The desired baud rate.
+    @param quiet: If True, print nothing and raise CommError on failure instead of exiting.
+                   Its comm_result is COMM_NOT_AVAILABLE, the message is pyserial's when it raised.
     """
-    if portHandler.setBaudRate(baudrate):
+    if quiet:
+        try:
+            changed = portHandler.setBaudRate(baudrate)
+        except OSError as exception:
+            raise CommError(None, COMM_NOT_AVAILABLE, 0, str(exception)) from exception
+        if not changed:
+            raise CommError(None, COMM_NOT_AVAILABLE, 0, "Failed to change the baudrate to %d" % baudrate)
+    elif portHandler.setBaudRate(baudrate):
         print("Succeeded to change the baudrate to %d" % baudrate)
     else:
         print("Failed to change the baudrate")
@@ -0,0 +1,553 @@
+import argparse
+import math
+import os
+import select
+import termios
+import threading
+import time
+import tty
+from . import config
+from .control_table import EEPROM, XL320_CONTROL_TABLE
+from dynamixel_sdk import (  # Uses Dynamixel SDK library
+    BROADCAST_ID,
+    INST_ACTION,
+    INST_BULK_READ,
+    INST_PING,
+    INST_READ,
+    INST_REBOOT,
+    INST_REG_WRITE,
+    INST_SYNC_READ,
+    INST_SYNC_WRITE,
+    INST_WRITE,
+    ERRBIT_ALERT,
+    ERRNUM_ACCESS,
+    ERRNUM_CRC,
+    ERRNUM_DATA_LENGTH,
+    ERRNUM_INSTRUCTION,
+    Protocol2PacketHandler,
+)
+
+XL320_MODEL_NUMBER = 350
+XL320_FIRMWARE_VERSION = 29
+
+ADDR_RETURN_DELAY_TIME = 5
+ADDR_STATUS_RETURN_LEVEL = 17
+ADDR_PRESENT_VOLTAGE = 45
+ADDR_REGISTERED = 47
+
+CONTROL_TABLE_SIZE = 53
+ADDR_BAUD_RATE = 4
+BAUD_RATES = {0: 9600, 1: 57600, 2: 115200, 3: 1000000}  # values of the Baud Rate register
+
+# termios speed constants, to find the baudrate the host configured on the pty
+_TERMIOS_SPEEDS = {getattr(termios, name): int(name[1:]) for name in dir(termios)
+                   if name[0] == "B" and name[1:].isdigit()}
+HEADER = b"\xff\xff\xfd\x00"
+STUFFED = b"\xff\xff\xfd\xfd"
+INST_STATUS = 0x55
+
+RPM_PER_SPEED_UNIT = config.DXL_SPEED_UNIT_RPM
+MAX_RPM = 1023 * RPM_PER_SPEED_UNIT             # Moving Speed 0 means "as fast as possible"
+POSITION_UNITS_PER_DEGREE = 1.0 / config.DXL_POSITION_UNIT_DEGREE
+NOMINAL_VOLTAGE = 7.4                           # the no-load speed is rated at this supply voltage
+MOTOR_TIME_CONSTANT = 0.03                      # seconds for the wheel speed to cover 63% of a step
+
+# Factory defaults of the XL320, see the product eManual
+XL320_DEFAULTS = {
+    0: XL320_MODEL_NUMBER,
+    2: XL320_FIRMWARE_VERSION,
+    ADDR_BAUD_RATE: 3,  # 1 Mbps
+    ADDR_RETURN_DELAY_TIME: 250,
+    config.ADDR_CW_ANGLE_LIMIT: 0,
+    config.ADDR_CCW_ANGLE_LIMIT: 1023,
+    config.ADDR_CONTROL_MODE: config.JOINT_MODE,
+    12: 65,     # temperature limit
+    13: 60,     # min voltage limit
+    14: 90,     # max voltage limit
+    15: 1023,   # max torque
+    ADDR_STATUS_RETURN_LEVEL: 2,
+    config.ADDR_SHUTDOWN: 3,
+    29: 32,     # P gain
+    35: 1023,   # torque limit
+    config.ADDR_PRESENT_POSITION: 512,
+    ADDR_PRESENT_VOLTAGE: 74,
+    config.ADDR_PRESENT_TEMPERATURE: 30,
+    51: 32,     # punch
+}
+
+_crc = Protocol2PacketHandler().updateCRC
+
+
+def wire_time(length, baudrate):
+    """@return The seconds length bytes take on the wire at baudrate (8N1, 10 bits per byte)."""
+    return length * 10.0 / baudrate
+
+
+def _stuff(params):
+    return bytes(params).replace(b"\xff\xff\xfd", STUFFED)
+
+
+def _unstuff(params):
+    return bytes(params).replace(STUFFED, b"\xff\xff\xfd")
+
+
+def make_status(servo_id, error=0, params=b""):
+    """@return A Protocol 2.0 status packet, byte stuffed and with its CRC."""
+    params = _stuff(params)
+    length = len(params) + 4
+    packet = bytearray(HEADER)
+    packet += bytes((servo_id, length & 0xFF, length >> 8, INST_STATUS, error))
+    packet += params
+    crc = _crc(0, packet, len(packet))
+    packet += bytes((crc & 0xFF, crc >> 8))
+    return bytes(packet)
+
+
+class VirtualXL320:
+    """
+    @brief The control table and motion of one emulated XL320.
+
+    Motion is integrated lazily: advance() moves the servo from its last update
+    to now, so the emulator does no work between packets. In wheel mode the
+    speed depends on the supply voltage and the external load as well as on
+    Moving Speed, and Present Load reports the torque.
+    """
+
+    def __init__(self, servo_id):
+        self.servo_id = servo_id
+        self.table = bytearray(CONTROL_TABLE_SIZE)
+        self.registered = None      # (address, data) staged by Reg Write
+        self.position = 0.0         # present position with sub-unit precision
+        self.speed_rpm = 0.0        # signed, positive is CCW
+        self.supply_voltage = NOMINAL_VOLTAGE
+        self.external_load = 0.0    # torque opposing the rotation in wheel mode, as a fraction of stall torque
+        self.updated_at = time.monotonic()
+        self.reset()
+
+    def reset(self):
+        """@brief Restores the power-on state, as after a reboot."""
+        id_byte = self.servo_id
+        self.table[:] = bytes(CONTROL_TABLE_SIZE)
+        for address, value in XL320_DEFAULTS.items():
+            self._store(address, value)
+        self.table[3] = id_byte
+        self.table[ADDR_PRESENT_VOLTAGE] = int(round(self.supply_voltage * 10))
+        self.registered = None
+        self.position = float(self.get(config.ADDR_PRESENT_POSITION))
+        self.speed_rpm = 0.0
+        self.updated_at = time.monotonic()
+
+    def _store(self, address, value):
+        size = XL320_CONTROL_TABLE[address].size if address in XL320_CONTROL_TABLE else 1
+        self.table[address:address + size] = value.to_bytes(size, "little")
+
+    def get(self, address):
+        """@return The value of the register starting at address."""
+        size = XL320_CONTROL_TABLE[address].size
+        return int.from_bytes(self.table[address:address + size], "little")
+
+    @property
+    def baudrate(self):
+        return BAUD_RATES.get(self.table[ADDR_BAUD_RATE])
+
+    @property
+    def return_delay(self):
+        """@return The Return Delay Time in seconds (2 us per unit)."""
+        return self.table[ADDR_RETURN_DELAY_TIME] * 2e-6
+
+    def advance(self, now):
+        """@brief Moves the servo toward its goal (joint mode) or at its speed (wheel mode) up to now."""
+        dt = now - self.updated_at
+        self.updated_at = now
+        torque = self.table[config.ADDR_TORQUE_ENABLE]
+        goal_speed = self.get(config.ADDR_GOAL_SPEED)
+
+        load = 0.0
+        if self.table[config.ADDR_CONTROL_MODE] == config.WHEEL_MODE:
+            # A DC motor: Moving Speed sets the drive, the free running speed scales
+            # with the supply voltage, the external load slows it down and the
+            # rotor follows the resulting speed with a first order lag.
+            drive = (goal_speed & 0x3FF) / 1023.0 if torque else 0.0
+            if goal_speed & 0x400:
+                drive = -drive
+            free_rpm = MAX_RPM * self.supply_voltage / NOMINAL_VOLTAGE
+            target = max(abs(drive) - self.external_load, 0.0) * free_rpm
+            target = -target if drive < 0 else target
+            previous = self.speed_rpm
+            self.speed_rpm += (target - previous) * (1.0 - math.exp(-dt / MOTOR_TIME_CONSTANT))
+            if target == 0.0 and abs(self.speed_rpm) < RPM_PER_SPEED_UNIT / 2:
+                self.speed_rpm = 0.0
+            # The torque is what the drive has left over the back EMF of the present speed
+            load = drive - self.speed_rpm / free_rpm
+            step = (previous + self.speed_rpm) / 2.0 * 6.0 * POSITION_UNITS_PER_DEGREE * dt
+            self.position = (self.position + step) % 1024
+            moving = self.speed_rpm != 0.0
+        else:
+            low = self.get(config.ADDR_CW_ANGLE_LIMIT)
+            high = self.get(config.ADDR_CCW_ANGLE_LIMIT)
+            goal = min(max(self.get(config.ADDR_GOAL_POSITION), low), high)
+            remaining = goal - self.position
+            rpm = goal_speed * RPM_PER_SPEED_UNIT if goal_speed else MAX_RPM
+            max_step = rpm * 6.0 * POSITION_UNITS_PER_DEGREE * dt
+            if not torque or remaining == 0:
+                self.speed_rpm = 0.0
+            elif abs(remaining) <= max_step:
+                self.position = float(goal)
+                self.speed_rpm = 0.0
+            else:
+                self.position += max_step if remaining > 0 else -max_step
+                self.speed_rpm = rpm if remaining > 0 else -rpm
+            moving = self.speed_rpm != 0.0
+
+        speed = int(round(abs(self.speed_rpm) / RPM_PER_SPEED_UNIT))
+        self._store(config.ADDR_PRESENT_POSITION, int(self.position) & 0x3FF)
+        self._store(config.ADDR_PRESENT_SPEED, speed | (0x400 if self.speed_rpm < 0 else 0))
+        self._store(config.ADDR_PRESENT_LOAD, min(int(round(abs(load) * 1000)), 1023) | (0x400 if load < 0 else 0))
+        self.table[config.ADDR_MOVING] = 1 if moving else 0
+        self.table[ADDR_REGISTERED] = 1 if self.registered is not None else 0
+
+    def error_byte(self, error=0):
+        """@return error with the alert bit set while a hardware error is latched."""
+        return error | (ERRBIT_ALERT if self.table[config.ADDR_HARDWARE_ERROR_STATUS] else 0)
+
+    def read(self, address, length):
+        """@return A (error, data) tuple."""
+        if address + length > CONTROL_TABLE_SIZE:
+            return self.error_byte(ERRNUM_ACCESS), b""
+        return self.error_byte(), bytes(self.table[address:address + length])
+
+    def check_write(self, address, data):
+        """@return The error number (ERRNUM_*) a write of data at address is rejected with, or 0."""
+        if not data or address + len(data) > CONTROL_TABLE_SIZE:
+            return ERRNUM_DATA_LENGTH
+        torque = self.table[config.ADDR_TORQUE_ENABLE]
+        end = address + len(data)
+        for register in XL320_CONTROL_TABLE.values():
+            if register.address >= end or register.address + register.size <= address:
+                continue
+            if not register.writable or (register.area == EEPROM and torque):
+                return ERRNUM_ACCESS
+        return 0
+
+    def write(self, address, data):
+        """@return The error byte of the status packet."""
+        error = self.check_write(address, data)
+        if not error:
+            self.table[address:address + len(data)] = data
+            if address <= 3 < address + len(data):
+                self.servo_id = self.table[3]
+        return self.error_byte(error)
+
+    def action(self):
+        if self.registered is not None:
+            address, data = self.registered
+            self.registered = None
+            self.write(address, data)
+
+    def replies_to(self, instruction):
+        """@return Whether the Status Return Level lets the servo answer instruction."""
+        level = self.table[ADDR_STATUS_RETURN_LEVEL]
+        if instruction == INST_PING:
+            return True
+        if instruction in (INST_READ, INST_SYNC_READ, INST_BULK_READ):
+            return level >= 1
+        return level >= 2
+
+
+class VirtualBus:
+    """
+    @brief Emulates a chain of XL320 servos behind a pseudo-terminal.
+
+    Open port_name with a PortHandler like a USB2AX or UART device. The bus
+    speaks Protocol 2.0 (Ping, Read, Write, Reg Write, Action, Reboot,
+    Sync Read/Write and Bulk Read, including broadcast) and, with timing on,
+    delays every status packet as the real bus would: the instruction on the
+    wire, the Return Delay Time of the servo and the status on the wire, at
+    the baudrate the host set on the port. A servo only hears packets sent at
+    the baudrate of its Baud Rate register. The sleeps are as accurate as the
+    OS timer (tens of microseconds), so run the bus in its own process for
+    benchmarks.
+
+    @param servo_ids The IDs of the servos on the bus.
+    @param baudrate The baudrate of every servo, or a dict mapping servo ID to its baudrate.
+    """
+
+    def __init__(self, servo_ids, baudrate=config.BAUDRATE, timing=True):
+        self.baudrate = baudrate if not isinstance(baudrate, dict) else config.BAUDRATE
+        self.timing = timing
+        self.servos = {servo_id: VirtualXL320(servo_id) for servo_id in servo_ids}
+        baud_values = {rate: value for value, rate in BAUD_RATES.items()}
+        for servo_id, servo in self.servos.items():
+            rate = baudrate.get(servo_id, config.BAUDRATE) if isinstance(baudrate, dict) else baudrate
+            servo.table[ADDR_BAUD_RATE] = baud_values[rate]
+        self.lock = threading.Lock()
+        self.packets = 0
+        self.crc_errors = 0
+        self.goal_changed_at = {}   # servo ID -> perf_counter() time its last new Goal Position took effect
+
+        self.master, self.slave = os.openpty()
+        tty.setraw(self.master)
+        tty.setraw(self.slave)
+        self.port_name = os.ttyname(self.slave)
+
+        self._buffer = bytearray()
+        self._bus_free_at = 0.0
+        self._stop_event = threading.Event()
+        self._thread = None
+        self._process = None
+
+    def start(self, process=False):
+        """
+        @brief Serves the bus in the background.
+
+        @param process If True, serve from a forked process so the emulator does not
+                       compete with the caller for the GIL. The servo state then lives
+                       in the child and self.servos no longer follows it.
+        """
+        if process:
+            import multiprocessing
+
+            self._process = multiprocessing.get_context("fork").Process(
+                target=self.serve_forever, name="virtual-xl320", daemon=True)
+            self._process.start()
+        else:
+            self._thread = threading.Thread(target=self.serve_forever, name="virtual-xl320", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        """@brief Stops serving and closes the pseudo-terminal."""
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        if self._process is not None:
+            self._process.terminate()
+            self._process.join()
+            self._process = None
+        for fd in (self.master, self.slave):
+            try:
+                os.close(fd)
+            except OSError:
+                pass
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def serve_forever(self):
+        while not self._stop_event.is_set():
+            readable, _, _ = select.select([self.master], [], [], 0.1)
+            if not readable:
+                continue
+            try:
+                chunk = os.read(self.master, 4096)
+            except OSError:
+                return
+            received_at = time.perf_counter()
+            self._buffer += chunk
+            for packet in self._split_packets():
+                self.handle(packet, received_at)
+
+    def _split_packets(self):
+        buffer = self._buffer
+        while True:
+            start = buffer.find(HEADER)
+            if start < 0:
+                del buffer[:max(len(buffer) - 3, 0)]
+                return
+            del buffer[:start]
+            if len(buffer) < 7:
+                return
+            total = 7 + (buffer[5] | buffer[6] << 8)
+            if len(buffer) < total:
+                return
+            packet = bytes(buffer[:total])
+            del buffer[:total]
+            yield packet
+
+    def handle(self, packet, received_at=None):
+        """
+        @brief Executes one instruction packet and sends the status packets it calls for.
+
+        @param received_at perf_counter() time the packet started to arrive, for the timing model.
+        """
+        if received_at is None:
+            received_at = time.perf_counter()
+        self.packets += 1
+        servo_id, instruction = packet[4], packet[7]
+        crc = _crc(0, packet, len(packet) - 2)
+        if crc != (packet[-2] | packet[-1] << 8):
+            self.crc_errors += 1
+            if servo_id in self.servos:
+                servo = self.servos[servo_id]
+                self._send(received_at, len(packet), [(servo, make_status(servo_id, ERRNUM_CRC))])
+            return
+        params = _unstuff(packet[8:-2])
+
+        with self.lock:
+            now = time.monotonic()
+            for servo in self.servos.values():
+                servo.advance(now)
+            line_baudrate = self.line_baudrate()
+            # Servos at another baudrate only see garbage and stay silent
+            listening = {servo.servo_id: servo for servo in self.servos.values()
+                         if line_baudrate is None or servo.baudrate == line_baudrate}
+            goals = {sid: servo.get(config.ADDR_GOAL_POSITION) for sid, servo in listening.items()}
+            replies = self._execute(listening, servo_id, instruction, params)
+
+            # The instruction acts once its last byte is in
+            acted_at = received_at
+            if self.timing:
+                acted_at = max(received_at, self._bus_free_at) + wire_time(
+                    len(packet), line_baudrate or self.baudrate)
+            for sid, goal in goals.items():
+                if listening[sid].get(config.ADDR_GOAL_POSITION) != goal:
+                    self.goal_changed_at[sid] = acted_at
+        self._send(received_at, len(packet), replies)
+
+    def set_conditions(self, voltage=None, load=None, servo_ids=None):
+        """
+        @brief Changes what the motors run on, to test wheel mode control against it.
+
+        With start(process=True), call this before start(); the child process
+        keeps the conditions it was forked with.
+
+        @param voltage The supply voltage in volts, the wheel speed scales with it.
+        @param load The torque opposing the rotation, as a fraction of the stall torque.
+        @param servo_ids The servos to change, defaults to all of them.
+        """
+        with self.lock:
+            now = time.monotonic()
+            for servo_id in self.servos if servo_ids is None else servo_ids:
+                servo = self.servos[servo_id]
+                servo.advance(now)
+                if voltage is not None:
+                    servo.supply_voltage = voltage
+                    servo.table[ADDR_PRESENT_VOLTAGE] = int(round(voltage * 10))
+                if load is not None:
+                    servo.external_load = load
+
+    def line_baudrate(self):
+        """@return The baudrate the host configured on the port, or None if it is not a standard one."""
+        try:
+            return _TERMIOS_SPEEDS.get(termios.tcgetattr(self.slave)[4])
+        except termios.error:
+            return None
+
+    def _execute(self, servos, servo_id, instruction, params):
+        """@return The (servo, status packet) replies, in the order the servos send them."""
+        replies = []
+
+        if instruction == INST_SYNC_WRITE:
+            address, length = params[0] | params[1] << 8, params[2] | params[3] << 8
+            for offset in range(4, len(params) - length, length + 1):
+                servo = servos.get(params[offset])
+                if servo is not None:
+                    servo.write(address, params[offset + 1:offset + 1 + length])
+            return replies
+
+        if instruction == INST_SYNC_READ:
+            address, length = params[0] | params[1] << 8, params[2] | params[3] << 8
+            for target in params[4:]:
+                servo = servos.get(target)
+                if servo is not None and servo.replies_to(instruction):
+                    error, data = servo.read(address, length)
+                    replies.append((servo, make_status(target, error, data)))
+            return replies
+
+        if instruction == INST_BULK_READ:
+            for offset in range(0, len(params) - 4, 5):
+                target = params[offset]
+                servo = servos.get(target)
+                if servo is not None and servo.replies_to(instruction):
+                    address = params[offset + 1] | params[offset + 2] << 8
+                    length = params[offset + 3] | params[offset + 4] << 8
+                    error, data = servo.read(address, length)
+                    replies.append((servo, make_status(target, error, data)))
+            return replies
+
+        if servo_id == BROADCAST_ID:
+            targets = sorted(servos.values(), key=lambda servo: servo.servo_id)
+        elif servo_id in servos:
+            targets = [servos[servo_id]]
+        else:
+            return replies
+
+        for servo in targets:
+            error, data = self._execute_one(servo, instruction, params)
+            # Only Ping is answered when broadcast
+            if (servo_id != BROADCAST_ID or instruction == INST_PING) and servo.replies_to(instruction):
+                replies.append((servo, make_status(servo.servo_id, error, data)))
+        return replies
+
+    def _execute_one(self, servo, instruction, params):
+        if instruction == INST_PING:
+            return servo.error_byte(), bytes((XL320_MODEL_NUMBER & 0xFF, XL320_MODEL_NUMBER >> 8,
+                                              XL320_FIRMWARE_VERSION))
+        if instruction == INST_READ:
+            return servo.read(params[0] | params[1] << 8, params[2] | params[3] << 8)
+        if instruction == INST_WRITE:
+            return servo.write(params[0] | params[1] << 8, params[2:]), b""
+        if instruction == INST_REG_WRITE:
+            address, data = params[0] | params[1] << 8, params[2:]
+            error = servo.check_write(address, data)
+            if not error:
+                servo.registered = (address, bytes(data))
+                servo.table[ADDR_REGISTERED] = 1
+            return servo.error_byte(error), b""
+        if instruction == INST_ACTION:
+            servo.action()
+            return servo.error_byte(), b""
+        if instruction == INST_REBOOT:
+            servo.reset()
+            return 0, b""
+        return servo.error_byte(ERRNUM_INSTRUCTION), b""
+
+    def _send(self, received_at, request_length, replies):
+        # The instruction is on the wire first, then each servo waits its Return
+        # Delay Time and sends its status right after the previous one. The next
+        # instruction is only taken once the bus is idle again, so a host that
+        # writes faster than the wire carries fills the pty and gets blocked.
+        if not self.timing:
+            for servo, status in replies:
+                os.write(self.master, status)
+            return
+
+        baudrate = self.line_baudrate() or self.baudrate
+        bus_time = max(received_at, self._bus_free_at) + wire_time(request_length, baudrate)
+        for servo, status in replies:
+            bus_time += servo.return_delay + wire_time(len(status), baudrate)
+            self._sleep_until(bus_time)
+            os.write(self.master, status)
+        self._sleep_until(bus_time)
+        self._bus_free_at = bus_time
+
+    @staticmethod
+    def _sleep_until(deadline):
+        remaining = deadline - time.perf_counter()
+        if remaining > 0:
+            time.sleep(remaining)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Emulate a chain of XL320 servos on a pseudo-terminal.")
+    parser.add_argument("ids", type=int, nargs="+", help="IDs of the emulated servos")
+    parser.add_argument("--baudrate", type=int, default=config.BAUDRATE)
+    parser.add_argument("--no-timing", action="store_true", help="answer without modelling bus timing")
+    args = parser.parse_args()
+
+    bus = VirtualBus(args.ids, args.baudrate, timing=not args.no_timing)
+    print("Virtual XL320 bus with IDs %s on %s" % (", ".join(map(str, args.ids)), bus.port_name))
+    try:
+        bus.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        bus.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,233 @@
+import threading
+import time
+from . import config
+from .scheduler import FixedRateLoop
+from .servo_group import ServoGroup
+from .status import DIRECTION_BIT, _signed
+from dynamixel_sdk import COMM_SUCCESS  # Uses Dynamixel SDK library
+
+# Present Speed and Present Load are adjacent, so one read per cycle gets both
+FEEDBACK_START = config.ADDR_PRESENT_SPEED
+FEEDBACK_LENGTH = config.ADDR_PRESENT_LOAD + 2 - FEEDBACK_START
+
+MAX_COMMAND = 1023                              # full drive in Moving Speed units
+MAX_RPM = MAX_COMMAND * config.DXL_SPEED_UNIT_RPM
+
+
+class WheelChannel:
+    """@brief The target, feedback and controller state of one servo in wheel mode."""
+
+    __slots__ = ("servo_id", "target_rpm", "measured_rpm", "load_percent", "command", "integral")
+
+    def __init__(self, servo_id):
+        self.servo_id = servo_id
+        self.target_rpm = 0.0
+        self.measured_rpm = 0.0
+        self.load_percent = 0.0
+        self.command = 0            # signed Moving Speed, positive is CCW
+        self.integral = 0.0
+
+    def __repr__(self):
+        return ("WheelChannel(servo_id=%d, target=%.1f rpm, measured=%.1f rpm, load=%.1f%%, command=%d)"
+                % (self.servo_id, self.target_rpm, self.measured_rpm, self.load_percent, self.command))
+
+
+class WheelSpeedController:
+    """
+    @brief Holds the speed of servos in wheel mode with a PI loop at a fixed rate on a background thread.
+
+    In wheel mode Moving Speed only sets the drive of the motor, so the speed
+    it gives drops with the supply voltage and under load. Each cycle reads
+    Present Speed and Present Load of every servo with one Sync Read, runs a
+    PI controller per servo on the speed error, with the target as feed
+    forward, and writes every Moving Speed with one Sync Write. The loop is
+    a FixedRateLoop.
+
+    The servos must already be in wheel mode with torque enabled.
+
+    A cycle that raises is counted and logged and the loop goes on. An OSError
+    means the port itself is gone: the loop then tries to set every Moving
+    Speed to 0, stores the exception in error and ends.
+    """
+
+    def __init__(self, servo_ids, portHandler, packetHandler, rate=200.0, kp=3.0, ki=60.0, logger=None):
+        """
+        @param rate The control rate in Hz.
+        @param kp The proportional gain, in Moving Speed units per rpm of error.
+        @param ki The integral gain, in Moving Speed units per rpm of error and second.
+        @param logger An optional logging.Logger the failed cycles are logged to, see Servo.
+        """
+        self.servo_ids = list(servo_ids)
+        self.portHandler = portHandler
+        self.packetHandler = packetHandler
+        self.kp = kp
+        self.ki = ki
+        self.logger = logger
+        self.error = None           # the exception that ended the loop, if any
+        self.group = ServoGroup(self.servo_ids, portHandler, packetHandler)
+        self.channels = {servo_id: WheelChannel(servo_id) for servo_id in self.servo_ids}
+
+        self._thread = None
+        self._stop_event = threading.Event()
+        self.loop = FixedRateLoop(rate, self._stop_event)
+        self.period = self.loop.period
+        self.reset_stats()
+
+    def reset_stats(self):
+        self.loop.reset_stats()
+        self.failed_reads = 0
+        self.failed_writes = 0
+        self.failed_cycles = 0
+        self._started_at = time.monotonic()
+        self._stopped_at = None
+
+    def set_target(self, servo_id, rpm):
+        """
+        @brief Sets the speed to hold, positive counter-clockwise and negative clockwise.
+
+        @throw ValueError If the speed is beyond what the servo can reach.
+        """
+        if not -MAX_RPM <= rpm <= MAX_RPM:
+            raise ValueError("Speed must be between %.1f and %.1f rpm" % (-MAX_RPM, MAX_RPM))
+        self.channels[servo_id].target_rpm = float(rpm)
+
+    def set_targets(self, targets):
+        """@param targets A dict mapping servo ID to a signed speed in rpm, see set_target()."""
+        for servo_id, rpm in targets.items():
+            self.set_target(servo_id, rpm)
+
+    def get_stats(self):
+        """
+        @brief Reports how well the loop keeps its rate and its targets.
+
+        @return A dict with the target period and the achieved rate, the mean, p99
+                and max jitter of the cycle start and the mean and max time spent in
+                a cycle in milliseconds, the number of cycles, of overruns and of the
+                cycles they made us skip, the failed reads and writes, the cycles
+                that raised, and per servo
+                ID a dict of target and measured speed in rpm, load in percent and
+                the last Moving Speed command.
+        """
+        end = self._stopped_at if self._stopped_at is not None else time.monotonic()
+        elapsed = end - self._started_at
+        stats = self.loop.get_stats()
+        stats.update({
+            "period_ms": self.period * 1000.0,
+            "rate": self.loop.cycles / elapsed if elapsed > 0 else 0.0,
+            "failed_reads": self.failed_reads,
+            "failed_writes": self.failed_writes,
+            "failed_cycles": self.failed_cycles,
+        })
+        for servo_id, channel in self.channels.items():
+            stats[servo_id] = {
+                "target_rpm": channel.target_rpm,
+                "measured_rpm": channel.measured_rpm,
+                "load_percent": channel.load_percent,
+                "command": channel.command,
+            }
+        return stats
+
+    def _update(self, channel, dt):
+        """@return The new signed Moving Speed of channel, from its target and measured speed."""
+        if channel.target_rpm == 0.0:
+            # Stopping is left to the motor so the integral cannot make it creep
+            channel.integral = 0.0
+            return 0
+
+        error = channel.target_rpm - channel.measured_rpm
+        feed_forward = channel.target_rpm / MAX_RPM * MAX_COMMAND
+        output = feed_forward + self.kp * error + self.ki * channel.integral
+        # Conditional integration: stop integrating while the output is saturated
+        # in the direction the error pushes it, so the integral does not wind up.
+        if -MAX_COMMAND < output < MAX_COMMAND or (output > 0) != (error > 0):
+            channel.integral += error * dt
+            output = feed_forward + self.kp * error + self.ki * channel.integral
+        return int(round(max(-MAX_COMMAND, min(MAX_COMMAND, output))))
+
+    def step(self, dt=None):
+        """
+        @brief Runs one control cycle: one Sync Read, the PI update of every servo and one Sync Write.
+
+        @param dt The time since the last cycle in seconds, defaults to the period.
+
+        @return The communication result of the Sync Write.
+        """
+        dt = self.period if dt is None else dt
+        results = self.group.read_block(FEEDBACK_START, FEEDBACK_LENGTH)
+
+        speeds = {}
+        for servo_id, channel in self.channels.items():
+            data, dxl_comm_result, dxl_error = results[servo_id]
+            if dxl_comm_result != COMM_SUCCESS:
+                # Hold the last command rather than act on stale feedback
+                self.failed_reads += 1
+            else:
+                channel.measured_rpm = _signed(data[0] | data[1] << 8) * config.DXL_SPEED_UNIT_RPM
+                channel.load_percent = _signed(data[2] | data[3] << 8) * 0.1
+                channel.command = self._update(channel, dt)
+            speeds[servo_id] = abs(channel.command) | (DIRECTION_BIT if channel.command < 0 else 0)
+
+        dxl_comm_result = self.group.sync_write(config.ADDR_GOAL_SPEED, 2, speeds)
+        if dxl_comm_result != COMM_SUCCESS:
+            self.failed_writes += 1
+        return dxl_comm_result
+
+    def _cycle(self, dt):
+        try:
+            self.step(dt)
+        except OSError as error:
+            self.failed_cycles += 1
+            self.error = error
+            if self.logger is not None:
+                self.logger.exception("Wheel control stopped, the port failed")
+            self._stop_event.set()
+            try:
+                self._write_zero()
+            except OSError:
+                pass
+        except Exception:
+            self.failed_cycles += 1
+            if self.logger is not None:
+                self.logger.exception("Wheel control cycle failed")
+
+    def _write_zero(self):
+        """@brief Sets every Moving Speed to 0."""
+        for channel in self.channels.values():
+            channel.command = 0
+        self.group.sync_write(config.ADDR_GOAL_SPEED, 2, {servo_id: 0 for servo_id in self.servo_ids})
+
+    def _run(self):
+        self.loop.run(self._cycle)
+
+    def start(self):
+        """@brief Starts the control loop on a background thread. From now on only the loop may use the port."""
+        if self._thread is not None:
+            return self
+        self._stop_event.clear()
+        self.error = None
+        self.reset_stats()
+        for channel in self.channels.values():
+            channel.integral = 0.0
+        self._thread = threading.Thread(target=self._run, name="xl320-wheel-control", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """
+        @brief Stops the control loop and sets every Moving Speed to 0,
+               unless the loop already ended on a failed port.
+        """
+        if self._thread is None:
+            return
+        self._stop_event.set()
+        self._thread.join()
+        self._thread = None
+        self._stopped_at = time.monotonic()
+        if self.error is None:
+            self._write_zero()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
@@ -0,0 +1,63 @@
+import asyncio
+import threading
+
+import pytest
+from dynamixel_sdk import PortHandler
+from mbot_xl320_library import ADDR_LED, TURNAROUND_DRAIN, AsyncBus, AsyncServo, GPIOPacketHandler, VirtualBus
+from mbot_xl320_library import open_port
+
+SERVO_IDS = [1, 2]
+
+
+class ThreadRecordingHandler(GPIOPacketHandler):
+    """Notes the thread every instruction packet is sent from."""
+
+    def __init__(self, direction):
+        super(ThreadRecordingHandler, self).__init__(TURNAROUND_DRAIN, direction)
+        self.send_threads = set()
+
+    def txPacket(self, port, txpacket):
+        self.send_threads.add(threading.get_ident())
+        return super(ThreadRecordingHandler, self).txPacket(port, txpacket)
+
+
+@pytest.fixture
+def virtual_bus():
+    bus = VirtualBus(SERVO_IDS).start()
+    yield bus
+    bus.stop()
+
+
+def run(virtual_bus, packetHandler):
+    portHandler = PortHandler(virtual_bus.port_name)
+    open_port(portHandler, quiet=True)
+
+    async def exchange():
+        bus = AsyncBus(portHandler, packetHandler)
+        try:
+            servo = AsyncServo(1, bus)
+            await servo.change_led_color(3)
+            leds = await bus.sync_read(ADDR_LED, 1, SERVO_IDS)
+            return threading.get_ident(), leds
+        finally:
+            bus.close()
+
+    try:
+        return asyncio.run(exchange())
+    finally:
+        portHandler.closePort()
+
+
+def test_toggling_sends_run_off_the_loop_thread(virtual_bus):
+    packetHandler = ThreadRecordingHandler("mock")
+    loop_thread, results = run(virtual_bus, packetHandler)
+    assert loop_thread not in packetHandler.send_threads
+    assert results[1][0] == bytes([3])
+    assert packetHandler.direction.events[:2] == ["tx", "rx"]
+
+
+def test_non_toggling_sends_stay_on_the_loop_thread(virtual_bus):
+    packetHandler = ThreadRecordingHandler("none")
+    loop_thread, results = run(virtual_bus, packetHandler)
+    assert packetHandler.send_threads == {loop_thread}
+    assert results[2][0] == bytes([0])
@@ -0,0 +1,19 @@
+from mbot_xl320_library import ADDR_GOAL_POSITION, ADDR_LED, ADDR_MOVING, ADDR_PRESENT_POSITION
+from mbot_xl320_library import ControlTableShadow
+
+
+def test_shadow_does_not_store_volatile_registers():
+    shadow = ControlTableShadow()
+    shadow.record(ADDR_PRESENT_POSITION, 512)
+    shadow.record(ADDR_MOVING, 1)
+    assert ADDR_PRESENT_POSITION not in shadow.values
+    assert ADDR_MOVING not in shadow.values
+    assert shadow.lookup(ADDR_PRESENT_POSITION) is None
+
+
+def test_shadow_stores_static_and_writable_registers():
+    shadow = ControlTableShadow()
+    shadow.record(ADDR_LED, 3)
+    shadow.record(ADDR_GOAL_POSITION, 512)
+    assert shadow.lookup(ADDR_LED) == 3
+    assert not shadow.needs_write(ADDR_GOAL_POSITION, 512)
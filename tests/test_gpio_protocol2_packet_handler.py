@@ -0,0 +1,164 @@
+import time
+
+import pytest
+from dynamixel_sdk import COMM_SUCCESS, ERRNUM_ACCESS, GroupBulkRead, GroupSyncRead, GroupSyncWrite, PortHandler
+from mbot_xl320_library import ADDR_GOAL_POSITION, ADDR_LED, TURNAROUND_DRAIN
+from mbot_xl320_library import GPIOPacketHandler, MockDirection, ServoLink, VirtualBus
+from mbot_xl320_library.gpio_protocol2_packet_handler import (
+    ADAPTIVE_MIN_SAMPLES, BACKOFF_INITIAL, BACKOFF_MAX, BREAKER_CLOSED, BREAKER_HALF_OPEN, BREAKER_OPEN,
+    BREAKER_SILENCE, BREAKER_THRESHOLD, TIMEOUT_MARGIN_MS,
+)
+
+SERVO_IDS = [1, 2, 3]
+GOAL_POSITIONS = {1: 100, 2: 512, 3: 1000}
+LED_COLORS = {1: 1, 2: 4, 3: 7}
+
+
+@pytest.fixture
+def bus():
+    """@return A PortHandler and a GPIOPacketHandler with MockDirection on a virtual bus with SERVO_IDS."""
+    virtual_bus = VirtualBus(SERVO_IDS).start()
+    portHandler = PortHandler(virtual_bus.port_name)
+    packetHandler = GPIOPacketHandler(TURNAROUND_DRAIN, MockDirection())
+    assert portHandler.openPort()
+    yield portHandler, packetHandler
+    portHandler.closePort()
+    virtual_bus.stop()
+
+
+def sync_write(portHandler, packetHandler, address, length, values):
+    group = GroupSyncWrite(portHandler, packetHandler, address, length)
+    for servo_id, value in values.items():
+        assert group.addParam(servo_id, list(value.to_bytes(length, "little")))
+    assert group.txPacket() == COMM_SUCCESS
+
+
+def test_sync_write_then_sync_read_splits_the_data_of_every_servo(bus):
+    portHandler, packetHandler = bus
+    sync_write(portHandler, packetHandler, ADDR_GOAL_POSITION, 2, GOAL_POSITIONS)
+
+    group = GroupSyncRead(portHandler, packetHandler, ADDR_GOAL_POSITION, 2)
+    for servo_id in SERVO_IDS:
+        assert group.addParam(servo_id)
+    assert group.txRxPacket() == COMM_SUCCESS
+    for servo_id in SERVO_IDS:
+        assert group.isAvailable(servo_id, ADDR_GOAL_POSITION, 2)
+        assert group.getData(servo_id, ADDR_GOAL_POSITION, 2) == GOAL_POSITIONS[servo_id]
+
+    # One switch to transmit and back per packet, however many servos answer
+    assert packetHandler.direction.events == ["tx", "rx", "tx", "rx"]
+
+
+def test_bulk_read_splits_different_registers_of_every_servo(bus):
+    portHandler, packetHandler = bus
+    sync_write(portHandler, packetHandler, ADDR_GOAL_POSITION, 2, GOAL_POSITIONS)
+    sync_write(portHandler, packetHandler, ADDR_LED, 1, LED_COLORS)
+
+    group = GroupBulkRead(portHandler, packetHandler)
+    registers = {1: (ADDR_GOAL_POSITION, 2), 2: (ADDR_LED, 1), 3: (ADDR_GOAL_POSITION, 2)}
+    for servo_id, (address, length) in registers.items():
+        assert group.addParam(servo_id, address, length)
+    assert group.txRxPacket() == COMM_SUCCESS
+    assert group.getData(1, ADDR_GOAL_POSITION, 2) == GOAL_POSITIONS[1]
+    assert group.getData(2, ADDR_LED, 1) == LED_COLORS[2]
+    assert group.getData(3, ADDR_GOAL_POSITION, 2) == GOAL_POSITIONS[3]
+
+
+
+def test_error_status_without_parameters_does_not_wait_for_the_requested_length(bus):
+    portHandler, packetHandler = bus
+    start = time.perf_counter()
+    # past the end of the control table: the servo answers with an 11 byte error status
+    data, dxl_comm_result, dxl_error = packetHandler.readTxRx(portHandler, 1, ADDR_GOAL_POSITION, 100)
+    elapsed_ms = (time.perf_counter() - start) * 1000.0
+    assert dxl_comm_result == COMM_SUCCESS
+    assert dxl_error & 0x7F == ERRNUM_ACCESS
+    assert elapsed_ms < portHandler.packet_timeout / 2
+
+
+def open_link(now=0.0):
+    """@return A ServoLink whose breaker just opened at now + BREAKER_SILENCE."""
+    link = ServoLink()
+    for _ in range(BREAKER_THRESHOLD - 1):
+        link.record_timeout(now, BREAKER_THRESHOLD)
+    link.record_timeout(now + BREAKER_SILENCE, BREAKER_THRESHOLD)
+    assert link.state == BREAKER_OPEN
+    return link
+
+
+def test_breaker_opens_after_the_threshold_of_timeouts_spanning_the_silence():
+    link = ServoLink()
+    for _ in range(BREAKER_THRESHOLD * 2):
+        link.record_timeout(0.0, BREAKER_THRESHOLD)
+    # many timeouts at once may be a host hiccup, not a silent servo
+    assert link.state == BREAKER_CLOSED
+    link.record_timeout(BREAKER_SILENCE, BREAKER_THRESHOLD)
+    assert link.state == BREAKER_OPEN
+    assert link.retry_at == BREAKER_SILENCE + BACKOFF_INITIAL
+
+
+def test_breaker_stays_closed_below_the_threshold_or_without_one():
+    link = ServoLink()
+    for _ in range(BREAKER_THRESHOLD - 1):
+        link.record_timeout(0.0, BREAKER_THRESHOLD)
+    link.record_answer(1.0, 0.5)
+    link.record_timeout(BREAKER_SILENCE, BREAKER_THRESHOLD)
+    assert link.state == BREAKER_CLOSED
+
+    link = ServoLink()
+    for now in range(10):
+        link.record_timeout(float(now), None)
+    assert link.state == BREAKER_CLOSED
+
+
+def test_open_breaker_rejects_until_the_backoff_ran_out_then_lets_a_probe_through():
+    link = open_link()
+    opened_at = BREAKER_SILENCE
+    assert not link.allow(opened_at)
+    assert not link.allow(opened_at + BACKOFF_INITIAL / 2.0)
+    assert link.rejected == 2
+    assert link.allow(opened_at + BACKOFF_INITIAL)
+    assert link.state == BREAKER_HALF_OPEN
+    assert link.probes == 1
+
+    # an answered probe closes the breaker and resets the backoff
+    link.record_answer(1.0, 0.5)
+    assert link.state == BREAKER_CLOSED
+    assert link.backoff == BACKOFF_INITIAL
+    assert link.allow(opened_at + BACKOFF_INITIAL)
+
+
+def test_unanswered_probes_double_the_backoff_up_to_its_maximum():
+    link = open_link()
+    now = BREAKER_SILENCE
+    backoffs = []
+    while len(backoffs) < 10:
+        now = link.retry_at
+        assert link.allow(now)
+        link.record_timeout(now, BREAKER_THRESHOLD)
+        assert link.state == BREAKER_OPEN
+        assert link.retry_at == now + link.backoff
+        backoffs.append(link.backoff)
+    expected = [min(BACKOFF_INITIAL * 2.0 ** probe, BACKOFF_MAX) for probe in range(1, 11)]
+    assert backoffs == pytest.approx(expected)
+    assert backoffs[-1] == BACKOFF_MAX
+
+
+def test_adaptive_timeout_learns_the_servo_response_time():
+    link = ServoLink()
+    wire_ms = 0.15
+    for _ in range(ADAPTIVE_MIN_SAMPLES - 1):
+        link.record_answer(wire_ms + 0.5, wire_ms)
+        assert link.timeout_ms(wire_ms) is None
+    link.record_answer(wire_ms + 0.5, wire_ms)
+    timeout = link.timeout_ms(wire_ms)
+    assert timeout == pytest.approx(wire_ms + link.overhead_mean + 4.0 * link.overhead_dev + TIMEOUT_MARGIN_MS)
+    # steady answers shrink the deviation towards the margin
+    for _ in range(50):
+        link.record_answer(wire_ms + 0.5, wire_ms)
+    assert link.overhead_mean == pytest.approx(0.5)
+    assert link.timeout_ms(wire_ms) < timeout
+    assert link.timeout_ms(wire_ms) == pytest.approx(wire_ms + 0.5 + TIMEOUT_MARGIN_MS, abs=0.01)
+    # an answer faster than its wire time does not make the overhead negative
+    link.record_answer(0.0, wire_ms)
+    assert link.overhead_mean >= 0.0
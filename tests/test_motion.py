@@ -0,0 +1,52 @@
+import asyncio
+import threading
+
+import pytest
+from mbot_xl320_library import TURNAROUND_DRAIN, AsyncBus, AsyncServo, ServoGroup, VirtualBus
+from mbot_xl320_library import async_wait_until_reached, initialize_gpio_handlers, open_port, wait_until_reached
+
+SERVO_IDS = [1, 2]
+GOALS = {1: 400, 2: 600}
+
+
+@pytest.fixture
+def group():
+    virtual_bus = VirtualBus(SERVO_IDS).start()
+    portHandler, packetHandler = initialize_gpio_handlers(virtual_bus.port_name, TURNAROUND_DRAIN, "none")
+    open_port(portHandler, quiet=True)
+    servo_group = ServoGroup(SERVO_IDS, portHandler, packetHandler, quiet=True)
+    servo_group.set_joint_speeds({servo_id: 1023 for servo_id in SERVO_IDS})
+    servo_group.enable_torque()
+    yield servo_group
+    portHandler.closePort()
+    virtual_bus.stop()
+
+
+def test_wait_until_reached_reports_every_servo(group):
+    group.set_positions(GOALS)
+    completed = wait_until_reached([group.servos[servo_id] for servo_id in SERVO_IDS], GOALS, timeout=2.0)
+    assert all(elapsed is not None for elapsed in completed.values())
+
+
+def test_async_wait_until_reached_polls_through_the_async_bus(group):
+    group.set_positions(GOALS)
+    bus = AsyncBus(group.portHandler, group.packetHandler)
+    transaction_threads = set()
+    transaction = bus._transaction
+
+    def recording_transaction(send, servo_ids, status_length):
+        transaction_threads.add(threading.get_ident())
+        return transaction(send, servo_ids, status_length)
+
+    bus._transaction = recording_transaction
+
+    async def wait():
+        try:
+            servos = [AsyncServo(servo_id, bus) for servo_id in SERVO_IDS]
+            return await async_wait_until_reached(servos, GOALS, timeout=2.0)
+        finally:
+            bus.close()
+
+    completed = asyncio.run(wait())
+    assert all(elapsed is not None for elapsed in completed.values())
+    assert transaction_threads == {threading.get_ident()}
@@ -0,0 +1,99 @@
+import pytest
+from dynamixel_sdk import (
+    BROADCAST_ID, INST_PING, INST_REG_WRITE, INST_SYNC_WRITE, INST_WRITE, PKT_ID, PKT_INSTRUCTION, PKT_LENGTH_H,
+    PKT_LENGTH_L, Protocol2PacketHandler,
+)
+from mbot_xl320_library.packet_codec import FLAG, encode, encode_read, encode_write, split_packets, unstuff
+
+
+class CapturePort:
+    """Keeps the packets the SDK sends instead of writing them to a serial port."""
+
+    def __init__(self):
+        self.is_using = False
+        self.packets = []
+
+    def clearPort(self):
+        pass
+
+    def setPacketTimeout(self, packet_length):
+        pass
+
+    def writePort(self, packet):
+        length = packet[PKT_LENGTH_L] | packet[PKT_LENGTH_H] << 8
+        self.packets.append(bytes(packet[:length + 7]))
+        self.is_using = False
+        return length + 7
+
+
+class StuffingPacketHandler(Protocol2PacketHandler):
+    """
+    The SDK's framing with its byte stuffing applied: txPacket ignores the list
+    addStuffing returns when stuffing makes the packet longer, and sends the
+    packet unstuffed.
+    """
+
+    def addStuffing(self, packet):
+        packet[:] = super(StuffingPacketHandler, self).addStuffing(packet)
+        return packet
+
+
+def sdk_packet(send):
+    port = CapturePort()
+    send(StuffingPacketHandler(), port)
+    return port.packets[-1]
+
+
+WRITES = [
+    (1, 25, 1, 3),                  # LED
+    (7, 30, 2, 512),                # Goal Position
+    (BROADCAST_ID, 24, 1, 1),       # Torque Enable
+    (1, 30, 4, 0x00FDFFFF),         # the data holds a header
+    (253, 0xFFFF, 1, 0xFD),         # the address and the data hold a header
+    (0xFF, 0xFDFF, 2, 0xFFFF),      # the ID, the address and the data hold a header
+]
+
+
+@pytest.mark.parametrize("servo_id, address, length, value", WRITES)
+@pytest.mark.parametrize("instruction", [INST_WRITE, INST_REG_WRITE])
+def test_encode_write_frames_writes_like_the_sdk(servo_id, address, length, value, instruction):
+    data = list(value.to_bytes(length, "little"))
+    if instruction == INST_WRITE:
+        expected = sdk_packet(lambda handler, port: handler.writeTxOnly(port, servo_id, address, length, data))
+    else:
+        expected = sdk_packet(lambda handler, port: handler.regWriteTxOnly(port, servo_id, address, length, data))
+    assert encode_write(servo_id, address, length, value, instruction) == expected
+    assert encode(servo_id, bytes([instruction, address & 0xFF, address >> 8] + data)) == expected
+
+
+@pytest.mark.parametrize("servo_id, address, length", [(1, 37, 2), (2, 0xFFFF, 0xFD), (0xFD, 0xFFFF, 0xFFFD)])
+def test_encode_read_frames_reads_like_the_sdk(servo_id, address, length):
+    expected = sdk_packet(lambda handler, port: handler.readTx(port, servo_id, address, length))
+    assert encode_read(servo_id, address, length) == expected
+
+
+@pytest.mark.parametrize("servo_id", [1, 0xFD, BROADCAST_ID])
+def test_encode_frames_a_ping_like_the_sdk(servo_id):
+    txpacket = [0] * 10
+    txpacket[PKT_ID] = servo_id
+    txpacket[PKT_LENGTH_L] = 3
+    txpacket[PKT_INSTRUCTION] = INST_PING
+    expected = sdk_packet(lambda handler, port: handler.txPacket(port, txpacket))
+    assert encode(servo_id, bytes([INST_PING])) == expected
+
+
+@pytest.mark.parametrize("values", [
+    {1: 100, 2: 512, 3: 1000},
+    {1: 0xFFFF, 2: 0xFFFD, 0xFF: 0xFDFF},   # headers across the parameters of several servos
+])
+def test_encode_frames_a_sync_write_like_the_sdk(values):
+    param = []
+    for servo_id, value in values.items():
+        param += [servo_id] + list(value.to_bytes(2, "little"))
+    expected = sdk_packet(lambda handler, port: handler.syncWriteTxOnly(port, 30, 2, param, len(param)))
+    body = bytes([INST_SYNC_WRITE, 30, 0, 2, 0] + param)
+    assert encode(BROADCAST_ID, body) == expected
+    # the stuffing is undone on the way back
+    packet = next(split_packets(bytearray(expected)))
+    assert unstuff(packet[PKT_INSTRUCTION:-2]) == body
+    assert (FLAG in body) == (len(expected) > len(body) + 9)
@@ -0,0 +1,33 @@
+import pytest
+from mbot_xl320_library import ADDR_GOAL_POSITION, TURNAROUND_DRAIN, Servo, VirtualBus
+from mbot_xl320_library import initialize_gpio_handlers, open_port
+
+SERVO_IDS = [1, 2]
+
+
+@pytest.fixture
+def bus():
+    virtual_bus = VirtualBus(SERVO_IDS).start()
+    portHandler, packetHandler = initialize_gpio_handlers(virtual_bus.port_name, TURNAROUND_DRAIN, "none")
+    open_port(portHandler, quiet=True)
+    yield virtual_bus, portHandler, packetHandler
+    portHandler.closePort()
+    virtual_bus.stop()
+
+
+def test_action_applies_the_staged_write(bus):
+    virtual_bus, portHandler, packetHandler = bus
+    servo = Servo(1, portHandler, packetHandler, quiet=True)
+    servo.stage_register(ADDR_GOAL_POSITION, 700)
+    servo.action()
+    assert virtual_bus.servos[1].get(ADDR_GOAL_POSITION) == 700
+    assert not portHandler.is_using
+
+
+def test_action_on_a_busy_port_leaves_it_to_its_owner(bus):
+    _, portHandler, packetHandler = bus
+    servo = Servo(1, portHandler, packetHandler)
+    portHandler.is_using = True
+    servo.action()
+    assert portHandler.is_using
+    portHandler.is_using = False
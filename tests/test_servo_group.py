@@ -0,0 +1,154 @@
+import os
+import select
+import sys
+import threading
+import tty
+import types
+
+import pytest
+from dynamixel_sdk import COMM_RX_CORRUPT, INST_SYNC_READ, INST_SYNC_WRITE, PortHandler, Protocol2PacketHandler
+
+# GPIOPacketHandler drives this recorder instead of the Jetson's CTL pin
+GPIO = types.ModuleType("Jetson.GPIO")
+GPIO.BOARD, GPIO.OUT, GPIO.LOW, GPIO.HIGH = 10, 1, 0, 1
+GPIO.events = []
+GPIO.output = lambda pin, value: GPIO.events.append(value)
+GPIO.setmode = GPIO.setup = GPIO.cleanup = lambda *args, **kwargs: None
+sys.modules["Jetson"] = types.ModuleType("Jetson")
+sys.modules["Jetson"].GPIO = sys.modules["Jetson.GPIO"] = GPIO
+
+from mbot_xl320_library import ADDR_GOAL_POSITION, ADDR_PRESENT_POSITION, ADDR_PRESENT_TEMPERATURE, TURNAROUND_DRAIN
+from mbot_xl320_library import CommError, GPIOPacketHandler, ServoGroup, VirtualBus, initialize_gpio_handlers, open_port
+
+HEADER = b"\xff\xff\xfd\x00"
+POSITIONS = {1: 100, 2: 512, 3: 1000}
+TEMPERATURES = {1: 30, 2: 41, 3: 52}
+
+
+def status_packet(servo_id, error, data):
+    packet = list(HEADER) + [servo_id, (len(data) + 4) & 0xFF, (len(data) + 4) >> 8, 0x55, error] + list(data)
+    crc = Protocol2PacketHandler().updateCRC(0, packet, len(packet))
+    return bytes(packet + [crc & 0xFF, crc >> 8])
+
+
+class FakeServoChain:
+    """Answers Sync Read and Sync Write like a chain of XL320 servos at the other end of a pty."""
+
+    def __init__(self, servo_ids):
+        # servos in error_ids answer a Sync Read with an error status without data
+        self.error_ids = set()
+        self.tables = {servo_id: bytearray(53) for servo_id in servo_ids}
+        for servo_id, table in self.tables.items():
+            table[ADDR_PRESENT_POSITION:ADDR_PRESENT_POSITION + 2] = POSITIONS[servo_id].to_bytes(2, "little")
+            table[ADDR_PRESENT_TEMPERATURE] = TEMPERATURES[servo_id]
+        self.master, self.slave = os.openpty()
+        tty.setraw(self.master)
+        tty.setraw(self.slave)
+        self.port_name = os.ttyname(self.slave)
+        self._stop_event = threading.Event()
+        self._thread = threading.Thread(target=self._serve, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop_event.set()
+        self._thread.join()
+        os.close(self.master)
+        os.close(self.slave)
+
+    def _serve(self):
+        buffer = bytearray()
+        while not self._stop_event.is_set():
+            if select.select([self.master], [], [], 0.05)[0]:
+                buffer += os.read(self.master, 1024)
+            while True:
+                start = buffer.find(HEADER)
+                if start < 0 or len(buffer) < start + 7:
+                    break
+                end = start + 7 + (buffer[start + 5] | buffer[start + 6] << 8)
+                if len(buffer) < end:
+                    break
+                self._handle(bytes(buffer[start:end]))
+                del buffer[:end]
+
+    def _handle(self, packet):
+        instruction, params = packet[7], packet[8:-2]
+        address, length = params[0] | params[1] << 8, params[2] | params[3] << 8
+        if instruction == INST_SYNC_WRITE:
+            for offset in range(4, len(params), length + 1):
+                table = self.tables.get(params[offset])
+                if table is not None:
+                    table[address:address + length] = params[offset + 1:offset + 1 + length]
+        elif instruction == INST_SYNC_READ:
+            for servo_id in params[4:]:
+                table = self.tables.get(servo_id)
+                if servo_id in self.error_ids:
+                    os.write(self.master, status_packet(servo_id, 0x02, b""))
+                elif table is not None:
+                    os.write(self.master, status_packet(servo_id, 0, table[address:address + length]))
+
+
+@pytest.fixture
+def group():
+    chain = FakeServoChain(POSITIONS)
+    portHandler = PortHandler(chain.port_name)
+    assert portHandler.openPort()
+    GPIO.events.clear()
+    yield ServoGroup([1, 2, 3], portHandler, GPIOPacketHandler()), chain
+    portHandler.closePort()
+    chain.stop()
+
+
+def test_get_positions_splits_one_sync_read_by_servo(group):
+    group, _ = group
+    assert group.get_positions() == POSITIONS
+    # one switch to transmit and back, however many servos answer
+    assert GPIO.events == [GPIO.LOW, GPIO.HIGH]
+
+
+def test_read_feedback_splits_the_block_of_every_servo(group):
+    group, _ = group
+    feedback = group.read_feedback()
+    for servo_id in POSITIONS:
+        assert feedback[servo_id]["position"] == POSITIONS[servo_id]
+        assert feedback[servo_id]["temperature"] == TEMPERATURES[servo_id]
+        assert feedback[servo_id]["error"] == 0
+
+
+def test_sync_write_then_sync_read_round_trip(group):
+    group, chain = group
+    group.set_positions({1: 200, 2: 300, 3: 400})
+    assert {servo_id: table[30] | table[31] << 8 for servo_id, table in chain.tables.items()} == {
+        1: 200, 2: 300, 3: 400}
+
+
+def test_get_positions_reports_a_missing_servo_as_none(group):
+    group, _ = group
+    assert group.get_positions([1, 2, 3, 4]) == {**POSITIONS, 4: None}
+
+
+def test_a_status_packet_without_data_is_a_failed_read(group):
+    group, chain = group
+    chain.error_ids.add(2)
+    assert group.get_positions() == {**POSITIONS, 2: None}
+    _, dxl_comm_result, dxl_error = group.read_block(ADDR_PRESENT_POSITION, 2)[2]
+    assert dxl_comm_result == COMM_RX_CORRUPT
+    assert dxl_error == 0x02
+
+
+def test_stage_registers_tries_every_servo_before_raising():
+    bus = VirtualBus([1, 2]).start()
+    portHandler, packetHandler = initialize_gpio_handlers(bus.port_name, TURNAROUND_DRAIN, "none")
+    open_port(portHandler, quiet=True)
+    try:
+        group = ServoGroup([1, 2, 3], portHandler, packetHandler, quiet=True)
+        with pytest.raises(CommError) as raised:
+            group.stage_registers(ADDR_GOAL_POSITION, {3: 100, 1: 200, 2: 300})
+        assert raised.value.servo_id == 3
+        assert raised.value.staged == {1: 200, 2: 300}
+        group.action()
+        # the broadcast Action is not answered, a read makes sure the bus handled it
+        group.get_positions([1, 2])
+        assert {servo_id: bus.servos[servo_id].get(ADDR_GOAL_POSITION) for servo_id in (1, 2)} == {1: 200, 2: 300}
+    finally:
+        portHandler.closePort()
+        bus.stop()
@@ -0,0 +1,60 @@
+import os
+import time
+
+import pytest
+from dynamixel_sdk import COMM_SUCCESS
+from mbot_xl320_library import TURNAROUND_DRAIN, StateClient, StateServer, VirtualBus
+from mbot_xl320_library import initialize_gpio_handlers, open_port
+
+SERVO_IDS = [1, 2]
+
+
+@pytest.fixture
+def server():
+    virtual_bus = VirtualBus(SERVO_IDS).start()
+    portHandler, packetHandler = initialize_gpio_handlers(virtual_bus.port_name, TURNAROUND_DRAIN, "none")
+    open_port(portHandler, quiet=True)
+    state_server = StateServer(SERVO_IDS, portHandler, packetHandler, name="xl320_test_%d" % os.getpid())
+    yield state_server
+    state_server.close()
+    portHandler.closePort()
+    virtual_bus.stop()
+
+
+def test_a_short_status_is_a_failed_read(server):
+    read_block = server.group.read_block
+
+    def short_read_block(address, length, servo_ids=None, report=False):
+        results = read_block(address, length, servo_ids, report)
+        data, _, dxl_error = results[2]
+        results[2] = (data[:length // 2], COMM_SUCCESS, dxl_error)
+        return results
+
+    server.poll_once()
+    server.group.read_block = short_read_block
+    server.poll_once()
+    with StateClient(server.name) as client:
+        assert client.failed_reads(1) == 0
+        assert client.failed_reads(2) == 1
+        assert client.read(2) is not None
+    assert server.get_stats()["failed_reads"] == 1
+
+
+def test_a_failed_cycle_is_counted_and_serving_goes_on(server):
+    poll_once = server.poll_once
+    calls = []
+
+    def failing_poll_once():
+        calls.append(None)
+        if len(calls) == 1:
+            raise ValueError("bad command")
+        poll_once()
+
+    server.poll_once = failing_poll_once
+    server.start()
+    time.sleep(0.1)
+    server.stop()
+    with StateClient(server.name) as client:
+        assert client.cycles > 0
+    assert server.get_stats()["failed_cycles"] == 1
+    assert server.error is None
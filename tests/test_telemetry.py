@@ -0,0 +1,66 @@
+import time
+
+import pytest
+from mbot_xl320_library import TURNAROUND_DRAIN, CommError, Servo, TelemetryPoller, VirtualBus
+from mbot_xl320_library import initialize_gpio_handlers, open_port
+
+SERVO_IDS = [1, 2]
+
+
+@pytest.fixture
+def poller():
+    virtual_bus = VirtualBus(SERVO_IDS).start()
+    portHandler, packetHandler = initialize_gpio_handlers(virtual_bus.port_name, TURNAROUND_DRAIN, "none")
+    open_port(portHandler, quiet=True)
+    telemetry_poller = TelemetryPoller(SERVO_IDS, portHandler, packetHandler, rate=100.0)
+    yield telemetry_poller
+    telemetry_poller.stop()
+    portHandler.closePort()
+    virtual_bus.stop()
+
+
+def servo_without_bus(poller, servo_id):
+    servo = Servo(servo_id, poller.portHandler, poller.packetHandler, quiet=True)
+    poller.attach(servo)
+
+    def read_register(*args):
+        raise AssertionError("read the bus while the poller owns it")
+
+    servo._read_register = read_register
+    return servo
+
+
+def test_cached_position_never_reads_the_bus_while_polling(poller):
+    servo = servo_without_bus(poller, 1)
+    poller.start()
+    time.sleep(0.1)
+    assert servo.get_position(cached=True) == poller.get_latest(1).position
+    # a stale sample is still served from the poller
+    assert servo.get_position(cached=True, max_age=0.0) == poller.get_latest(1).position
+
+
+def test_cached_position_without_a_sample_raises_while_polling(poller):
+    servo = servo_without_bus(poller, 1)
+    poller.poll_once = lambda: None
+    poller.start()
+    with pytest.raises(CommError):
+        servo.get_position(cached=True)
+
+
+def test_a_failed_poll_is_counted_and_polling_goes_on(poller):
+    poll_once = poller.poll_once
+    calls = []
+
+    def failing_poll_once():
+        calls.append(None)
+        if len(calls) == 1:
+            raise ValueError("bad sample")
+        poll_once()
+
+    poller.poll_once = failing_poll_once
+    poller.start()
+    time.sleep(0.1)
+    poller.stop()
+    assert poller.get_stats()["failed_cycles"] == 1
+    assert poller.get_latest(1) is not None
+    assert poller.error is None
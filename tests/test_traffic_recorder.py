@@ -0,0 +1,82 @@
+import pytest
+from dynamixel_sdk import COMM_RX_TIMEOUT, INST_READ, INST_WRITE, PacketHandler, PortHandler
+from mbot_xl320_library import LED_GREEN, PROTOCOL_VERSION, ReplayPort, Servo, TrafficLog, TrafficRecorder
+from mbot_xl320_library import VirtualBus, open_port
+from mbot_xl320_library.traffic_recorder import DIRECTION_BAUDRATE, DIRECTION_TX
+
+SERVO_IDS = [1, 2]
+
+
+def session(portHandler, packetHandler):
+    """@return What a short session of reads and writes returned."""
+    servo = Servo(1, portHandler, packetHandler, quiet=True)
+    servo.change_led_color(LED_GREEN)
+    servo.set_position(300)
+    missing = Servo(9, portHandler, packetHandler)
+    return [servo.get_position() is not None, servo.read_register(25), missing.read_register(25),
+            Servo(2, portHandler, packetHandler, quiet=True).read_register(25)]
+
+
+@pytest.fixture
+def log_path(tmp_path):
+    """@return The path of the log of session() against a virtual bus, and what the session returned."""
+    path = str(tmp_path / "session.xl320log")
+    bus = VirtualBus(SERVO_IDS).start()
+    portHandler = PortHandler(bus.port_name)
+    open_port(portHandler, quiet=True)
+    try:
+        with TrafficRecorder(path) as recorder:
+            packetHandler = recorder.attach(PacketHandler(PROTOCOL_VERSION))
+            results = session(portHandler, packetHandler)
+    finally:
+        portHandler.closePort()
+        bus.stop()
+    return path, results
+
+
+def test_recorded_session_filters_and_replays(log_path):
+    path, results = log_path
+    with TrafficLog(path) as log:
+        records = list(log)
+        assert records[0].direction == DIRECTION_BAUDRATE
+        writes = list(log.records(instruction=INST_WRITE, direction=DIRECTION_TX))
+        assert [(record.servo_id, record.packet[8]) for record in writes] == [(1, 25), (1, 30)]
+        reads = log.round_trips(servo_id=9, instruction=INST_READ)
+        assert len(reads) == 1
+        assert [rx.result for rx in reads[0][1]] == [COMM_RX_TIMEOUT]
+        assert all(record.servo_id == 2 for record in log.records(servo_id=2))
+        assert len(log.latencies(servo_id=1)) == 4
+
+        port = ReplayPort(log, time_scale=0.0)
+        open_port(port, quiet=True)
+        assert session(port, PacketHandler(PROTOCOL_VERSION)) == results
+        assert port.finished
+        assert port.mismatches == 0
+
+
+def test_a_log_cut_short_ends_at_its_last_complete_record(log_path, tmp_path):
+    path, _ = log_path
+    with TrafficLog(path) as log:
+        records = list(log)
+    with open(path, "rb") as log_file:
+        data = log_file.read()
+    cut_path = str(tmp_path / "cut.xl320log")
+    with open(cut_path, "wb") as log_file:
+        log_file.write(data[:-3])
+    with TrafficLog(cut_path) as log:
+        cut_records = list(log)
+    assert len(cut_records) == len(records) - 1
+    assert [record.packet for record in cut_records] == [record.packet for record in records[:-1]]
+
+
+def test_attaching_twice_records_once_and_detaches_cleanly(tmp_path):
+    packetHandler = PacketHandler(PROTOCOL_VERSION)
+    recorder = TrafficRecorder(str(tmp_path / "twice.xl320log"))
+    assert recorder.attach(packetHandler) is packetHandler
+    wrapped = packetHandler.txPacket
+    recorder.attach(packetHandler)
+    assert packetHandler.txPacket is wrapped
+    recorder.detach(packetHandler)
+    recorder.detach(packetHandler)
+    recorder.close()
+    assert "txPacket" not in vars(packetHandler)
@@ -0,0 +1,32 @@
+import pytest
+
+pytest.importorskip("numpy")
+
+from mbot_xl320_library import TURNAROUND_DRAIN, Trajectory, TrajectoryStreamer, VirtualBus
+from mbot_xl320_library import initialize_gpio_handlers, open_port
+
+SERVO_IDS = [1, 2]
+
+
+@pytest.fixture
+def streamer():
+    virtual_bus = VirtualBus(SERVO_IDS).start()
+    portHandler, packetHandler = initialize_gpio_handlers(virtual_bus.port_name, TURNAROUND_DRAIN, "none")
+    open_port(portHandler, quiet=True)
+    yield TrajectoryStreamer(portHandler, packetHandler)
+    portHandler.closePort()
+    virtual_bus.stop()
+
+
+def test_stop_ends_one_play_only(streamer):
+    trajectory = Trajectory.from_waypoints(SERVO_IDS, [[100, 200], [300, 400]], [0.1], rate=100.0)
+    streamer.start(trajectory)
+    streamer.stop()
+    assert streamer.play(trajectory)["ticks"] + streamer.get_stats()["skipped_ticks"] == len(trajectory)
+
+
+def test_stop_while_idle_does_not_stop_the_next_play(streamer):
+    trajectory = Trajectory.from_waypoints(SERVO_IDS, [[100, 200], [300, 400]], [0.1], rate=100.0)
+    streamer.stop()
+    stats = streamer.play(trajectory)
+    assert stats["ticks"] + stats["skipped_ticks"] == len(trajectory)
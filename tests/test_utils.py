@@ -0,0 +1,10 @@
+import pytest
+from dynamixel_sdk import COMM_NOT_AVAILABLE, PortHandler
+from mbot_xl320_library import CommError, open_port
+
+
+def test_open_port_raises_comm_not_available_in_quiet_mode(tmp_path):
+    with pytest.raises(CommError) as raised:
+        open_port(PortHandler(str(tmp_path / "ttyMissing")), quiet=True)
+    assert raised.value.comm_result == COMM_NOT_AVAILABLE
+    assert raised.value.servo_id is None
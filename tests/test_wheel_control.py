@@ -0,0 +1,97 @@
+import time
+
+import pytest
+from mbot_xl320_library import ADDR_GOAL_SPEED, TURNAROUND_DRAIN, Servo, ServoGroup
+from mbot_xl320_library import VirtualBus, WheelSpeedController, initialize_gpio_handlers, open_port
+
+SERVO_IDS = [1, 2]
+TARGETS_RPM = {1: 40.0, 2: -60.0}
+RATE = 100.0
+
+
+def motors_stop(virtual_bus, timeout=1.0):
+    """@return True once the virtual bus handled a Moving Speed of 0 for every servo; Sync Write is not answered."""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if all(virtual_bus.servos[servo_id].get(ADDR_GOAL_SPEED) == 0 for servo_id in SERVO_IDS):
+            return True
+        time.sleep(0.005)
+    return False
+
+
+@pytest.fixture
+def bus():
+    virtual_bus = VirtualBus(SERVO_IDS).start()
+    portHandler, packetHandler = initialize_gpio_handlers(virtual_bus.port_name, TURNAROUND_DRAIN, "none")
+    open_port(portHandler, quiet=True)
+    for servo_id in SERVO_IDS:
+        Servo(servo_id, portHandler, packetHandler, quiet=True).set_control_mode("wheel")
+    ServoGroup(SERVO_IDS, portHandler, packetHandler, quiet=True).enable_torque()
+    yield virtual_bus, portHandler, packetHandler
+    portHandler.closePort()
+    virtual_bus.stop()
+
+
+def test_controller_holds_the_target_speed_under_load(bus):
+    virtual_bus, portHandler, packetHandler = bus
+    virtual_bus.set_conditions(voltage=6.0, load=0.3)
+    controller = WheelSpeedController(SERVO_IDS, portHandler, packetHandler, rate=RATE)
+    controller.set_targets(TARGETS_RPM)
+    with controller:
+        time.sleep(1.0)
+        stats = controller.get_stats()
+
+    for servo_id, rpm in TARGETS_RPM.items():
+        assert stats[servo_id]["measured_rpm"] == pytest.approx(rpm, abs=3.0)
+    # the loop keeps to its timeline: the cycles it ran and skipped fill the second
+    assert stats["cycles"] + stats["skipped_cycles"] >= 0.9 * RATE
+    assert stats["overruns"] <= stats["cycles"] // 4
+    assert 0.0 <= stats["jitter_mean_ms"] <= stats["jitter_max_ms"]
+    assert 0.0 <= stats["jitter_p99_ms"] <= stats["jitter_max_ms"]
+    assert stats["failed_cycles"] == 0
+    assert controller.error is None
+    # stop() leaves the motors off
+    assert motors_stop(virtual_bus)
+
+
+def test_a_failed_cycle_is_counted_and_the_loop_goes_on(bus):
+    _, portHandler, packetHandler = bus
+    controller = WheelSpeedController(SERVO_IDS, portHandler, packetHandler, rate=RATE)
+    step = controller.step
+    calls = []
+
+    def failing_step(dt=None):
+        calls.append(dt)
+        if len(calls) == 1:
+            raise ValueError("bad feedback")
+        return step(dt)
+
+    controller.step = failing_step
+    with controller:
+        time.sleep(0.2)
+    assert controller.get_stats()["failed_cycles"] == 1
+    assert len(calls) > 1
+    assert controller.error is None
+
+
+def test_a_failed_port_ends_the_loop_and_stops_the_motors(bus):
+    virtual_bus, portHandler, packetHandler = bus
+    controller = WheelSpeedController(SERVO_IDS, portHandler, packetHandler, rate=RATE)
+    controller.set_targets(TARGETS_RPM)
+    controller.start()
+    time.sleep(0.2)
+    assert 0 not in (virtual_bus.servos[servo_id].get(ADDR_GOAL_SPEED) for servo_id in SERVO_IDS)
+
+    step = controller.step
+
+    def failing_step(dt=None):
+        controller.step = step
+        raise OSError("port gone")
+
+    controller.step = failing_step
+    controller._thread.join(1.0)
+    assert not controller._thread.is_alive()
+    assert isinstance(controller.error, OSError)
+    assert all(channel.command == 0 for channel in controller.channels.values())
+    assert motors_stop(virtual_bus)
+    controller.stop()